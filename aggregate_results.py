@@ -0,0 +1,87 @@
+import sys, os
+from glob import glob
+from datetime import datetime
+from timeit import default_timer as timer
+try:
+    from humanfriendly import format_timespan
+except ImportError:
+    def format_timespan(seconds):
+        return "{:.2f} seconds".format(seconds)
+
+from pairs_file import load_pairs_index
+from result_store import CategoryPairAggregator, load_results
+
+import logging
+logging.basicConfig(format='%(asctime)s %(name)s.%(lineno)d %(levelname)s : %(message)s',
+        datefmt="%H:%M:%S",
+        level=logging.INFO)
+# logger = logging.getLogger(__name__)
+logger = logging.getLogger('__main__').getChild(__name__)
+
+def write_summary(outf, aggregator):
+    outf.write("\t".join(['category1', 'category2', 'num_pairs', 'num_done', 'num_missing', 'num_unreachable', 'mean', 'std', 'median', 'max']))
+    outf.write("\n")
+    for g, (start_idx, end_idx, category1, category2) in enumerate(aggregator.groups):
+        counts = [end_idx - start_idx, aggregator.done[g], aggregator.missing[g], aggregator.unreachable[g]]
+        outf.write("\t".join([category1, category2] + [str(x) for x in counts] + ["{:.4f}".format(x) for x in aggregator.summary(g)]))
+        outf.write("\n")
+
+def write_histograms(outf, aggregator):
+    """one row per category pair and distance, like category_distance_histograms.py. pairs with an id
+    that is not in the graph are left out, and the fractions are of the other done pairs"""
+    outf.write("\t".join(['category1', 'category2', 'distance', 'count', 'fraction']))
+    outf.write("\n")
+    for g, (_, _, category1, category2) in enumerate(aggregator.groups):
+        total = aggregator.done[g] - aggregator.missing[g]
+        for d, count in enumerate(aggregator.counts[g].tolist() + [int(aggregator.unreachable[g])]):
+            if count == 0:
+                continue
+            distance = str(d) if d < aggregator.counts.shape[1] else 'inf'
+            outf.write("\t".join([category1, category2, distance, str(count), "{:.6g}".format(count / float(total))]))
+            outf.write("\n")
+
+def main(args):
+    pairs_fname = os.path.abspath(args.pairs)
+    pairs_index = load_pairs_index(pairs_fname)
+    if not pairs_index.groups:
+        raise RuntimeError("{} has no category pairs (no header lines or groups file)".format(pairs_fname))
+    aggregator = CategoryPairAggregator(pairs_index)
+
+    result_fnames = sorted(fname for pattern in args.results for fname in glob(pattern))
+    start = timer()
+    for fname in result_fnames:
+        aggregator.add(load_results(fname))
+    logger.info("{} pairs done in {} result files (out of {} pairs). took {}".format(int(aggregator.done.sum()), len(result_fnames), len(pairs_index), format_timespan(timer()-start)))
+    if aggregator.num_duplicates:
+        logger.info("{} rows were for pairs already done in an earlier file, and were skipped".format(aggregator.num_duplicates))
+    if aggregator.num_ungrouped:
+        logger.warning("{} done pairs are not in any category pair".format(aggregator.num_ungrouped))
+
+    with open(args.output, 'w') as outf:
+        write_summary(outf, aggregator)
+    if args.histograms:
+        with open(args.histograms, 'w') as outf:
+            write_histograms(outf, aggregator)
+
+if __name__ == "__main__":
+    total_start = timer()
+    logger = logging.getLogger(__name__)
+    logger.info(" ".join(sys.argv))
+    logger.info( '{:%Y-%m-%d %H:%M:%S}'.format(datetime.now()) )
+    import argparse
+    parser = argparse.ArgumentParser(description="merge result files (.npy outputs of the runners) and compute distance statistics for each category pair of the pairs file", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("pairs", help="pairs file the results are for (its groups give the category pairs)")
+    parser.add_argument("results", nargs='+', help="glob patterns of the result files")
+    parser.add_argument("-o", "--output", required=True, help="output file (TSV) with one row per category pair: category1, category2, num_pairs, num_done, num_missing (ids not in the graph), num_unreachable, and the mean, standard deviation, median and maximum of the finite distances")
+    parser.add_argument("--histograms", help="also write the distance histograms to this file (TSV with columns category1, category2, distance, count, fraction)")
+    parser.add_argument("--debug", action='store_true', help="output debugging info")
+    global args
+    args = parser.parse_args()
+    if args.debug:
+        logger.setLevel(logging.DEBUG)
+        logger.debug('debug mode is on')
+    else:
+        logger.setLevel(logging.INFO)
+    main(args)
+    total_end = timer()
+    logger.info('all finished. total time: {}'.format(format_timespan(total_end-total_start)))
@@ -0,0 +1,95 @@
+import sys, os
+from datetime import datetime
+from timeit import default_timer as timer
+try:
+    from humanfriendly import format_timespan, format_size
+except ImportError:
+    def format_timespan(seconds):
+        return "{:.2f} seconds".format(seconds)
+    def format_size(num_bytes):
+        return "{} bytes".format(num_bytes)
+
+from csr_graph import save_csr_graph
+from graph_delta import read_graph_delta, apply_graph_delta
+import landmarks
+import pruned_landmark_labeling
+from shortest_path_length_utils import load_graph, as_csr_graph
+
+import logging
+logging.basicConfig(format='%(asctime)s %(name)s.%(lineno)d %(levelname)s : %(message)s',
+        datefmt="%H:%M:%S",
+        level=logging.INFO)
+# logger = logging.getLogger(__name__)
+logger = logging.getLogger('__main__').getChild(__name__)
+
+def check_updatable(index_fname):
+    """raise if the index in index_fname is not of a kind update_index can update"""
+    if not ( pruned_landmark_labeling.is_pll_file(index_fname) or landmarks.is_landmarks_file(index_fname) ):
+        raise RuntimeError("{} cannot be updated incrementally: only distance labels (build_distance_labels.py) and landmarks (build_landmarks.py) can. rebuild it on the new graph".format(index_fname))
+
+def update_index(index_fname, output_fname, G_new, changes):
+    """update a distance index of the old graph for the inserted edges, and save it to output_fname"""
+    start = timer()
+    if pruned_landmark_labeling.is_pll_file(index_fname):
+        labels = pruned_landmark_labeling.load_distance_labels(index_fname)
+        def progress(num_edges_done):
+            logger.debug("{} of {} inserted edges done".format(num_edges_done, len(changes.inserted_edges)))
+        new_labels, num_resumed, num_added = pruned_landmark_labeling.insert_edges(labels, G_new, changes.inserted_edges, progress=progress)
+        new_labels.save(output_fname)
+        logger.info("distance labels: resumed {} pruned BFSs, added or lowered {} label entries ({} entries before, {} after). took {}".format(
+            num_resumed, num_added, labels.num_entries(), new_labels.num_entries(), format_timespan(timer()-start)))
+    elif landmarks.is_landmarks_file(index_fname):
+        index = landmarks.load_landmarks(index_fname)
+        new_index = landmarks.insert_edges(index, G_new, changes.inserted_edges)
+        new_index.save(output_fname)
+        num_changed = int((new_index.dists[:index.num_vertices] != index.dists).sum())
+        logger.info("landmarks: {} of {} distances changed. took {}".format(num_changed, index.dists.size, format_timespan(timer()-start)))
+    else:
+        check_updatable(index_fname)
+    logger.debug("wrote {} ({})".format(output_fname, format_size(os.path.getsize(output_fname))))
+
+def main(args):
+    graph_fname = os.path.abspath(args.graph)
+    # check what can be checked before writing anything, so that a bad invocation leaves no new graph behind
+    for index_fname, index_output_fname in args.update_index or []:
+        check_updatable(os.path.abspath(index_fname))
+    start = timer()
+    logger.debug("loading graph from file: {}...".format(graph_fname))
+    G = as_csr_graph(load_graph(graph_fname))
+    delta = read_graph_delta(os.path.abspath(args.delta))
+    logger.debug("done loading graph and delta. took {}".format(format_timespan(timer()-start)))
+
+    start = timer()
+    G_new, changes = apply_graph_delta(G, delta)
+    logger.info("applied delta: {}. took {}".format(changes.summary(), format_timespan(timer()-start)))
+    if args.update_index and not changes.insertions_only():
+        raise RuntimeError("the delta removes edges or vertices, which can make distances longer. distance indexes are only updated for insertions: rebuild them on the new graph")
+    output_fname = os.path.abspath(args.output)
+    save_csr_graph(G_new, output_fname)
+    logger.info("wrote new graph with {} vertices and {} edges to {}".format(G_new.num_vertices, G_new.num_adjacency_entries() // 2, output_fname))
+
+    for index_fname, index_output_fname in args.update_index or []:
+        update_index(os.path.abspath(index_fname), os.path.abspath(index_output_fname), G_new, changes)
+
+if __name__ == "__main__":
+    total_start = timer()
+    logger = logging.getLogger(__name__)
+    logger.info(" ".join(sys.argv))
+    logger.info( '{:%Y-%m-%d %H:%M:%S}'.format(datetime.now()) )
+    import argparse
+    parser = argparse.ArgumentParser(description="apply a graph delta (the vertices and edges added or removed by a new snapshot, see graph_delta.py) to a graph, and update its distance indexes for the inserted edges", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("graph", help="network graph of the old snapshot (Pajek .net file or binary CSR file)")
+    parser.add_argument("delta", help="graph delta file: lines '+v <id>', '-v <id>', '+e <id1> <id2>' or '-e <id1> <id2>'")
+    parser.add_argument("-o", "--output", required=True, help="output file for the new graph (binary CSR). vertex indices of the old graph are kept, so earlier results and indexes stay aligned")
+    parser.add_argument("--update-index", nargs=2, action='append', metavar=('INDEX', 'OUTPUT'), help="update a distance index of the old graph (distance labels or landmarks) for the inserted edges, and write it to OUTPUT. can be given several times. only for deltas without removals")
+    parser.add_argument("--debug", action='store_true', help="output debugging info")
+    global args
+    args = parser.parse_args()
+    if args.debug:
+        logger.setLevel(logging.DEBUG)
+        logger.debug('debug mode is on')
+    else:
+        logger.setLevel(logging.INFO)
+    main(args)
+    total_end = timer()
+    logger.info('all finished. total time: {}'.format(format_timespan(total_end-total_start)))
@@ -0,0 +1,70 @@
+from collections import defaultdict
+import numpy as np
+
+from bidirectional_bfs import SearchSide
+
+def bfs_lengths_to_targets(G, source, targets, stats=None):
+    """undirected shortest path lengths from vertex `source` to each vertex in `targets`, on the CSRGraph G.
+
+    a single BFS that stops as soon as every target has been reached.
+    returns a list in the same order as targets, with float('inf') for unreachable targets.
+    the work done is added to stats (a query_metrics.TraversalStats), if given"""
+    targets = np.asarray(targets, dtype=np.int64)
+    dist, _ = G.get_workspace()
+    pending = np.unique(targets)
+    touched = [np.array([source], dtype=np.int64)]
+    search = None
+    try:
+        dist[source] = 0
+        search = SearchSide(G, dist, source)
+        pending = pending[dist[pending] < 0]
+        while len(pending) > 0:
+            new = search.step()
+            touched.append(new)
+            if len(new) == 0:
+                break
+            pending = pending[dist[pending] < 0]
+        lengths = dist[targets]
+        return [int(x) if x >= 0 else float('inf') for x in lengths]
+    finally:
+        if stats is not None:
+            stats.add_search(sum(len(vertices) for vertices in touched), [search] if search is not None else [])
+        for vertices in touched:
+            dist[vertices] = -1
+
+def group_pairs_by_endpoint(source_vertices, target_vertices):
+    """assign every pair to one of its endpoints, so that one traversal per chosen endpoint covers all pairs.
+
+    lengths are symmetric, so a pair can be served from either end. endpoints that appear in the most
+    pairs are picked first (greedy set cover).
+    pairs where either vertex is negative (not in the graph) are left out.
+    returns a list of (endpoint, positions of its pairs, the other endpoint of each of those pairs)"""
+    incident = defaultdict(list)
+    for pos, (source, target) in enumerate(zip(source_vertices, target_vertices)):
+        if source < 0 or target < 0:
+            continue
+        incident[int(source)].append(pos)
+        if target != source:
+            incident[int(target)].append(pos)
+    assigned = np.zeros(len(source_vertices), dtype=bool)
+    groups = []
+    for endpoint in sorted(incident, key=lambda v: (-len(incident[v]), v)):
+        positions = [pos for pos in incident[endpoint] if not assigned[pos]]
+        if not positions:
+            continue
+        assigned[positions] = True
+        others = [int(target_vertices[pos]) if source_vertices[pos] == endpoint else int(source_vertices[pos]) for pos in positions]
+        groups.append((endpoint, positions, others))
+    return groups
+
+def grouped_shortest_path_lengths(G, source_vertices, target_vertices, traverse=bfs_lengths_to_targets):
+    """shortest path lengths for many pairs of vertex indices, with one traversal per endpoint group
+    (see group_pairs_by_endpoint). results are scattered back into the original pair order.
+
+    `traverse(G, endpoint, others)` computes the lengths for one group.
+    pairs with a negative vertex index (not in the graph) get None"""
+    sp_lengths = [None] * len(source_vertices)
+    for endpoint, positions, others in group_pairs_by_endpoint(source_vertices, target_vertices):
+        for pos, sp_length in zip(positions, traverse(G, endpoint, others)):
+            sp_lengths[pos] = sp_length
+    return sp_lengths
@@ -0,0 +1,251 @@
+import sys, os, json, platform, shutil, subprocess, tempfile, traceback
+import multiprocessing
+from datetime import datetime
+from timeit import default_timer as timer
+try:
+    from humanfriendly import format_timespan, format_size
+except ImportError:
+    def format_timespan(seconds):
+        return "{:.2f} seconds".format(seconds)
+    def format_size(num_bytes):
+        return "{} bytes".format(num_bytes)
+
+import numpy as np
+
+from synthetic_graph import generate_citation_graph, write_pajek
+from csr_graph import csr_graph_from_edges, save_csr_graph, load_csr_graph
+from pairs_file import Pair
+from landmarks import build_landmark_index
+from pruned_landmark_labeling import build_distance_labels
+from graph_reduction import reduce_graph
+from calculate_shortest_paths_multiprocessing import init_worker, calculate_paths_for_chunk
+from shortest_path_length_utils import load_graph_for_backend, load_id_index, load_distance_index, get_shortest_path_lengths_for_vertex_pairs, get_peak_rss, BACKENDS
+
+import logging
+logging.basicConfig(format='%(asctime)s %(name)s.%(lineno)d %(levelname)s : %(message)s',
+        datefmt="%H:%M:%S",
+        level=logging.INFO)
+# logger = logging.getLogger(__name__)
+logger = logging.getLogger('__main__').getChild(__name__)
+
+# index file built for each index backend, by extension
+INDEX_EXTENSIONS = {'pll': '.pll', 'landmarks': '.lmk', 'reduced': '.red'}
+
+def get_version_info():
+    """what the results were measured with, so that results of different versions can be told apart"""
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'date': '{:%Y-%m-%d %H:%M:%S}'.format(datetime.now()),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': multiprocessing.cpu_count(),
+    }
+
+def run_in_child(func, *args):
+    """func(*args), run in a forked child process. each measurement then starts from the same (small)
+    parent process, and the peak RSS it reports is its own. exceptions are re-raised as RuntimeError"""
+    ctx = multiprocessing.get_context('fork')
+    receiver, sender = ctx.Pipe(duplex=False)
+    def target():
+        try:
+            sender.send((True, func(*args)))
+        except Exception:
+            sender.send((False, traceback.format_exc()))
+    process = ctx.Process(target=target)
+    process.start()
+    ok, result = receiver.recv()
+    process.join()
+    if not ok:
+        raise RuntimeError(result)
+    return result
+
+def prepare_graph(graph_dir, num_edges, mean_degree, seed, index_backends, max_pll_edges):
+    """generate (or reuse) the synthetic graph with num_edges arcs, in Pajek and binary CSR form,
+    and the distance index files of the index backends. returns a dict of file names, sizes and timings"""
+    num_vertices = max(2, int(2 * num_edges / mean_degree))
+    base = os.path.join(graph_dir, "synthetic_m{}_n{}_s{}".format(num_edges, num_vertices, seed))
+    info = {'edges': num_edges, 'vertices': num_vertices, 'seed': seed, 'pajek': base + ".net", 'csr': base + ".csr", 'indexes': {}, 'seconds': {}}
+    G = None
+    if not ( os.path.exists(info['pajek']) and os.path.exists(info['csr']) ):
+        start = timer()
+        ids, sources, targets = generate_citation_graph(num_vertices, num_edges, seed)
+        info['seconds']['generate'] = timer() - start
+        start = timer()
+        write_pajek(info['pajek'], ids, sources, targets)
+        info['seconds']['write_pajek'] = timer() - start
+        start = timer()
+        G = csr_graph_from_edges(ids, sources, targets)
+        save_csr_graph(G, info['csr'])
+        info['seconds']['write_csr'] = timer() - start
+    for backend in index_backends:
+        index_fname = base + INDEX_EXTENSIONS[backend]
+        if backend == 'pll' and num_edges > max_pll_edges:
+            continue
+        if not os.path.exists(index_fname):
+            if G is None:
+                G = load_csr_graph(info['csr'])
+            start = timer()
+            if backend == 'pll':
+                index = build_distance_labels(G)
+            elif backend == 'landmarks':
+                index = build_landmark_index(G, 16)
+            else:
+                index = reduce_graph(G)
+            index.save(index_fname)
+            info['seconds']['build_' + backend] = timer() - start
+        info['indexes'][backend] = index_fname
+    info['bytes'] = {name: os.path.getsize(info[name]) for name in ('pajek', 'csr')}
+    info['bytes'].update({backend: os.path.getsize(fname) for backend, fname in info['indexes'].items()})
+    return info
+
+def sample_pairs(graph_info, num_pairs, seed, num_sources=None):
+    """random pairs of the graph's vertices as Pair objects (with the original ids).
+    with num_sources, the sources are drawn from that many vertices, so pairs share sources the way
+    the sampled category pairs do"""
+    G = load_csr_graph(graph_info['csr'])
+    random_state = np.random.RandomState(seed)
+    if num_sources:
+        sources = random_state.choice(G.num_vertices, size=num_sources)[random_state.randint(num_sources, size=num_pairs)]
+    else:
+        sources = random_state.randint(G.num_vertices, size=num_pairs)
+    targets = random_state.randint(G.num_vertices, size=num_pairs)
+    return [Pair('s{}'.format(i), str(G.ids[u]), 't{}'.format(i), str(G.ids[v])) for i, (u, v) in enumerate(zip(sources, targets))]
+
+def percentiles_ms(seconds):
+    return {name: 1000.0 * float(np.percentile(seconds, q)) for name, q in (('p50', 50), ('p90', 90), ('p99', 99), ('max', 100))}
+
+def measure_backend(graph_info, backend, latency_pairs, batch_pairs, fallback_backend):
+    """load time, id lookup time, single-pair query latency and batch throughput of one backend, in this process"""
+    result = {'edges': graph_info['edges'], 'backend': backend, 'processes': 1}
+    graph_fname = graph_info['pajek'] if backend == 'igraph' else graph_info['csr']
+    start = timer()
+    G = load_graph_for_backend(graph_fname, backend, fallback_backend=fallback_backend)
+    id_index = load_id_index(graph_fname, G)
+    result['load_seconds'] = timer() - start
+    index = None
+    if backend in INDEX_EXTENSIONS:
+        start = timer()
+        index = load_distance_index(graph_info['indexes'][backend])
+        result['index_load_seconds'] = timer() - start
+
+    ids = [pair.source_mag_id for pair in batch_pairs] + [pair.target_mag_id for pair in batch_pairs]
+    start = timer()
+    vertices = id_index.lookup_many(ids)
+    result['id_lookup_us'] = 1e6 * (timer() - start) / len(ids)
+    source_vertices = vertices[:len(batch_pairs)]
+    target_vertices = vertices[len(batch_pairs):]
+
+    latencies = []
+    latency_sources = id_index.lookup_many([pair.source_mag_id for pair in latency_pairs])
+    latency_targets = id_index.lookup_many([pair.target_mag_id for pair in latency_pairs])
+    for u, v in zip(latency_sources, latency_targets):
+        start = timer()
+        get_shortest_path_lengths_for_vertex_pairs(G, [u], [v], backend=backend, index=index, fallback_backend=fallback_backend)
+        latencies.append(timer() - start)
+    result['latency_ms'] = percentiles_ms(latencies)
+
+    start = timer()
+    get_shortest_path_lengths_for_vertex_pairs(G, source_vertices, target_vertices, backend=backend, index=index, fallback_backend=fallback_backend)
+    elapsed = timer() - start
+    result['batch_pairs'] = len(batch_pairs)
+    result['pairs_per_second'] = len(batch_pairs) / elapsed if elapsed > 0 else None
+    result['peak_rss_bytes'] = get_peak_rss()
+    return result
+
+def measure_processes(graph_info, backend, processes, batch_pairs, chunk_size, fallback_backend):
+    """throughput of the multiprocessing runner's workers (sharing the memory-mapped CSR graph) on batch_pairs.
+    the time includes starting the workers, as it does for a real run"""
+    result = {'edges': graph_info['edges'], 'backend': backend, 'processes': processes}
+    index_fname = graph_info['indexes'].get(backend)
+    options = {'backend': backend, 'fallback_backend': fallback_backend, 'bounds_only': False, 'paths': False, 'count_paths': False}
+    tasks = [(chunk_idx, batch_pairs[i:i+chunk_size], options) for chunk_idx, i in enumerate(range(0, len(batch_pairs), chunk_size))]
+    start = timer()
+    pool = multiprocessing.get_context('fork').Pool(processes=processes, initializer=init_worker, initargs=(graph_info['csr'], index_fname))
+    for _ in pool.imap_unordered(calculate_paths_for_chunk, tasks):
+        pass
+    pool.close()
+    pool.join()
+    elapsed = timer() - start
+    result['batch_pairs'] = len(batch_pairs)
+    result['seconds'] = elapsed
+    result['pairs_per_second'] = len(batch_pairs) / elapsed
+    result['peak_rss_bytes'] = get_peak_rss()
+    result['worker_peak_rss_bytes'] = get_peak_rss(children=True)
+    return result
+
+def main(args):
+    graph_dir = args.graph_dir or tempfile.mkdtemp(prefix='benchmark_backends_')
+    os.makedirs(graph_dir, exist_ok=True)
+    backends = args.backends or BACKENDS
+    index_backends = [backend for backend in backends if backend in INDEX_EXTENSIONS]
+    output = {'version': get_version_info(), 'args': vars(args), 'graphs': [], 'results': []}
+    try:
+        for num_edges in [int(float(x)) for x in args.edges]:
+            start = timer()
+            graph_info = run_in_child(prepare_graph, graph_dir, num_edges, args.mean_degree, args.seed, index_backends, args.max_pll_edges)
+            logger.info("graph with {} edges and {} vertices ready. took {}".format(num_edges, graph_info['vertices'], format_timespan(timer()-start)))
+            output['graphs'].append(graph_info)
+            latency_pairs = sample_pairs(graph_info, args.latency_pairs, args.seed)
+            batch_pairs = sample_pairs(graph_info, args.batch_pairs, args.seed + 1, num_sources=args.batch_sources)
+            for backend in backends:
+                if backend in INDEX_EXTENSIONS and backend not in graph_info['indexes']:
+                    logger.info("skipping the {} backend: no index for {} edges (see --max-pll-edges)".format(backend, num_edges))
+                    continue
+                if backend == 'igraph' and num_edges > args.max_igraph_edges:
+                    logger.info("skipping the igraph backend for {} edges (see --max-igraph-edges)".format(num_edges))
+                    continue
+                result = run_in_child(measure_backend, graph_info, backend, latency_pairs, batch_pairs, args.fallback_backend)
+                logger.info("{} edges, {}: load {}, id lookup {:.2f} us, latency p50 {p50:.2f} ms p99 {p99:.2f} ms, {:.1f} pairs/second, peak RSS {}".format(
+                    num_edges, backend, format_timespan(result['load_seconds']), result['id_lookup_us'], result['pairs_per_second'] or 0, format_size(result['peak_rss_bytes'] or 0), **result['latency_ms']))
+                output['results'].append(result)
+                if backend == 'igraph':
+                    # the workers share the memory-mapped CSR graph, which igraph cannot use
+                    continue
+                for processes in args.processes:
+                    result = run_in_child(measure_processes, graph_info, backend, processes, batch_pairs, args.chunk_size, args.fallback_backend)
+                    logger.info("{} edges, {}, {} processes: {:.1f} pairs/second, largest worker peak RSS {}".format(num_edges, backend, processes, result['pairs_per_second'], format_size(result['worker_peak_rss_bytes'] or 0)))
+                    output['results'].append(result)
+            with open(args.out, 'w') as outf:
+                json.dump(output, outf, indent=2)
+    finally:
+        if not args.graph_dir:
+            shutil.rmtree(graph_dir)
+    logger.info("wrote results to {}".format(args.out))
+
+if __name__ == "__main__":
+    total_start = timer()
+    logger = logging.getLogger(__name__)
+    logger.info(" ".join(sys.argv))
+    logger.info( '{:%Y-%m-%d %H:%M:%S}'.format(datetime.now()) )
+    import argparse
+    parser = argparse.ArgumentParser(description="benchmark the shortest path backends on seeded synthetic citation-like graphs (power-law degrees), writing the results as JSON", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-o", "--out", required=True, help="output file (JSON) with the version info, the graphs and one result per graph size, backend and process count")
+    parser.add_argument("--edges", nargs='+', default=['1e5', '1e6'], help="graph sizes, in edges (arcs). the real network is about 1e9, sizes up to 1e8 are practical")
+    parser.add_argument("--mean-degree", type=float, default=20, help="mean (undirected) degree of the synthetic graphs")
+    parser.add_argument("--seed", type=int, default=99, help="random seed for the graphs and the pairs")
+    parser.add_argument("--graph-dir", help="directory to keep the generated graphs and indexes in, and reuse them from on later runs (default: a temporary directory, removed at the end)")
+    parser.add_argument("--backends", nargs='+', choices=BACKENDS, help="backends to measure (default: all of them)")
+    parser.add_argument("--fallback-backend", choices=['bibfs', 'grouped', 'msbfs'], default='bibfs', help="fallback backend of the landmarks and reduced backends")
+    parser.add_argument("--processes", nargs='+', type=int, default=[1, 4], help="process counts for the multiprocessing runner's throughput")
+    parser.add_argument("--chunk-size", type=int, default=20, help="pairs per worker chunk for the process counts")
+    parser.add_argument("--latency-pairs", type=int, default=100, help="number of single-pair queries for the latency percentiles")
+    parser.add_argument("--batch-pairs", type=int, default=1000, help="number of pairs for the throughput measurements")
+    parser.add_argument("--batch-sources", type=int, default=100, help="number of distinct sources among the batch pairs (as with sampled category pairs)")
+    parser.add_argument("--max-igraph-edges", type=float, default=1e7, help="skip the igraph backend on larger graphs")
+    parser.add_argument("--max-pll-edges", type=float, default=1e5, help="skip building distance labels (and the pll backend) on larger graphs (the build takes minutes at 3e5 edges)")
+    parser.add_argument("--debug", action='store_true', help="output debugging info")
+    global args
+    args = parser.parse_args()
+    if args.debug:
+        logger.setLevel(logging.DEBUG)
+        logger.debug('debug mode is on')
+    else:
+        logger.setLevel(logging.INFO)
+    main(args)
+    total_end = timer()
+    logger.info('all finished. total time: {}'.format(format_timespan(total_end-total_start)))
@@ -0,0 +1,95 @@
+import sys, os, json, threading
+from datetime import datetime
+from timeit import default_timer as timer
+try:
+    from humanfriendly import format_timespan
+except ImportError:
+    def format_timespan(seconds):
+        return "{:.2f} seconds".format(seconds)
+
+import numpy as np
+
+from pairs_file import load_pairs_index, read_pairs
+from query_client import QueryClient
+
+import logging
+logging.basicConfig(format='%(asctime)s %(name)s.%(lineno)d %(levelname)s : %(message)s',
+        datefmt="%H:%M:%S",
+        level=logging.INFO)
+# logger = logging.getLogger(__name__)
+logger = logging.getLogger('__main__').getChild(__name__)
+
+def run_client(address, pairs, num_requests, pairs_per_request, seed, latencies):
+    """send num_requests requests of pairs_per_request random pairs, one at a time, appending each latency (seconds)"""
+    random_state = np.random.RandomState(seed)
+    with QueryClient(address) as client:
+        for _ in range(num_requests):
+            request_pairs = [pairs[i] for i in random_state.randint(len(pairs), size=pairs_per_request)]
+            start = timer()
+            client.query(request_pairs)
+            latencies.append(timer() - start)
+
+def main(args):
+    pairs_fname = os.path.abspath(args.pairs)
+    pairs = read_pairs(pairs_fname, 0, len(load_pairs_index(pairs_fname)))
+    with QueryClient(args.server) as client:
+        stats_before = client.stats()
+
+    latencies = [[] for _ in range(args.clients)]
+    threads = [threading.Thread(target=run_client, args=(args.server, pairs, args.requests, args.pairs_per_request, args.seed + i, latencies[i])) for i in range(args.clients)]
+    start = timer()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = timer() - start
+
+    with QueryClient(args.server) as client:
+        stats_after = client.stats()
+    latencies = np.array([latency for client_latencies in latencies for latency in client_latencies])
+    num_requests = len(latencies)
+    num_batches = stats_after['batches'] - stats_before['batches']
+    result = {
+        'clients': args.clients,
+        'requests': num_requests,
+        'pairs_per_request': args.pairs_per_request,
+        'seconds': elapsed,
+        'requests_per_second': num_requests / elapsed,
+        'pairs_per_second': num_requests * args.pairs_per_request / elapsed,
+        'latency_ms': {name: 1000.0 * float(np.percentile(latencies, q)) for name, q in (('p50', 50), ('p90', 90), ('p99', 99), ('max', 100))},
+        'batches': num_batches,
+        'requests_per_batch': num_requests / num_batches if num_batches else None,
+    }
+    logger.info("{} requests of {} pairs from {} clients in {}: {:.1f} requests/second, {:.1f} pairs/second".format(num_requests, args.pairs_per_request, args.clients, format_timespan(elapsed), result['requests_per_second'], result['pairs_per_second']))
+    logger.info("latency: p50 {p50:.1f} ms, p90 {p90:.1f} ms, p99 {p99:.1f} ms, max {max:.1f} ms".format(**result['latency_ms']))
+    if num_batches:
+        logger.info("the server ran {} batches ({:.1f} requests per batch)".format(num_batches, result['requests_per_batch']))
+    if args.out:
+        with open(args.out, 'w') as outf:
+            json.dump(result, outf, indent=2)
+
+if __name__ == "__main__":
+    total_start = timer()
+    logger = logging.getLogger(__name__)
+    logger.info(" ".join(sys.argv))
+    logger.info( '{:%Y-%m-%d %H:%M:%S}'.format(datetime.now()) )
+    import argparse
+    parser = argparse.ArgumentParser(description="measure the latency and throughput of a running query_server.py, with concurrent clients sending random pairs from a pairs file", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("server", help="address of the query server (Unix socket path, or host:port)")
+    parser.add_argument("pairs", help="tsv file with pairs samples")
+    parser.add_argument("--clients", type=int, default=8, help="number of concurrent clients")
+    parser.add_argument("--requests", type=int, default=50, help="number of requests per client")
+    parser.add_argument("--pairs-per-request", type=int, default=10, help="number of pairs per request")
+    parser.add_argument("--seed", type=int, default=99, help="random seed")
+    parser.add_argument("-o", "--out", help="also write the results to this file (JSON)")
+    parser.add_argument("--debug", action='store_true', help="output debugging info")
+    global args
+    args = parser.parse_args()
+    if args.debug:
+        logger.setLevel(logging.DEBUG)
+        logger.debug('debug mode is on')
+    else:
+        logger.setLevel(logging.INFO)
+    main(args)
+    total_end = timer()
+    logger.info('all finished. total time: {}'.format(format_timespan(total_end-total_start)))
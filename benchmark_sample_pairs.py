@@ -0,0 +1,120 @@
+import sys, os, json, shutil, tempfile
+from argparse import Namespace
+from datetime import datetime
+from timeit import default_timer as timer
+try:
+    from humanfriendly import format_timespan
+except ImportError:
+    def format_timespan(seconds):
+        return "{:.2f} seconds".format(seconds)
+
+import pandas as pd
+import numpy as np
+
+import get_sample_pairs
+from pairs_file import scan_pairs_file, get_offsets_fname, get_groups_fname, read_groups
+
+import logging
+logging.basicConfig(format='%(asctime)s %(name)s.%(lineno)d %(levelname)s : %(message)s',
+        datefmt="%H:%M:%S",
+        level=logging.INFO)
+# logger = logging.getLogger(__name__)
+logger = logging.getLogger('__main__').getChild(__name__)
+
+def make_papers_table(fname, num_papers, num_categories, seed):
+    """write a synthetic papers table (arxiv_id, mag_id, category_broad) with skewed category sizes"""
+    random_state = np.random.RandomState(seed)
+    weights = 1.0 / np.arange(1, num_categories + 1)
+    categories = random_state.choice(num_categories, size=num_papers, p=weights / weights.sum())
+    df = pd.DataFrame({
+        'arxiv_id': ['a{}'.format(i) for i in range(num_papers)],
+        'mag_id': [str(x) for x in random_state.permutation(num_papers) + 1000000],
+        'category_broad': ['cat{:02d}'.format(c) for c in categories],
+    })
+    df.to_csv(fname, sep='\t', index=False)
+
+def legacy_sample_pairs(input_fname, output_fname, min_papers, sample_size, seed):
+    """the sampler get_sample_pairs.py used to have: one random_state.choice and one df.loc lookup at a time"""
+    df = pd.read_csv(input_fname, sep='\t', dtype=str)
+    gb = df.groupby('category_broad').filter(lambda x: len(x) > min_papers).groupby('category_broad')
+    random_state = np.random.RandomState(seed)
+    with open(output_fname, 'w') as outf:
+        for name1, indices1 in gb.groups.items():
+            for name2, indices2 in gb.groups.items():
+                outf.write("# {}\t{}\n".format(name1, name2))
+                sample_pairs = set()
+                while len(sample_pairs) < sample_size:
+                    source = random_state.choice(indices1)
+                    target = random_state.choice(indices2)
+                    sample_pairs.add((source, target))
+                    outf.write('\t'.join([df.loc[source]['arxiv_id'], df.loc[source]['mag_id'], df.loc[target]['arxiv_id'], df.loc[target]['mag_id']]))
+                    outf.write('\n')
+
+def check_sidecars(pairs_fname, sample_size):
+    """the sidecar files must match a scan of the pairs file, with sample_size distinct pairs per category pair"""
+    offsets, _ = scan_pairs_file(pairs_fname)
+    if not np.array_equal(offsets, np.load(get_offsets_fname(pairs_fname))):
+        raise RuntimeError("offsets sidecar does not match {}".format(pairs_fname))
+    with open(pairs_fname, 'r') as f:
+        lines = [line for line in f if not line.startswith('#')]
+    for start_idx, end_idx, category1, category2 in read_groups(get_groups_fname(pairs_fname)):
+        if end_idx - start_idx != sample_size or len(set(lines[start_idx:end_idx])) != sample_size:
+            raise RuntimeError("category pair {} {} does not have {} distinct pairs".format(category1, category2, sample_size))
+
+def main(args):
+    tmpdir = tempfile.mkdtemp(prefix='benchmark_sample_pairs_')
+    results = []
+    try:
+        input_fname = os.path.join(tmpdir, 'papers.tsv')
+        make_papers_table(input_fname, args.num_papers, args.num_categories, args.seed)
+        logger.info("{} papers in {} categories".format(args.num_papers, args.num_categories))
+        for scale in (1, 10):
+            sample_size = args.sample_size * scale
+            output_fname = os.path.join(tmpdir, 'pairs_{}.tsv'.format(sample_size))
+            start = timer()
+            get_sample_pairs.main(Namespace(input=input_fname, output=output_fname, sep='\t', category_colname='category_broad',
+                                            min_papers=args.min_papers, seed=args.seed, sample_size=sample_size, unique=True, no_headers=True))
+            elapsed = timer() - start
+            check_sidecars(output_fname, sample_size)
+            num_pairs = len(np.load(get_offsets_fname(output_fname)))
+            logger.info("vectorized sampler, sample size {}: {} pairs in {} ({:.0f} pairs/second)".format(sample_size, num_pairs, format_timespan(elapsed), num_pairs / elapsed))
+            results.append({'sampler': 'vectorized', 'sample_size': sample_size, 'pairs': num_pairs, 'seconds': elapsed})
+        if not args.no_legacy:
+            output_fname = os.path.join(tmpdir, 'pairs_legacy.tsv')
+            start = timer()
+            legacy_sample_pairs(input_fname, output_fname, args.min_papers, args.sample_size, args.seed)
+            elapsed = timer() - start
+            num_pairs = len(scan_pairs_file(output_fname)[0])
+            logger.info("legacy sampler, sample size {}: {} pairs in {} ({:.0f} pairs/second)".format(args.sample_size, num_pairs, format_timespan(elapsed), num_pairs / elapsed))
+            results.append({'sampler': 'legacy', 'sample_size': args.sample_size, 'pairs': num_pairs, 'seconds': elapsed})
+    finally:
+        shutil.rmtree(tmpdir)
+    if args.out:
+        with open(args.out, 'w') as outf:
+            json.dump(results, outf, indent=2)
+
+if __name__ == "__main__":
+    total_start = timer()
+    logger = logging.getLogger(__name__)
+    logger.info(" ".join(sys.argv))
+    logger.info( '{:%Y-%m-%d %H:%M:%S}'.format(datetime.now()) )
+    import argparse
+    parser = argparse.ArgumentParser(description="time get_sample_pairs.py on a synthetic papers table, at the given sample size and at 10 times that", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--num-papers", type=int, default=200000, help="number of papers in the synthetic table")
+    parser.add_argument("--num-categories", type=int, default=20, help="number of categories in the synthetic table")
+    parser.add_argument("--min-papers", type=int, default=500, help="categories with fewer than this many papers are filtered out")
+    parser.add_argument("--sample-size", type=int, default=500, help="number of sample pairs for each pair of categories")
+    parser.add_argument("--seed", type=int, default=99, help="random seed")
+    parser.add_argument("--no-legacy", action='store_true', help="don't time the old one-pair-at-a-time sampler (slow)")
+    parser.add_argument("-o", "--out", help="also write the results to this file (JSON)")
+    parser.add_argument("--debug", action='store_true', help="output debugging info")
+    global args
+    args = parser.parse_args()
+    if args.debug:
+        logger.setLevel(logging.DEBUG)
+        logger.debug('debug mode is on')
+    else:
+        logger.setLevel(logging.INFO)
+    main(args)
+    total_end = timer()
+    logger.info('all finished. total time: {}'.format(format_timespan(total_end-total_start)))
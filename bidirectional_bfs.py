@@ -0,0 +1,192 @@
+import numpy as np
+
+# direction-optimizing thresholds (Beamer et al.)
+# switch a search direction to bottom-up when the edges out of its frontier exceed (unexplored edges / ALPHA),
+# and back to top-down when its frontier has fewer than (number of vertices / BETA) vertices
+ALPHA = 14
+BETA = 24
+
+class SearchSide(object):
+    """a direction-optimizing BFS from root, advanced one level at a time by step().
+    used for each direction of the bidirectional search. the caller sets dist[root] = 0.
+    edges_scanned and max_frontier count the work done (adjacency entries read, and the largest level)"""
+    def __init__(self, G, dist, root):
+        self.G = G
+        self.dist = dist
+        self.level = 0
+        self.frontier = np.array([root], dtype=np.int64)
+        self.frontier_edges = G.degree(root)
+        self.unexplored_edges = G.num_adjacency_entries() - self.frontier_edges
+        self.bottom_up = False
+        self.edges_scanned = 0
+        self.max_frontier = 1
+
+    def choose_direction(self):
+        if not self.bottom_up:
+            if self.frontier_edges > self.unexplored_edges / ALPHA:
+                self.bottom_up = True
+        elif len(self.frontier) < self.G.num_vertices / BETA:
+            self.bottom_up = False
+
+    def top_down_step(self):
+        nbrs = self.G.expand(self.frontier)
+        nbrs = nbrs[self.dist[nbrs] < 0]
+        return np.unique(nbrs)
+
+    def bottom_up_step(self):
+        # every unvisited vertex checks whether any of its neighbors is in the frontier
+        unvisited = np.flatnonzero(self.dist < 0)
+        nbrs, segments = self.G.expand(unvisited, return_segments=True)
+        self.edges_scanned += len(nbrs)
+        hit = self.dist[nbrs] == self.level
+        found = np.bincount(segments[hit], minlength=len(unvisited)) > 0
+        return unvisited[found]
+
+    def step(self):
+        """advance this side by one full BFS level. returns the newly reached vertices"""
+        self.choose_direction()
+        if self.bottom_up:
+            new = self.bottom_up_step()
+        else:
+            self.edges_scanned += self.frontier_edges
+            new = self.top_down_step()
+        self.level += 1
+        self.max_frontier = max(self.max_frontier, len(new))
+        self.dist[new] = self.level
+        self.frontier = new
+        self.frontier_edges = int(self.G.degrees(new).sum())
+        self.unexplored_edges -= self.frontier_edges
+        return new
+
+def bidirectional_bfs_length(G, source, target, stats=None):
+    """undirected shortest path length between two vertex indices of the CSRGraph G.
+
+    searches from both ends, always expanding the side with the smaller frontier,
+    and stops at the first level where the two searches meet.
+    returns float('inf') if there is no path.
+    the work done is added to stats (a query_metrics.TraversalStats), if given"""
+    if source == target:
+        return 0
+    dist_source, dist_target = G.get_workspace()
+    touched = [np.array([source, target], dtype=np.int64)]
+    sides = ()
+    try:
+        dist_source[source] = 0
+        dist_target[target] = 0
+        sides = (SearchSide(G, dist_source, source), SearchSide(G, dist_target, target))
+        while True:
+            if sides[0].frontier_edges <= sides[1].frontier_edges:
+                this_side, other_side = sides
+            else:
+                other_side, this_side = sides
+            new = this_side.step()
+            touched.append(new)
+            if len(new) == 0:
+                # this side's component is exhausted without meeting the other side
+                return float('inf')
+            other_dist = other_side.dist[new]
+            met = other_dist >= 0
+            if met.any():
+                # the whole level was expanded, so the minimum over all meeting vertices is exact
+                return int(this_side.level + other_dist[met].min())
+    finally:
+        if stats is not None:
+            stats.add_search(sum(len(vertices) for vertices in touched), sides)
+        for vertices in touched:
+            dist_source[vertices] = -1
+            dist_target[vertices] = -1
+
+class CountingSearchSide(SearchSide):
+    """a SearchSide that also counts the shortest paths from root to every vertex it reaches.
+    counts is a float64 array, all 0 except counts[root] = 1 (set by the caller)"""
+    def __init__(self, G, dist, root, counts):
+        SearchSide.__init__(self, G, dist, root)
+        self.counts = counts
+
+    def top_down_step(self):
+        nbrs, segments = self.G.expand(self.frontier, return_segments=True)
+        unvisited = self.dist[nbrs] < 0
+        nbrs = nbrs[unvisited]
+        # a new vertex is reached by a shortest path through every frontier vertex it is adjacent to
+        np.add.at(self.counts, nbrs, self.counts[self.frontier[segments[unvisited]]])
+        return np.unique(nbrs)
+
+    def bottom_up_step(self):
+        unvisited = np.flatnonzero(self.dist < 0)
+        nbrs, segments = self.G.expand(unvisited, return_segments=True)
+        self.edges_scanned += len(nbrs)
+        hit = self.dist[nbrs] == self.level
+        # (every frontier vertex has a count of at least 1, so a positive sum means it was found)
+        sums = np.bincount(segments[hit], weights=self.counts[nbrs[hit]], minlength=len(unvisited))
+        found = sums > 0
+        new = unvisited[found]
+        self.counts[new] = sums[found]
+        return new
+
+def _walk_to_root(G, dist, v):
+    """vertices from v back to the root of a search, following distances that decrease by one"""
+    path = [int(v)]
+    while dist[v] > 0:
+        nbrs = G.neighbors_of(v)
+        v = nbrs[dist[nbrs] == dist[v] - 1][0]
+        path.append(int(v))
+    return path
+
+def _exact_count(num_paths):
+    # the counts are float64 so that they cannot overflow. they are exact up to 2**53
+    return int(num_paths) if num_paths < 2 ** 53 else num_paths
+
+def bidirectional_bfs_path(G, source, target, count_paths=False, stats=None):
+    """undirected shortest path length, one shortest path and (if count_paths) the number of distinct
+    shortest paths between two vertex indices of the CSRGraph G, from the single search of bidirectional_bfs_length.
+
+    the numbers of shortest paths from each end are accumulated level by level during the search, and the paths
+    through the vertices where the two searches meet are multiplied together, so no paths are enumerated.
+    returns (length, path, num_paths): path is the list of vertex indices from source to target, and num_paths is
+    None unless count_paths. with no path, returns (float('inf'), None, 0) (num_paths None unless count_paths)"""
+    if source == target:
+        return 0, [int(source)], 1 if count_paths else None
+    dist_source, dist_target = G.get_workspace()
+    counts = G.get_count_workspace() if count_paths else None
+    touched = [np.array([source, target], dtype=np.int64)]
+    sides = ()
+    try:
+        dist_source[source] = 0
+        dist_target[target] = 0
+        if count_paths:
+            counts[0][source] = 1
+            counts[1][target] = 1
+            sides = (CountingSearchSide(G, dist_source, source, counts[0]), CountingSearchSide(G, dist_target, target, counts[1]))
+        else:
+            sides = (SearchSide(G, dist_source, source), SearchSide(G, dist_target, target))
+        while True:
+            if sides[0].frontier_edges <= sides[1].frontier_edges:
+                this_side, other_side = sides
+            else:
+                other_side, this_side = sides
+            new = this_side.step()
+            touched.append(new)
+            if len(new) == 0:
+                return float('inf'), None, 0 if count_paths else None
+            other_dist = other_side.dist[new]
+            met = other_dist >= 0
+            if met.any():
+                # every shortest path crosses this side's newest level at exactly one vertex, one whose
+                # distance from the other end is the smallest among the meeting vertices
+                other_level = other_dist[met].min()
+                meeting = new[met][other_dist[met] == other_level]
+                num_paths = None
+                if count_paths:
+                    num_paths = _exact_count(float(np.dot(this_side.counts[meeting], other_side.counts[meeting])))
+                source_half = _walk_to_root(G, dist_source, meeting[0])
+                target_half = _walk_to_root(G, dist_target, meeting[0])
+                return int(this_side.level + other_level), source_half[::-1] + target_half[1:], num_paths
+    finally:
+        if stats is not None:
+            stats.add_search(sum(len(vertices) for vertices in touched), sides)
+        for vertices in touched:
+            dist_source[vertices] = -1
+            dist_target[vertices] = -1
+            if count_paths:
+                counts[0][vertices] = 0
+                counts[1][vertices] = 0
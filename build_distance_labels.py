@@ -0,0 +1,94 @@
+import sys, os
+from datetime import datetime
+from timeit import default_timer as timer
+try:
+    from humanfriendly import format_timespan, format_size
+except ImportError:
+    def format_timespan(seconds):
+        return "{:.2f} seconds".format(seconds)
+    def format_size(num_bytes):
+        return "{} bytes".format(num_bytes)
+
+import numpy as np
+
+from pruned_landmark_labeling import build_distance_labels, load_distance_labels
+from shortest_path_length_utils import load_graph, as_csr_graph, get_shortest_path_length_for_vertices
+
+import logging
+logging.basicConfig(format='%(asctime)s %(name)s.%(lineno)d %(levelname)s : %(message)s',
+        datefmt="%H:%M:%S",
+        level=logging.INFO)
+# logger = logging.getLogger(__name__)
+logger = logging.getLogger('__main__').getChild(__name__)
+
+def get_verification_pairs(num_vertices, num_pairs, seed, all_pairs=False):
+    if all_pairs:
+        sources, targets = np.meshgrid(np.arange(num_vertices), np.arange(num_vertices))
+        return sources.ravel(), targets.ravel()
+    random_state = np.random.RandomState(seed)
+    return random_state.randint(num_vertices, size=num_pairs), random_state.randint(num_vertices, size=num_pairs)
+
+def verify(G, labels, sources, targets):
+    """compare label queries against the graph's own shortest path lengths. returns the number of mismatches"""
+    num_mismatches = 0
+    for source, target in zip(sources, targets):
+        expected = get_shortest_path_length_for_vertices(G, int(source), int(target))
+        got = labels.query(int(source), int(target))
+        if expected != got:
+            logger.warning("mismatch for vertices {} and {}: shortest path length {}, labels give {}".format(source, target, expected, got))
+            num_mismatches += 1
+    return num_mismatches
+
+def main(args):
+    graph_fname = os.path.abspath(args.graph)
+    start = timer()
+    logger.debug("loading graph from file: {}...".format(graph_fname))
+    G = load_graph(graph_fname)
+    G_csr = as_csr_graph(G)
+    logger.debug("done loading graph ({} vertices, {} edges). took {}".format(G_csr.num_vertices, G_csr.num_adjacency_entries() // 2, format_timespan(timer()-start)))
+
+    start = timer()
+    def progress(num_roots_done):
+        logger.debug("labeled from {} of {} roots. {} so far".format(num_roots_done, G_csr.num_vertices, format_timespan(timer()-start)))
+    logger.debug("building pruned landmark labels with {} processes...".format(args.processes))
+    labels = build_distance_labels(G_csr, processes=args.processes, sequential_roots=args.sequential_roots, progress=progress)
+    build_time = timer() - start
+
+    output_fname = os.path.abspath(args.output)
+    labels.save(output_fname)
+    logger.info("built labels in {}. {} label entries ({:.1f} per vertex). index size: {}".format(format_timespan(build_time), labels.num_entries(), labels.num_entries() / max(1, labels.num_vertices), format_size(os.path.getsize(output_fname))))
+
+    if args.verify or args.verify_all:
+        labels = load_distance_labels(output_fname)
+        sources, targets = get_verification_pairs(labels.num_vertices, args.verify, args.seed, all_pairs=args.verify_all)
+        start = timer()
+        num_mismatches = verify(G, labels, sources, targets)
+        logger.info("verified {} pairs against the graph: {} mismatches. took {}".format(len(sources), num_mismatches, format_timespan(timer()-start)))
+        if num_mismatches:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    total_start = timer()
+    logger = logging.getLogger(__name__)
+    logger.info(" ".join(sys.argv))
+    logger.info( '{:%Y-%m-%d %H:%M:%S}'.format(datetime.now()) )
+    import argparse
+    parser = argparse.ArgumentParser(description="build a pruned landmark labeling index (exact distance oracle) for a network, for use with --backend pll", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("graph", help="network graph (Pajek .net file or binary CSR file)")
+    parser.add_argument("output", help="output file for the distance labels")
+    parser.add_argument("--processes", type=int, default=1, help="number of processes for the parallel part of the build")
+    parser.add_argument("--sequential-roots", type=int, default=1024, help="number of highest-degree roots to label sequentially before going parallel")
+    parser.add_argument("--verify", type=int, default=0, help="number of random vertex pairs to check against the shortest path lengths from the graph")
+    parser.add_argument("--verify-all", action='store_true', help="check all vertex pairs (small graphs only)")
+    parser.add_argument("--seed", type=int, default=99, help="random seed for --verify")
+    parser.add_argument("--debug", action='store_true', help="output debugging info")
+    global args
+    args = parser.parse_args()
+    if args.debug:
+        logger.setLevel(logging.DEBUG)
+        logger.debug('debug mode is on')
+    else:
+        logger.setLevel(logging.INFO)
+    main(args)
+    total_end = timer()
+    logger.info('all finished. total time: {}'.format(format_timespan(total_end-total_start)))
@@ -0,0 +1,60 @@
+import sys, os
+from datetime import datetime
+from timeit import default_timer as timer
+try:
+    from humanfriendly import format_timespan, format_size
+except ImportError:
+    def format_timespan(seconds):
+        return "{:.2f} seconds".format(seconds)
+    def format_size(num_bytes):
+        return "{} bytes".format(num_bytes)
+
+from landmarks import build_landmark_index
+from shortest_path_length_utils import load_graph, as_csr_graph
+
+import logging
+logging.basicConfig(format='%(asctime)s %(name)s.%(lineno)d %(levelname)s : %(message)s',
+        datefmt="%H:%M:%S",
+        level=logging.INFO)
+# logger = logging.getLogger(__name__)
+logger = logging.getLogger('__main__').getChild(__name__)
+
+def main(args):
+    graph_fname = os.path.abspath(args.graph)
+    start = timer()
+    logger.debug("loading graph from file: {}...".format(graph_fname))
+    G = as_csr_graph(load_graph(graph_fname))
+    logger.debug("done loading graph. took {}".format(format_timespan(timer()-start)))
+
+    start = timer()
+    logger.debug("running BFS from {} landmarks chosen by {}...".format(args.num_landmarks, args.strategy))
+    index = build_landmark_index(G, args.num_landmarks, strategy=args.strategy, processes=args.processes)
+    build_time = timer() - start
+
+    output_fname = os.path.abspath(args.output)
+    index.save(output_fname)
+    logger.info("built distance vectors for {} landmarks in {}. index size: {}".format(index.num_landmarks, format_timespan(build_time), format_size(os.path.getsize(output_fname))))
+
+if __name__ == "__main__":
+    total_start = timer()
+    logger = logging.getLogger(__name__)
+    logger.info(" ".join(sys.argv))
+    logger.info( '{:%Y-%m-%d %H:%M:%S}'.format(datetime.now()) )
+    import argparse
+    parser = argparse.ArgumentParser(description="precompute BFS distance vectors from landmark vertices, for distance bounds with --backend landmarks", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("graph", help="network graph (Pajek .net file or binary CSR file)")
+    parser.add_argument("output", help="output file for the landmark distance vectors")
+    parser.add_argument("-k", "--num-landmarks", type=int, default=16, help="number of landmarks")
+    parser.add_argument("--strategy", choices=['degree', 'farthest'], default='degree', help="how to choose landmarks: highest degree, or farthest-first")
+    parser.add_argument("--processes", type=int, default=1, help="number of processes for the BFSs (degree strategy only)")
+    parser.add_argument("--debug", action='store_true', help="output debugging info")
+    global args
+    args = parser.parse_args()
+    if args.debug:
+        logger.setLevel(logging.DEBUG)
+        logger.debug('debug mode is on')
+    else:
+        logger.setLevel(logging.INFO)
+    main(args)
+    total_end = timer()
+    logger.info('all finished. total time: {}'.format(format_timespan(total_end-total_start)))
@@ -1,4 +1,4 @@
-import sys, os, time
+import sys, os
 from datetime import datetime
 from timeit import default_timer as timer
 try:
@@ -7,7 +7,15 @@ except ImportError:
     def format_timespan(seconds):
         return "{:.2f} seconds".format(seconds)
 
-from shortest_path_length_utils import load_graph, get_shortest_path_length_for_one_pair
+import numpy as np
+
+from pairs_file import read_pairs, read_pairs_by_index, load_pairs_index
+from result_store import is_result_file, create_result_file, open_result_file_for_task
+from query_client import QueryClient
+from query_metrics import QueryMetrics, measured_shortest_path_lengths
+from distance_cache import DistanceCache, SourceDistanceCache, cached_shortest_path_lengths, format_cache_stats
+from checkpoint import Checkpoint, TimeBudget, open_output_for_task, commit_rows, load_checkpoint, get_checkpoint_fname, EXIT_INCOMPLETE
+from shortest_path_length_utils import load_graph_for_backend, load_id_index, get_vertex_seq_ids_for_pairs, get_shortest_path_lengths_for_vertex_pairs, get_landmark_bounds, load_distance_index, get_shortest_paths_for_vertex_pairs, format_path, as_csr_graph, BACKENDS, INDEX_BACKENDS
 
 import logging
 logging.basicConfig(format='%(asctime)s %(name)s.%(lineno)d %(levelname)s : %(message)s',
@@ -16,59 +24,193 @@ logging.basicConfig(format='%(asctime)s %(name)s.%(lineno)d %(levelname)s : %(me
 # logger = logging.getLogger(__name__)
 logger = logging.getLogger('__main__').getChild(__name__)
 
-class Pair(object):
-    def __init__(self, source_arxiv_id, source_mag_id, target_arxiv_id, target_mag_id):
-        self.source_arxiv_id = source_arxiv_id
-        self.source_mag_id = source_mag_id
-        self.target_arxiv_id = target_arxiv_id
-        self.target_mag_id = target_mag_id
-        
-
 def main(args):
-    graph_fname = os.path.abspath(args.graph)
-    start = timer()
-    logger.debug("loading graph from file: {}...".format(graph_fname))
-    G = load_graph(graph_fname)
-    logger.debug("done loading graph. took {}".format(format_timespan(timer()-start)))
+    # the time budget counts from here, so it includes loading the graph
+    budget = TimeBudget(args.time_budget, margin=args.time_budget_margin) if args.time_budget else None
+    G = id_index = index = client = cache = source_cache = metrics = None
+    bounds_only = args.bounds_only
+    if args.server:
+        # the server has the graph loaded already, and answers with its own backend
+        if args.backend or args.index or args.bounds_only or args.metrics or args.cache or args.source_cache_mb:
+            raise RuntimeError("with --server, the server's backend options apply, so --backend, --index, --bounds-only, --metrics and the caches cannot be used")
+        logger.debug("connecting to the query server at {}".format(args.server))
+        client = QueryClient(args.server)
+        bounds_only = client.options()['bounds_only']
+        if bounds_only:
+            logger.debug("the query server answers with landmark bounds (--bounds-only)")
+    else:
+        if args.backend is None:
+            args.backend = 'igraph'
+        graph_fname = os.path.abspath(args.graph)
+        start = timer()
+        logger.debug("loading graph from file: {}...".format(graph_fname))
+        G = load_graph_for_backend(graph_fname, args.backend, fallback_backend=args.fallback_backend)
+        logger.debug("done loading graph. took {}".format(format_timespan(timer()-start)))
+        start = timer()
+        id_index = load_id_index(graph_fname, G)
+        logger.debug("done loading id index. took {}".format(format_timespan(timer()-start)))
+        if args.index:
+            start = timer()
+            index = load_distance_index(os.path.abspath(args.index))
+            logger.debug("done loading distance index from {}. took {}".format(args.index, format_timespan(timer()-start)))
+        elif args.backend in INDEX_BACKENDS:
+            raise RuntimeError("the {} backend needs a distance index (--index)".format(args.backend))
+        if args.backend == 'reduced' and args.fallback_backend == 'igraph':
+            raise RuntimeError("the reduced backend answers its core graph queries with a CSR backend (bibfs, grouped or msbfs)")
+        if args.bounds_only and args.backend != 'landmarks':
+            raise RuntimeError("--bounds-only needs the landmarks backend")
+        if args.metrics:
+            if args.bounds_only or args.cache or args.source_cache_mb:
+                raise RuntimeError("--metrics measures the backend itself, without --bounds-only or the caches")
+            metrics = QueryMetrics(os.path.abspath(args.metrics))
+        if args.paths or args.count_paths:
+            if args.backend in INDEX_BACKENDS or args.bounds_only or args.metrics or args.cache or args.source_cache_mb:
+                raise RuntimeError("--paths and --count-paths answer every pair with a bidirectional BFS, so they cannot be used with the index backends, --bounds-only, --metrics or the caches")
+            G = as_csr_graph(G)
+        if args.cache:
+            cache = DistanceCache(os.path.abspath(args.cache), as_csr_graph(G).fingerprint())
+        if args.source_cache_mb:
+            source_cache = SourceDistanceCache(int(args.source_cache_mb * 1024 * 1024), min_uses=args.source_cache_min_uses)
 
     output_fname = os.path.abspath(args.out)
-    logger.debug("opening output file for writing: {}".format(output_fname))
-    outf = open(output_fname, 'w')
-
+    pair_indices = None
+    indices_fname = None
+    if args.indices:
+        # a task from plan_tasks.py: start_idx and end_idx are positions in its list of pair indices
+        indices_fname = os.path.abspath(args.indices)
+        pair_indices = np.load(indices_fname)
     start_idx = args.start
-    end_idx = start_idx + args.num
+    if args.num is not None:
+        end_idx = start_idx + args.num
+    elif pair_indices is not None:
+        end_idx = len(pair_indices)
+    else:
+        end_idx = start_idx + 80
     logger.debug("starting with pair number {}. ending with (and not including) pair number {}".format(start_idx, end_idx))
-    pairs = []
+    # a .npy output is a result file (see result_store.py) with one typed row per pair of the task
+    result_file = is_result_file(output_fname)
+    if result_file and bounds_only:
+        raise RuntimeError("result files (.npy) hold exact lengths. write the bounds to a tsv output{}".format(" (the query server answers with bounds)" if client is not None else ""))
+    if ( result_file or client is not None ) and ( args.paths or args.count_paths ):
+        raise RuntimeError("--paths and --count-paths need a tsv output, and the graph loaded by this process (not --server)")
 
-    # collect the pairs we will calculate shortest path for
-    with open(args.pairs, 'r') as f:
-        pair_idx = 0
-        for line in f:
-            if line[0] == "#":
-                # ignore comments
-                continue
-            if pair_idx == end_idx:
-                break
-            if pair_idx >= start_idx:
-                line = line.strip().split('\t')
-                pair = Pair(*line)
-                pairs.append(pair)
-            pair_idx += 1
+    def get_pairs(first_idx, last_idx):
+        if pair_indices is None:
+            # (seeks straight to first_idx using the pairs file's offset index)
+            return read_pairs(args.pairs, first_idx, last_idx)
+        return read_pairs_by_index(args.pairs, pair_indices[first_idx:last_idx])
+
+    def calculate(pairs):
+        """output values for each pair: (shortest_path_length, ) or, with --bounds-only, (lower_bound, upper_bound).
+        --paths and --count-paths add the path and the number of shortest paths after the length"""
+        if client is not None:
+            return client.query(pairs)
+        if metrics is not None:
+            return [(sp_length, ) for sp_length in measured_shortest_path_lengths(G, id_index, pairs, metrics, args.backend, index=index, fallback_backend=args.fallback_backend)]
+        source_vertices, target_vertices, missing_ids = get_vertex_seq_ids_for_pairs(id_index, pairs)
+        if missing_ids:
+            logger.debug("{} ids were not found in the graph: {}".format(len(missing_ids), ", ".join(missing_ids)))
+        if args.bounds_only:
+            lower, upper = get_landmark_bounds(index, source_vertices, target_vertices)
+            return list(zip(lower, upper))
+        if args.paths or args.count_paths:
+            # the length, path and count of each pair come from the same traversal
+            results = []
+            for sp_length, path, num_paths in get_shortest_paths_for_vertex_pairs(G, source_vertices, target_vertices, count_paths=args.count_paths):
+                results.append((sp_length, ) + ((format_path(path), ) if args.paths else ()) + ((num_paths, ) if args.count_paths else ()))
+            return results
+        def compute(source_vertices, target_vertices):
+            # pairs that share an endpoint are served by a single traversal (depending on the backend)
+            return get_shortest_path_lengths_for_vertex_pairs(G, source_vertices, target_vertices, backend=args.backend, index=index, fallback_backend=args.fallback_backend)
+        if cache is None and source_cache is None:
+            sp_lengths = compute(source_vertices, target_vertices)
+        else:
+            sp_lengths = cached_shortest_path_lengths(G, [pair.source_mag_id for pair in pairs], [pair.target_mag_id for pair in pairs], source_vertices, target_vertices, compute, cache=cache, source_cache=source_cache)
+        return [(sp_length, ) for sp_length in sp_lengths]
 
-    # do the calculations and write to file
-    start = timer()
-    logger.debug("starting shortest path length calculations for {} pairs...".format(len(pairs)))
-    for pair in pairs:
-        start_pair = timer()
-        sp_length = get_shortest_path_length_for_one_pair(G, pair.source_mag_id, pair.target_mag_id)
-        output_row = [str(pair.source_arxiv_id), str(pair.target_arxiv_id), str(sp_length)]
-        outf.write("\t".join(output_row))
-        outf.write("\n")
-        logger.debug("done calculating shortest path for {} to {}. sp_length: {}. took {}".format(output_row[0], output_row[1], output_row[2], format_timespan(timer()-start_pair)))
-    logger.debug("done calculating shortest paths for {} pairs. took {}".format(len(pairs), format_timespan(timer()-start)))
+    def get_task_pair_indices():
+        """indices in the pairs file of all of the pairs of this task"""
+        if pair_indices is None:
+            return np.arange(start_idx, min(end_idx, len(load_pairs_index(args.pairs))), dtype=np.int64)
+        return np.asarray(pair_indices[start_idx:end_idx], dtype=np.int64)
 
+    # (checked once, rather than formatting a debug line for every pair)
+    debug = logger.isEnabledFor(logging.DEBUG)
+
+    def write_rows(outf, first_idx, pairs, results):
+        if result_file:
+            outf.write(first_idx - start_idx, [values[0] for values in results])
+            return
+        for pair, values in zip(pairs, results):
+            output_row = [str(pair.source_arxiv_id), str(pair.target_arxiv_id)] + [str(x) for x in values]
+            outf.write("\t".join(output_row))
+            outf.write("\n")
+            if debug:
+                logger.debug("shortest path for {} to {}: {}".format(output_row[0], output_row[1], " ".join(output_row[2:])))
+
+    status = None
+    if budget is None:
+        logger.debug("opening output file for writing: {}".format(output_fname))
+        outf = create_result_file(output_fname, get_task_pair_indices()) if result_file else open(output_fname, 'w')
+        # collect the pairs we will calculate shortest path for
+        pairs = get_pairs(start_idx, end_idx)
+
+        # do the calculations and write to file
+        start = timer()
+        logger.debug("starting shortest path length calculations for {} pairs...".format(len(pairs)))
+        write_rows(outf, start_idx, pairs, calculate(pairs))
+        logger.debug("done calculating shortest paths for {} pairs. took {}".format(len(pairs), format_timespan(timer()-start)))
+    else:
+        # resume from the checkpoint of an earlier run of the same task, if there is one
+        task = Checkpoint(os.path.abspath(args.pairs), start_idx, end_idx, indices_fname=indices_fname)
+        if result_file:
+            outf, checkpoint = open_result_file_for_task(output_fname, get_task_pair_indices(), load_checkpoint(get_checkpoint_fname(output_fname)), task)
+        else:
+            outf, checkpoint = open_output_for_task(output_fname, task)
+        if checkpoint.complete:
+            logger.info("all pairs of this task are already in {}. nothing to do".format(output_fname))
+            outf.close()
+            return status
+        if checkpoint.next_idx > start_idx:
+            logger.info("resuming from the checkpoint at pair number {}".format(checkpoint.next_idx))
+        pairs = get_pairs(checkpoint.next_idx, end_idx)
+
+        start = timer()
+        logger.debug("starting shortest path length calculations for {} pairs with {} left of the time budget...".format(len(pairs), format_timespan(budget.remaining())))
+        pos = 0
+        while pos < len(pairs):
+            batch_size = budget.next_batch_size(args.batch_size)
+            if batch_size == 0:
+                break
+            batch = pairs[pos:pos+batch_size]
+            batch_start = timer()
+            results = calculate(batch)
+            budget.record(len(batch), timer()-batch_start)
+            write_rows(outf, checkpoint.next_idx, batch, results)
+            pos += len(batch)
+            # make the rows durable before recording them as done
+            commit_rows(outf, checkpoint, output_fname, end_idx if pos >= len(pairs) else checkpoint.next_idx + len(batch))
+        if pos < len(pairs):
+            logger.info("stopping before the time budget runs out: did {} pairs ({:.3g} seconds per pair), {} left. the next run of this task resumes at pair number {}".format(pos, budget.pair_cost() or 0, len(pairs) - pos, checkpoint.next_idx))
+            status = EXIT_INCOMPLETE
+        else:
+            if len(pairs) == 0:
+                commit_rows(outf, checkpoint, output_fname, end_idx)
+            logger.debug("done calculating shortest paths for {} pairs. took {}".format(pos, format_timespan(timer()-start)))
+    if args.backend == 'landmarks' and index is not None and index.num_queries:
+        logger.info("landmark bounds settled {} of {} pairs exactly ({:.1f}%)".format(index.num_resolved, index.num_queries, 100.0 * index.num_resolved / index.num_queries))
+    if cache is not None or source_cache is not None:
+        logger.info(format_cache_stats(cache, source_cache))
+        if cache is not None:
+            cache.close()
+    if metrics is not None:
+        metrics.close()
+        logger.info("wrote metrics for {} queries to {}".format(metrics.num_queries, metrics.fname))
 
     outf.close()
+    if client is not None:
+        client.close()
+    return status
 
 if __name__ == "__main__":
     total_start = timer()
@@ -77,11 +219,27 @@ if __name__ == "__main__":
     logger.info( '{:%Y-%m-%d %H:%M:%S}'.format(datetime.now()) )
     import argparse
     parser = argparse.ArgumentParser(description="given a network (pajek file) and a list of node pairs, calculate the shortest path lengths for a subset of those node pairs", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-    parser.add_argument("graph", help="network graph (Pajek .net file)")
+    parser.add_argument("graph", help="network graph (Pajek .net file, binary CSR file from convert_graph_to_csr.py, or compressed graph file from compress_graph.py)")
     parser.add_argument("pairs", help="tsv file with pairs samples")
-    parser.add_argument("-o", "--out", help="output file (tsv). contains 3 columns: source_arxiv_id, target_arxiv_id, shortest_path_length")
+    parser.add_argument("-o", "--out", help="output file (tsv). contains 3 columns: source_arxiv_id, target_arxiv_id, shortest_path_length (with --bounds-only, 4 columns: source_arxiv_id, target_arxiv_id, lower_bound, upper_bound). a .npy output is written as a result file instead: typed rows of pair index, length and status (see result_store.py and aggregate_results.py)")
     parser.add_argument("--start", type=int, default=0, help="index of the sample pair to start")
-    parser.add_argument("--num", type=int, default=80, help="number of pairs to calculate (starting from --start)")
+    parser.add_argument("--num", type=int, help="number of pairs to calculate (starting from --start). default: 80, or all of the pairs in --indices")
+    parser.add_argument("--indices", help="npy file with the indices of the pairs to calculate, in order (a task written by plan_tasks.py). --start and --num then select positions in this list")
+    parser.add_argument("--backend", choices=BACKENDS, help="shortest path engine (default: igraph, the server's backend with --server). 'bibfs' converts the graph to CSR arrays and runs a bidirectional BFS per pair. 'grouped' runs one BFS per endpoint shared by several pairs. 'msbfs' runs those BFSs 64 at a time in one sweep. 'pll' looks up distance labels (needs --index). 'landmarks' uses landmark distance bounds (needs --index). 'reduced' answers on the graph with components labeled and degree-1 trees peeled off (needs --index)")
+    parser.add_argument("--fallback-backend", choices=['igraph', 'bibfs', 'grouped', 'msbfs'], default='bibfs', help="with --backend landmarks: backend for the pairs whose bounds differ. with --backend reduced: backend for the queries on the core graph")
+    parser.add_argument("--bounds-only", action='store_true', help="with --backend landmarks: write the lower and upper bounds instead of exact lengths (no fallback queries)")
+    parser.add_argument("--index", help="precomputed distance index file for the index backends (from build_distance_labels.py, build_landmarks.py or reduce_graph.py)")
+    parser.add_argument("--paths", action='store_true', help="add a column with one shortest path (the original ids of the papers on it, separated by commas, from source to target). each pair is then answered with a bidirectional BFS, whatever --backend")
+    parser.add_argument("--count-paths", action='store_true', help="add a column with the number of distinct shortest paths (after the path column, with --paths), counted during the same bidirectional BFS. counts above 2**53 are approximate")
+    parser.add_argument("--time-budget", type=float, help="wall-clock budget in seconds (including loading the graph). pairs are done in batches sized from the measured cost per pair, each batch is flushed to disk and recorded in a checkpoint file (<out>.checkpoint), and the run stops before the budget runs out, with exit status {}. rerunning the same task resumes from the checkpoint".format(EXIT_INCOMPLETE))
+    parser.add_argument("--time-budget-margin", type=float, default=60.0, help="with --time-budget: seconds kept in reserve at the end")
+    parser.add_argument("--batch-size", type=int, default=100, help="with --time-budget: maximum number of pairs per batch")
+    parser.add_argument("--server", help="send the pairs to a running query_server.py at this address (Unix socket path, or host:port) instead of loading the graph. the server's backend options apply (--backend, --index, --bounds-only, --metrics and the caches cannot be used), and the graph argument is ignored")
+    parser.add_argument("--cache", help="persistent distance cache file (SQLite, created if needed). pairs found in it are not recomputed, and new lengths are added to it. can be shared by several runs on the same graph")
+    parser.add_argument("--source-cache-mb", type=float, default=0, help="memory cap (MB) for an in-memory LRU cache of full BFS distance arrays of endpoints that recur across pairs (0 to turn it off). needs a CSR backend")
+    parser.add_argument("--source-cache-min-uses", type=int, default=2, help="with --source-cache-mb: number of pairs an endpoint must be seen in before it gets a full BFS")
+    parser.add_argument("--metrics", help="record per-query metrics (id lookup time, traversal time, vertices and edges visited, largest BFS level, status): one JSON line per query if the file name ends with .jsonl, otherwise histograms (JSON). pairs are then answered one at a time, so the grouped and msbfs backends share no traversals")
+    parser.add_argument("--profile", help="run under cProfile and write the stats to this file (for pstats or snakeviz). the top functions by cumulative time are also logged")
     parser.add_argument("--debug", action='store_true', help="output debugging info")
     global args
     args = parser.parse_args()
@@ -90,6 +248,20 @@ if __name__ == "__main__":
         logger.debug('debug mode is on')
     else:
         logger.setLevel(logging.INFO)
-    main(args)
+    if args.profile:
+        import cProfile, pstats, io
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            status = main(args)
+        finally:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(15)
+            logger.info("profile written to {}. top functions by cumulative time:\n{}".format(args.profile, report.getvalue()))
+    else:
+        status = main(args)
     total_end = timer()
     logger.info('all finished. total time: {}'.format(format_timespan(total_end-total_start)))
+    sys.exit(status)
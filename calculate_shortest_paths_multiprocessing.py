@@ -1,14 +1,24 @@
-import sys, os, time
+import sys, os, tempfile
+from types import SimpleNamespace
 from datetime import datetime
 from timeit import default_timer as timer
 try:
-    from humanfriendly import format_timespan
+    from humanfriendly import format_timespan, format_size
 except ImportError:
     def format_timespan(seconds):
         return "{:.2f} seconds".format(seconds)
+    def format_size(num_bytes):
+        return "{} bytes".format(num_bytes)
 
-from multiprocessing import Pool, cpu_count
-from shortest_path_length_utils import load_graph, get_shortest_path_length_for_one_pair
+import numpy as np
+
+from multiprocessing import Pool
+from csr_graph import is_csr_file, load_csr_graph, convert_to_csr_file
+from compressed_graph import is_compressed_file, load_compressed_graph
+from pairs_file import read_pairs
+from result_store import is_result_file, create_result_file
+from distance_cache import DistanceCache, SourceDistanceCache, cached_shortest_path_lengths, format_cache_stats
+from shortest_path_length_utils import load_graph, load_graph_for_backend, load_id_index, as_csr_graph, get_vertex_seq_ids_for_pairs, get_shortest_path_lengths_for_vertex_pairs, get_landmark_bounds, get_shortest_paths_for_vertex_pairs, format_path, load_distance_index, get_peak_rss, get_private_rss, BACKENDS, INDEX_BACKENDS
 
 import logging
 logging.basicConfig(format='%(asctime)s %(name)s.%(lineno)d %(levelname)s : %(message)s',
@@ -17,89 +27,251 @@ logging.basicConfig(format='%(asctime)s %(name)s.%(lineno)d %(levelname)s : %(me
 # logger = logging.getLogger(__name__)
 logger = logging.getLogger('__main__').getChild(__name__)
 
-class Pair(object):
-    def __init__(self, source_arxiv_id, source_mag_id, target_arxiv_id, target_mag_id):
-        self.source_arxiv_id = source_arxiv_id
-        self.source_mag_id = source_mag_id
-        self.target_arxiv_id = target_arxiv_id
-        self.target_mag_id = target_mag_id
-
-def calculate_paths_for_range_of_pairs(G, out, start, num, pairs):
-    output_fname = os.path.abspath(out)
-    logger.debug("opening output file for writing: {}".format(output_fname))
-    outf = open(output_fname, 'w')
-
-    start_idx = start
-    end_idx = start_idx + num
-    logger.debug("starting with pair number {}. ending with (and not including) pair number {}".format(start_idx, end_idx))
-    pairs = []
-
-    # collect the pairs we will calculate shortest path for
-    with open(pairs, 'r') as f:
-        pair_idx = 0
-        for line in f:
-            if line[0] == "#":
-                # ignore comments
-                continue
-            if pair_idx == end_idx:
-                break
-            if pair_idx >= start_idx:
-                line = line.strip().split('\t')
-                pair = Pair(*line)
-                pairs.append(pair)
-            pair_idx += 1
-
-    # do the calculations and write to file
-    start = timer()
-    logger.debug("starting shortest path length calculations for {} pairs (starting with idx {})...".format(len(pairs), start_idx))
-    for pair in pairs:
-        start_pair = timer()
-        sp_length = get_shortest_path_length_for_one_pair(G, pair.source_mag_id, pair.target_mag_id)
-        output_row = [str(pair.source_arxiv_id), str(pair.target_arxiv_id), str(sp_length)]
-        outf.write("\t".join(output_row))
-        outf.write("\n")
-        logger.debug("done calculating shortest path for {} to {}. sp_length: {}. took {}".format(output_row[0], output_row[1], output_row[2], format_timespan(timer()-start_pair)))
-    logger.debug("done calculating shortest paths for {} pairs (starting with idx {}). took {}".format(len(pairs), start_idx, format_timespan(timer()-start)))
-
-    outf.close()
-        
-
-def unpack_args_for_worker(arg_dict):
-    calculate_paths_for_range_of_pairs(**arg_dict)
+def format_memory(num_bytes):
+    if num_bytes is None:
+        return "unknown"
+    return format_size(num_bytes)
+
+# the graph, its id index and the distance index, memory-mapped once by each worker process
+# (see init_worker), and the worker's distance caches, if any
+worker_graph = None
+worker_id_index = None
+worker_index = None
+worker_cache = None
+worker_source_cache = None
+
+def init_worker(graph_fname, index_fname=None, cache_fname=None, source_cache_bytes=0, source_cache_min_uses=2, backend=None, graph_fingerprint=None):
+    """attach to the shared binary CSR (or compressed) graph file (and distance index file, if any).
+    this maps the files rather than copying them, so every worker reads the same physical pages.
+    with backend 'igraph', graph_fname is a Pajek file instead, and each worker loads its own copy of it.
+    each worker opens its own connection to the persistent distance cache file (checked against
+    graph_fingerprint, computed here if not given), and keeps its own LRU of BFS distance arrays
+    (up to source_cache_bytes)"""
+    global worker_graph, worker_id_index, worker_index, worker_cache, worker_source_cache
+    if backend == 'igraph':
+        worker_graph = load_graph_for_backend(graph_fname, backend)
+        worker_id_index = load_id_index(graph_fname, worker_graph)
+    else:
+        if is_compressed_file(graph_fname):
+            worker_graph = load_compressed_graph(graph_fname)
+        else:
+            worker_graph = load_csr_graph(graph_fname)
+        worker_id_index = worker_graph.id_index
+    if index_fname is not None:
+        worker_index = load_distance_index(index_fname)
+    if cache_fname is not None:
+        worker_cache = DistanceCache(cache_fname, graph_fingerprint or as_csr_graph(worker_graph).fingerprint())
+    if source_cache_bytes:
+        worker_source_cache = SourceDistanceCache(source_cache_bytes, min_uses=source_cache_min_uses)
+
+# counters of the worker's distance index and caches, summed over the chunks by the main process
+STAT_COUNTERS = [
+    ('bounded', 'index', 'num_queries'),
+    ('resolved', 'index', 'num_resolved'),
+    ('cache_lookups', 'cache', 'lookups'),
+    ('cache_hits', 'cache', 'hits'),
+    ('source_cache_lookups', 'source_cache', 'lookups'),
+    ('source_cache_hits', 'source_cache', 'hits'),
+    ('source_cache_bfs', 'source_cache', 'num_bfs'),
+    ('source_cache_bfs_answered', 'source_cache', 'bfs_answered'),
+]
+
+def _get_worker_counters():
+    objs = {'index': worker_index, 'cache': worker_cache, 'source_cache': worker_source_cache}
+    return {name: getattr(objs[obj], attr, 0) for name, obj, attr in STAT_COUNTERS}
+
+def calculate_paths_for_chunk(task):
+    """worker task. `task` is (chunk_idx, list of Pair objects, options), where options is a dict
+    with 'backend', 'fallback_backend', 'bounds_only', 'paths' and 'count_paths'.
+    returns (chunk_idx, results, stats): results has one tuple of output values per pair
+    (the shortest path length, or the lower and upper bounds with bounds_only, followed by the path
+    and the number of shortest paths with paths and count_paths), in the same order as the pairs.
+    stats is a dict with the increments of the STAT_COUNTERS during the chunk: the number of pairs bounded,
+    and the number of them the landmark bounds settled on their own, and the lookups and hits of the caches.
+    it also has the worker's private (not shared) RSS after the chunk, as 'private_rss' (None if unknown)"""
+    chunk_idx, pairs, options = task
+    G = worker_graph
+    source_vertices, target_vertices, missing_ids = get_vertex_seq_ids_for_pairs(worker_id_index, pairs)
+    if missing_ids:
+        logger.debug("chunk {}: {} ids were not found in the graph: {}".format(chunk_idx, len(missing_ids), ", ".join(missing_ids)))
+    counters_before = _get_worker_counters()
+    if options['bounds_only']:
+        lower, upper = get_landmark_bounds(worker_index, source_vertices, target_vertices)
+        results = list(zip(lower, upper))
+    elif options['paths'] or options['count_paths']:
+        results = []
+        for sp_length, path, num_paths in get_shortest_paths_for_vertex_pairs(as_csr_graph(G), source_vertices, target_vertices, count_paths=options['count_paths']):
+            results.append((sp_length, ) + ((format_path(path), ) if options['paths'] else ()) + ((num_paths, ) if options['count_paths'] else ()))
+    else:
+        def compute(source_vertices, target_vertices):
+            return get_shortest_path_lengths_for_vertex_pairs(G, source_vertices, target_vertices, backend=options['backend'], index=worker_index, fallback_backend=options['fallback_backend'])
+        if worker_cache is None and worker_source_cache is None:
+            sp_lengths = compute(source_vertices, target_vertices)
+        else:
+            sp_lengths = cached_shortest_path_lengths(G, [pair.source_mag_id for pair in pairs], [pair.target_mag_id for pair in pairs], source_vertices, target_vertices, compute, cache=worker_cache, source_cache=worker_source_cache)
+        results = [(sp_length, ) for sp_length in sp_lengths]
+    counters_after = _get_worker_counters()
+    stats = {name: counters_after[name] - counters_before[name] for name in counters_after}
+    stats['private_rss'] = get_private_rss()
+    return chunk_idx, results, stats
+
+def get_shared_graph_fname(graph_fname, shm_dir):
+    """path of a binary CSR version of the graph that the workers can map (compressed graph files are mapped as they are).
+    Pajek files are converted once into shm_dir (reusing an up-to-date earlier conversion).
+    returns (path, whether this call created the file)"""
+    if is_csr_file(graph_fname) or is_compressed_file(graph_fname):
+        return graph_fname, False
+    shared_fname = os.path.join(shm_dir, os.path.basename(graph_fname) + ".csr")
+    if os.path.exists(shared_fname) and os.path.getmtime(shared_fname) >= os.path.getmtime(graph_fname):
+        return shared_fname, False
+    convert_to_csr_file(graph_fname, shared_fname)
+    return shared_fname, True
+
+def get_output_fnames(outdir, start_idx, num, processes):
+    """one output file in outdir for each process's share of num pairs, named like the
+    output files of the tasks in a tasklist (see write_tasklist.py)"""
+    return [os.path.join(outdir, "shortest_path_lengths_samples_{}-{}.tsv".format(start_idx + i * num, start_idx + (i + 1) * num)) for i in range(processes)]
 
 def main(args):
     graph_fname = os.path.abspath(args.graph)
-    start = timer()
-    logger.debug("loading graph from file: {}...".format(graph_fname))
-    G = load_graph(graph_fname)
-    logger.debug("done loading graph. took {}".format(format_timespan(timer()-start)))
-
-    outdir = os.path.abspath(args.outdir)
-
-    num_cpus = args.processes
-
-    arg_dicts = []
-
-    # split the data into bins for parallel processing
-    cur_idx = args.start
-    step = args.num
-    for i in range(num_cpus):
-        end_idx = cur_idx + step
-        output_fname = os.path.join(outdir, "shortest_path_lengths_samples_{}-{}.tsv".format(cur_idx, end_idx))
-        this_arg_dict = {
-            'G': G,
-            'out': output_fname,
-            'start': cur_idx,
-            'num': step,
-            'pairs': args.pairs
+    index_fname = os.path.abspath(args.index) if args.index else None
+    # check the options before touching any file, so that a bad invocation leaves an existing output alone.
+    if ( args.outdir is None ) == ( args.out is None ):
+        raise RuntimeError("give either an output directory (-o/--outdir) or a single output file (--out)")
+    start_idx = args.start
+    end_idx = start_idx + args.num * args.processes
+    if args.out is not None:
+        output_fnames = [os.path.abspath(args.out)]
+    else:
+        output_fnames = get_output_fnames(os.path.abspath(args.outdir), start_idx, args.num, args.processes)
+    # pairs per output file
+    file_num = end_idx - start_idx if args.out is not None else args.num
+    # a .npy output is a result file (see result_store.py). its rows have fixed places, so chunks are written as they finish
+    result_file = is_result_file(output_fnames[0])
+    if result_file and args.bounds_only:
+        raise RuntimeError("result files (.npy) hold exact lengths. write the bounds to a tsv output")
+    if ( result_file or args.bounds_only ) and ( args.paths or args.count_paths ):
+        raise RuntimeError("--paths and --count-paths need exact lengths in a tsv output (not --bounds-only or a result file)")
+    if ( index_fname is None ) and ( args.backend in INDEX_BACKENDS ):
+        raise RuntimeError("the {} backend needs a distance index (--index)".format(args.backend))
+    if args.bounds_only and args.backend != 'landmarks':
+        raise RuntimeError("--bounds-only needs the landmarks backend")
+    if ( args.paths or args.count_paths ) and ( args.backend in INDEX_BACKENDS or args.cache or args.source_cache_mb ):
+        raise RuntimeError("--paths and --count-paths answer every pair with a bidirectional BFS, so they cannot be used with the index backends or the caches")
+    if args.backend == 'igraph':
+        if is_csr_file(graph_fname) or is_compressed_file(graph_fname):
+            raise RuntimeError("the igraph backend needs a Pajek file, but {} is a binary graph file".format(graph_fname))
+        if args.source_cache_mb:
+            raise RuntimeError("--source-cache-mb needs a CSR backend")
+
+    pool = None
+    if args.backend == 'igraph':
+        # each worker loads the Pajek file itself
+        shared_graph_fname, created = graph_fname, False
+    else:
+        start = timer()
+        logger.debug("preparing shared graph file from: {}...".format(graph_fname))
+        shared_graph_fname, created = get_shared_graph_fname(graph_fname, args.shm_dir)
+        logger.debug("done. workers will map {} ({}). took {}".format(shared_graph_fname, format_size(os.path.getsize(shared_graph_fname)), format_timespan(timer()-start)))
+    try:
+        logger.debug("starting with pair number {}. ending with (and not including) pair number {}".format(start_idx, end_idx))
+        pairs = read_pairs(args.pairs, start_idx, end_idx)
+
+        # small chunks handed out from the pool's task queue as workers become free,
+        # so a slow chunk holds up one worker instead of a whole static bin
+        chunk_size = args.chunk_size
+        chunks = [pairs[i:i+chunk_size] for i in range(0, len(pairs), chunk_size)]
+        options = {
+            'backend': args.backend,
+            'fallback_backend': args.fallback_backend,
+            'bounds_only': args.bounds_only,
+            'paths': args.paths,
+            'count_paths': args.count_paths
         }
-        arg_dicts.append(this_arg_dict)
-        cur_idx = end_idx
+        tasks = [(chunk_idx, chunk, options) for chunk_idx, chunk in enumerate(chunks)]
+
+        logger.debug("opening output files for writing: {}".format(", ".join(output_fnames)))
+        if result_file:
+            outfs = [create_result_file(output_fnames[0], np.arange(start_idx, start_idx + len(pairs), dtype=np.int64))]
+        else:
+            outfs = [open(output_fname, 'w') for output_fname in output_fnames]
+
+        num_cpus = args.processes
+        logger.debug("starting a pool of workers with {} processes".format(num_cpus))
+        cache_fname = os.path.abspath(args.cache) if args.cache else None
+        graph_fingerprint = None
+        if cache_fname is not None:
+            # hashed once here, rather than by every worker
+            start = timer()
+            graph_fingerprint = as_csr_graph(load_graph(shared_graph_fname)).fingerprint()
+            logger.debug("graph fingerprint for the distance cache: {}. took {}".format(graph_fingerprint, format_timespan(timer()-start)))
+        source_cache_bytes = int(args.source_cache_mb * 1024 * 1024)
+        pool = Pool(processes=num_cpus, initializer=init_worker, initargs=(shared_graph_fname, index_fname, cache_fname, source_cache_bytes, args.source_cache_min_uses, args.backend, graph_fingerprint))
+        logger.debug("calculating {} pairs in {} chunks of up to {} pairs".format(len(pairs), len(chunks), chunk_size))
+
+        # this process is the only writer. chunks finish out of order, so they are buffered until
+        # all earlier chunks are written, which keeps the output in the same order as the pairs file
+        start = timer()
+        last_progress = start
+        finished_chunks = {}
+        next_chunk_idx = 0
+        num_done = 0
+        totals = {name: 0 for name, _, _ in STAT_COUNTERS}
+        max_private_rss = None
+        for chunk_idx, results, stats in pool.imap_unordered(calculate_paths_for_chunk, tasks):
+            num_done += len(results)
+            private_rss = stats.pop('private_rss')
+            if private_rss is not None:
+                max_private_rss = max(max_private_rss or 0, private_rss)
+            for name, value in stats.items():
+                totals[name] += value
+            if result_file:
+                outfs[0].write(chunk_idx * chunk_size, [values[0] for values in results])
+            else:
+                finished_chunks[chunk_idx] = results
+            while next_chunk_idx in finished_chunks:
+                for pos, (pair, values) in enumerate(zip(chunks[next_chunk_idx], finished_chunks.pop(next_chunk_idx)), start=next_chunk_idx * chunk_size):
+                    output_row = [str(pair.source_arxiv_id), str(pair.target_arxiv_id)] + [str(x) for x in values]
+                    outf = outfs[pos // file_num]
+                    outf.write("\t".join(output_row))
+                    outf.write("\n")
+                next_chunk_idx += 1
+            if not result_file:
+                for outf in outfs:
+                    outf.flush()
+            now = timer()
+            if ( now - last_progress >= args.progress_interval ) or ( num_done == len(pairs) ):
+                elapsed = now - start
+                rate = num_done / elapsed if elapsed > 0 else 0.0
+                eta = (len(pairs) - num_done) / rate if rate > 0 else 0.0
+                logger.info("{}/{} pairs done ({:.1f}%). {:.2f} pairs/second. elapsed {}, remaining ~{}".format(num_done, len(pairs), 100.0 * num_done / len(pairs), rate, format_timespan(elapsed), format_timespan(eta)))
+                last_progress = now
+        pool.close()
+        pool.join()
+        for outf in outfs:
+            outf.close()
+        logger.debug("done calculating shortest paths for {} pairs. took {}".format(len(pairs), format_timespan(timer()-start)))
+        if args.backend == 'landmarks' and totals['bounded']:
+            logger.info("landmark bounds settled {} of {} pairs exactly ({:.1f}%)".format(totals['resolved'], totals['bounded'], 100.0 * totals['resolved'] / totals['bounded']))
+        if cache_fname is not None or source_cache_bytes:
+            # the hit rates over all of the workers
+            cache_totals = SimpleNamespace(lookups=totals['cache_lookups'], hits=totals['cache_hits']) if cache_fname is not None else None
+            source_cache_totals = SimpleNamespace(lookups=totals['source_cache_lookups'], hits=totals['source_cache_hits'], num_bfs=totals['source_cache_bfs'], bfs_answered=totals['source_cache_bfs_answered']) if source_cache_bytes else None
+            logger.info(format_cache_stats(cache_totals, source_cache_totals))
 
-    logger.debug("starting a pool of workers with {} processes".format(num_cpus))
-    pool = Pool(processes=num_cpus)
-    logger.debug("mapping {} processes to the pool".format(len(arg_dicts)))
-    pool.map(unpack_args_for_worker, arg_dicts)
+        if args.backend == 'igraph':
+            logger.info("peak RSS: main process {}, largest worker {} (each worker loads its own copy of the graph)".format(format_memory(get_peak_rss()), format_memory(get_peak_rss(children=True))))
+        else:
+            logger.info("peak RSS: main process {}, largest worker {} (including shared pages of the graph file, {})".format(format_memory(get_peak_rss()), format_memory(get_peak_rss(children=True)), format_size(os.path.getsize(shared_graph_fname))))
+            # the graph's pages are shared, so this is what every further worker adds (to size --processes by)
+            logger.info("largest private (not shared) RSS of a worker: {}".format(format_memory(max_private_rss)))
+    finally:
+        if pool is not None:
+            # (after an error in the loop above) stop the workers before removing the graph file they map
+            pool.terminate()
+        if created and not args.keep_shared_graph:
+            logger.debug("removing shared graph file {}".format(shared_graph_fname))
+            os.remove(shared_graph_fname)
 
 
 
@@ -110,12 +282,26 @@ if __name__ == "__main__":
     logger.info( '{:%Y-%m-%d %H:%M:%S}'.format(datetime.now()) )
     import argparse
     parser = argparse.ArgumentParser(description="given a network (pajek file) and a list of node pairs, calculate the shortest path lengths for a subset of those node pairs", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-    parser.add_argument("graph", help="network graph (Pajek .net file)")
+    parser.add_argument("graph", help="network graph (Pajek .net file, binary CSR file from convert_graph_to_csr.py, or compressed graph file from compress_graph.py)")
     parser.add_argument("pairs", help="tsv file with pairs samples")
-    parser.add_argument("-o", "--outdir", help="output directory. output files are TSV. They contain 3 columns: source_arxiv_id, target_arxiv_id, shortest_path_length")
+    parser.add_argument("-o", "--outdir", help="output directory. output files are TSV, one per process's share of --num pairs (shortest_path_lengths_samples_<start>-<end>.tsv), in the same order as the pairs file. They contain 3 columns: source_arxiv_id, target_arxiv_id, shortest_path_length (with --bounds-only, 4 columns: source_arxiv_id, target_arxiv_id, lower_bound, upper_bound)")
+    parser.add_argument("--out", help="single output file for all of the pairs, instead of --outdir (tsv, with the columns of the --outdir files). a .npy output is written as a result file instead: typed rows of pair index, length and status (see result_store.py and aggregate_results.py)")
     parser.add_argument("--start", type=int, default=0, help="index of the sample pair to start")
-    parser.add_argument("--num", type=int, default=80, help="number of pairs to calculate (starting from --start)")
+    parser.add_argument("--num", type=int, default=80, help="number of pairs to calculate per process (starting from --start): the run calculates --processes times --num pairs")
     parser.add_argument("--processes", type=int, default=15, help="number of processes to run at a time")
+    parser.add_argument("--chunk-size", type=int, default=5, help="number of pairs handed to a worker at a time. with the 'grouped' and 'msbfs' backends, larger chunks share more traversals")
+    parser.add_argument("--progress-interval", type=float, default=60, help="seconds between progress reports")
+    parser.add_argument("--backend", choices=BACKENDS, default='bibfs', help="shortest path engine. the workers share one memory-mapped CSR graph, except with 'igraph', where each worker loads its own copy of the Pajek file")
+    parser.add_argument("--fallback-backend", choices=['bibfs', 'grouped', 'msbfs'], default='bibfs', help="with --backend landmarks: backend for the pairs whose bounds differ. with --backend reduced: backend for the queries on the core graph")
+    parser.add_argument("--bounds-only", action='store_true', help="with --backend landmarks: write the lower and upper bounds instead of exact lengths (no fallback queries)")
+    parser.add_argument("--index", help="precomputed distance index file for the index backends (from build_distance_labels.py, build_landmarks.py or reduce_graph.py)")
+    parser.add_argument("--paths", action='store_true', help="add a column with one shortest path (the original ids of the papers on it, separated by commas, from source to target). each pair is then answered with a bidirectional BFS, whatever --backend")
+    parser.add_argument("--count-paths", action='store_true', help="add a column with the number of distinct shortest paths (after the path column, with --paths), counted during the same bidirectional BFS. counts above 2**53 are approximate")
+    parser.add_argument("--cache", help="persistent distance cache file (SQLite, created if needed), shared by the workers. pairs found in it are not recomputed, and new lengths are added to it")
+    parser.add_argument("--source-cache-mb", type=float, default=0, help="memory cap (MB) per worker for an in-memory LRU cache of full BFS distance arrays of endpoints that recur across pairs (0 to turn it off)")
+    parser.add_argument("--source-cache-min-uses", type=int, default=2, help="with --source-cache-mb: number of pairs an endpoint must be seen in (by the same worker) before it gets a full BFS")
+    parser.add_argument("--shm-dir", default='/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), help="directory for the shared binary CSR graph, if the graph is a Pajek file")
+    parser.add_argument("--keep-shared-graph", action='store_true', help="don't remove the shared graph file from --shm-dir at the end (later runs on this node can reuse it)")
     parser.add_argument("--debug", action='store_true', help="output debugging info")
     global args
     args = parser.parse_args()
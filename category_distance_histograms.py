@@ -0,0 +1,210 @@
+import sys, os
+from glob import glob
+from datetime import datetime
+from timeit import default_timer as timer
+try:
+    from humanfriendly import format_timespan
+except ImportError:
+    def format_timespan(seconds):
+        return "{:.2f} seconds".format(seconds)
+
+import pandas as pd
+import numpy as np
+
+from msbfs import msbfs_level_counts, DEFAULT_WIDTH
+from pairs_file import load_pairs_index, read_pairs
+from get_sample_pairs import get_category_indices
+from shortest_path_length_utils import load_graph, as_csr_graph, load_id_index
+
+import logging
+logging.basicConfig(format='%(asctime)s %(name)s.%(lineno)d %(levelname)s : %(message)s',
+        datefmt="%H:%M:%S",
+        level=logging.INFO)
+# logger = logging.getLogger(__name__)
+logger = logging.getLogger('__main__').getChild(__name__)
+
+def category_distance_counts(G, category_vertices, mode='pairwise', sources_per_category=0, random_state=None, width=DEFAULT_WIDTH):
+    """distance histograms between categories of vertices of the CSRGraph G.
+
+    category_vertices is a list of vertex arrays, one per category (one entry per paper, so vertices may repeat).
+    with mode 'nearest', one multi-source BFS per category, seeded with all of its vertices, gives
+    the distance from every paper of the other categories to the nearest paper of the category.
+    with mode 'pairwise', bit-parallel BFSs from `width` source papers at a time give the distance of
+    every (source paper, target paper) pair: from all papers of the category if sources_per_category is 0,
+    otherwise from a random sample of that many of them.
+    returns (counts, totals): counts[i, j, d] is the number of pairs (source paper or category i,
+    target paper of category j) at distance d, and totals[i, j] the number of pairs (the rest are unreachable)"""
+    num_categories = len(category_vertices)
+    target_vertices = np.concatenate(category_vertices).astype(np.int64)
+    target_groups = np.repeat(np.arange(num_categories), [len(v) for v in category_vertices])
+    category_sizes = np.array([len(v) for v in category_vertices], dtype=np.int64)
+    level_counts = []
+    totals = np.zeros((num_categories, num_categories), dtype=np.int64)
+    for i, vertices in enumerate(category_vertices):
+        if mode == 'nearest':
+            counts = msbfs_level_counts(G, vertices, np.zeros(len(vertices), dtype=np.int64), target_vertices, target_groups, num_categories)
+            totals[i] = category_sizes
+        elif mode == 'pairwise':
+            sources = np.asarray(vertices, dtype=np.int64)
+            if 0 < sources_per_category < len(sources):
+                if random_state is None:
+                    random_state = np.random.RandomState()
+                sources = sources[random_state.choice(len(sources), size=sources_per_category, replace=False)]
+            counts = np.zeros((num_categories, 0), dtype=np.int64)
+            for batch_start in range(0, len(sources), width):
+                roots = sources[batch_start:batch_start+width]
+                batch_counts = msbfs_level_counts(G, roots, np.arange(len(roots)), target_vertices, target_groups, num_categories)
+                counts = _add_padded(counts, batch_counts)
+            totals[i] = len(sources) * category_sizes
+        else:
+            raise ValueError("unknown mode: {}".format(mode))
+        level_counts.append(counts)
+        logger.debug("category {} of {}: {} levels".format(i + 1, num_categories, counts.shape[1]))
+    max_levels = max([c.shape[1] for c in level_counts] + [1])
+    all_counts = np.zeros((num_categories, num_categories, max_levels), dtype=np.int64)
+    for i, counts in enumerate(level_counts):
+        all_counts[i, :, :counts.shape[1]] = counts
+    return all_counts, totals
+
+def _add_padded(a, b):
+    """sum of two 2-d count arrays with the same number of rows and possibly different numbers of columns"""
+    out = np.zeros((a.shape[0], max(a.shape[1], b.shape[1])), dtype=np.int64)
+    out[:, :a.shape[1]] += a
+    out[:, :b.shape[1]] += b
+    return out
+
+def read_result_lengths(output_fnames):
+    """{(source_arxiv_id, target_arxiv_id): shortest path length string} from runner output files"""
+    lengths = {}
+    for fname in output_fnames:
+        with open(fname, 'r') as f:
+            for line in f:
+                row = line.rstrip('\n').split('\t')
+                if len(row) >= 3:
+                    lengths[(row[0], row[1])] = row[2]
+    return lengths
+
+def sampled_distance_counts(pairs_fname, lengths, category_names, max_levels):
+    """histograms like category_distance_counts, from the sampled pairs with a result in `lengths`.
+    pairs with an id that is not in the graph ('None') are left out"""
+    pairs_index = load_pairs_index(pairs_fname)
+    pairs = read_pairs(pairs_fname, 0, len(pairs_index), pairs_index=pairs_index)
+    category_pos = {name: i for i, name in enumerate(category_names)}
+    counts = np.zeros((len(category_names), len(category_names), max_levels), dtype=np.int64)
+    totals = np.zeros((len(category_names), len(category_names)), dtype=np.int64)
+    for pair_idx, pair in enumerate(pairs):
+        group = pairs_index.get_group(pair_idx)
+        sp_length = lengths.get((pair.source_arxiv_id, pair.target_arxiv_id))
+        if group is None or sp_length is None or sp_length == 'None' or group[0] not in category_pos or group[1] not in category_pos:
+            continue
+        i, j = category_pos[group[0]], category_pos[group[1]]
+        totals[i, j] += 1
+        if sp_length != 'inf':
+            d = int(float(sp_length))
+            if d >= counts.shape[2]:
+                counts = np.concatenate([counts, np.zeros(counts.shape[:2] + (d + 1 - counts.shape[2], ), dtype=np.int64)], axis=2)
+            counts[i, j, d] += 1
+    return counts, totals
+
+def summarize(counts, total):
+    """(mean finite distance, unreachable fraction, distribution including the unreachable bin) of one histogram"""
+    reached = counts.sum()
+    mean = float((counts * np.arange(len(counts))).sum()) / reached if reached else float('nan')
+    dist = np.append(counts, total - reached).astype(np.float64)
+    if total:
+        dist /= total
+    return mean, (total - reached) / float(total) if total else float('nan'), dist
+
+def write_histograms(outf, category_names, counts, totals):
+    outf.write("\t".join(['category1', 'category2', 'distance', 'count', 'fraction']))
+    outf.write("\n")
+    for i, name1 in enumerate(category_names):
+        for j, name2 in enumerate(category_names):
+            total = totals[i, j]
+            for d, count in enumerate(counts[i, j].tolist() + [int(total - counts[i, j].sum())]):
+                if count == 0:
+                    continue
+                distance = str(d) if d < counts.shape[2] else 'inf'
+                outf.write("\t".join([name1, name2, distance, str(count), "{:.6g}".format(count / float(total))]))
+                outf.write("\n")
+
+def write_comparison(outf, category_names, counts, totals, sampled_counts, sampled_totals):
+    """per category pair: the mean distance and unreachable fraction of the full and the sampled histograms,
+    and the total variation distance between them"""
+    levels = max(counts.shape[2], sampled_counts.shape[2])
+    counts = np.concatenate([counts, np.zeros(counts.shape[:2] + (levels - counts.shape[2], ), dtype=np.int64)], axis=2)
+    sampled_counts = np.concatenate([sampled_counts, np.zeros(sampled_counts.shape[:2] + (levels - sampled_counts.shape[2], ), dtype=np.int64)], axis=2)
+    outf.write("\t".join(['category1', 'category2', 'num_pairs', 'num_sampled', 'mean', 'sampled_mean', 'unreachable', 'sampled_unreachable', 'total_variation']))
+    outf.write("\n")
+    for i, name1 in enumerate(category_names):
+        for j, name2 in enumerate(category_names):
+            mean, unreachable, dist = summarize(counts[i, j], totals[i, j])
+            sampled_mean, sampled_unreachable, sampled_dist = summarize(sampled_counts[i, j], sampled_totals[i, j])
+            total_variation = 0.5 * np.abs(dist - sampled_dist).sum() if sampled_totals[i, j] else float('nan')
+            outf.write("\t".join([name1, name2, str(totals[i, j]), str(sampled_totals[i, j])] +
+                                 ["{:.4f}".format(x) for x in (mean, sampled_mean, unreachable, sampled_unreachable, total_variation)]))
+            outf.write("\n")
+
+def main(args):
+    graph_fname = os.path.abspath(args.graph)
+    start = timer()
+    logger.debug("loading graph from file: {}...".format(graph_fname))
+    G = as_csr_graph(load_graph(graph_fname))
+    id_index = load_id_index(graph_fname, G)
+    logger.debug("done loading graph. took {}".format(format_timespan(timer()-start)))
+
+    df = pd.read_csv(args.papers, sep=args.sep, dtype=str)
+    categories = get_category_indices(df, args.category_colname, args.min_papers)
+    category_names = [name for name, indices in categories]
+    vertices = id_index.lookup_many(df['mag_id'].values)
+    category_vertices = []
+    for name, indices in categories:
+        category_vertices.append(vertices[indices][vertices[indices] >= 0])
+        logger.debug("category {}: {} papers, {} of them in the graph".format(name, len(indices), len(category_vertices[-1])))
+
+    start = timer()
+    counts, totals = category_distance_counts(G, category_vertices, mode=args.mode, sources_per_category=args.sources_per_category, random_state=np.random.RandomState(args.seed))
+    logger.info("{} histograms for {} categories ({} mode). took {}".format(len(category_names) ** 2, len(category_names), args.mode, format_timespan(timer()-start)))
+    with open(args.output, 'w') as outf:
+        write_histograms(outf, category_names, counts, totals)
+
+    if args.compare:
+        if not args.pairs:
+            raise RuntimeError("--compare needs the pairs file (--pairs)")
+        output_fnames = [fname for pattern in args.compare for fname in glob(pattern)]
+        sampled_counts, sampled_totals = sampled_distance_counts(args.pairs, read_result_lengths(output_fnames), category_names, counts.shape[2])
+        comparison_fname = args.comparison_out or os.path.splitext(args.output)[0] + "_comparison.tsv"
+        with open(comparison_fname, 'w') as outf:
+            write_comparison(outf, category_names, counts, totals, sampled_counts, sampled_totals)
+        logger.info("compared with {} sampled pairs from {} output files: {}".format(int(sampled_totals.sum()), len(output_fnames), comparison_fname))
+
+if __name__ == "__main__":
+    total_start = timer()
+    logger = logging.getLogger(__name__)
+    logger.info(" ".join(sys.argv))
+    logger.info( '{:%Y-%m-%d %H:%M:%S}'.format(datetime.now()) )
+    import argparse
+    parser = argparse.ArgumentParser(description="distance histograms between whole categories of papers, from multi-source BFSs instead of sampled pairs", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("graph", help="network graph (Pajek .net file or binary CSR file)")
+    parser.add_argument("papers", help="papers table (TSV with arxiv_id, mag_id and category columns), as for get_sample_pairs.py")
+    parser.add_argument("output", help="output file (TSV) with one row per category pair and distance: category1, category2, distance, count, fraction")
+    parser.add_argument("--mode", choices=['pairwise', 'nearest'], default='pairwise', help="'pairwise': distances of (source paper, target paper) pairs, from bit-parallel BFSs of 64 sources at a time. 'nearest': one BFS per category from all of its papers at once, giving each paper's distance to the nearest paper of the category")
+    parser.add_argument("--sources-per-category", type=int, default=0, help="with --mode pairwise: number of source papers sampled from each category (0 for all of them, which makes the histograms exact)")
+    parser.add_argument("--sep", default='\t', help="delimiter for the papers table")
+    parser.add_argument("--category-colname", default='category_broad', help="column name for the category")
+    parser.add_argument("--min-papers", type=int, default=500, help="categories with fewer than this many papers will be filtered out")
+    parser.add_argument("--seed", type=int, default=99, help="random seed for sampling source papers")
+    parser.add_argument("--pairs", help="pairs file from get_sample_pairs.py, for --compare")
+    parser.add_argument("--compare", nargs='+', help="glob patterns of output files of the sampled pairs. writes a comparison of the sampled and full histograms")
+    parser.add_argument("--comparison-out", help="output file for --compare (default: <output>_comparison.tsv)")
+    parser.add_argument("--debug", action='store_true', help="output debugging info")
+    global args
+    args = parser.parse_args()
+    if args.debug:
+        logger.setLevel(logging.DEBUG)
+        logger.debug('debug mode is on')
+    else:
+        logger.setLevel(logging.INFO)
+    main(args)
+    total_end = timer()
+    logger.info('all finished. total time: {}'.format(format_timespan(total_end-total_start)))
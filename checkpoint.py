@@ -0,0 +1,109 @@
+import os, json
+from timeit import default_timer as timer
+
+# exit status of a run that stopped at its time budget with pairs left over (EX_TEMPFAIL),
+# so a scheduler can tell it apart from a failure and rerun the task to resume it
+EXIT_INCOMPLETE = 75
+
+def get_checkpoint_fname(output_fname):
+    return output_fname + ".checkpoint"
+
+class Checkpoint(object):
+    """progress of one task (pairs start_idx up to, not including, end_idx) writing to one output file.
+    with indices_fname (a task from plan_tasks.py), the indices are positions in that file's list of pairs.
+
+    next_idx is the first pair that has no row in the output yet, and output_size is the size in
+    bytes of the output file up to the last complete row. complete is set once all pairs are done"""
+    def __init__(self, pairs_fname, start_idx, end_idx, next_idx=None, output_size=0, complete=False, indices_fname=None):
+        self.pairs_fname = pairs_fname
+        self.indices_fname = indices_fname
+        self.start_idx = start_idx
+        self.end_idx = end_idx
+        self.next_idx = start_idx if next_idx is None else next_idx
+        self.output_size = output_size
+        self.complete = complete
+
+    def is_same_task(self, other):
+        return (self.pairs_fname, self.indices_fname, self.start_idx, self.end_idx) == (other.pairs_fname, other.indices_fname, other.start_idx, other.end_idx)
+
+    def save(self, fname):
+        """write the checkpoint atomically, and make sure it is on disk before returning"""
+        tmp_fname = "{}.tmp{}".format(fname, os.getpid())
+        with open(tmp_fname, 'w') as outf:
+            json.dump(self.__dict__, outf)
+            outf.flush()
+            os.fsync(outf.fileno())
+        os.rename(tmp_fname, fname)
+
+def load_checkpoint(fname):
+    """the Checkpoint saved in fname, or None if there is none"""
+    if not os.path.exists(fname):
+        return None
+    with open(fname, 'r') as f:
+        return Checkpoint(**json.load(f))
+
+def open_output_for_task(output_fname, task):
+    """open the output file of a task, resuming from its checkpoint if there is one for the same task.
+
+    returns (outf, checkpoint). rows written after the last checkpoint (e.g. by a run that was killed)
+    are cut off, so the output ends with the rows of exactly the pairs before checkpoint.next_idx"""
+    checkpoint = load_checkpoint(get_checkpoint_fname(output_fname))
+    if checkpoint is not None and checkpoint.is_same_task(task) and os.path.exists(output_fname):
+        outf = open(output_fname, 'r+')
+        outf.truncate(checkpoint.output_size)
+        outf.seek(checkpoint.output_size)
+        return outf, checkpoint
+    return open(output_fname, 'w'), task
+
+def commit_rows(outf, checkpoint, output_fname, next_idx):
+    """flush and fsync the rows written so far, then record that all pairs before next_idx are done.
+    outf is an output file, or a result_store.ResultFile (whose rows have fixed places, so no size is recorded)"""
+    outf.flush()
+    if hasattr(outf, 'fileno'):
+        os.fsync(outf.fileno())
+        checkpoint.output_size = outf.tell()
+    checkpoint.next_idx = next_idx
+    checkpoint.complete = next_idx >= checkpoint.end_idx
+    checkpoint.save(get_checkpoint_fname(output_fname))
+
+class TimeBudget(object):
+    """plans batches of pairs so that a run stops before its wall-clock deadline.
+
+    the cost per pair is measured from the batches done so far. a batch is only started if it is
+    expected to finish `safety_factor` times over before the deadline, less `margin` seconds kept
+    for writing the results and shutting down"""
+    def __init__(self, seconds, start_time=None, margin=60.0, safety_factor=2.0):
+        if start_time is None:
+            start_time = timer()
+        self.deadline = start_time + seconds
+        self.margin = margin
+        self.safety_factor = safety_factor
+        self.num_pairs_done = 0
+        self.time_spent = 0.0
+        self.max_pair_cost = 0.0
+
+    def remaining(self):
+        return self.deadline - timer()
+
+    def pair_cost(self):
+        """estimated seconds per pair: the mean so far, or the slowest batch's per-pair cost if that is higher.
+        None before the first batch"""
+        if self.num_pairs_done == 0:
+            return None
+        return max(self.time_spent / self.num_pairs_done, self.max_pair_cost)
+
+    def next_batch_size(self, max_size):
+        """number of pairs to do next (at most max_size), or 0 if there is no time left for even one"""
+        available = self.remaining() - self.margin
+        cost = self.pair_cost()
+        if cost is None:
+            # nothing measured yet: start with a single pair
+            return 1 if available > 0 else 0
+        return max(0, min(max_size, int(available / (cost * self.safety_factor))))
+
+    def record(self, num_pairs, seconds):
+        if num_pairs <= 0:
+            return
+        self.num_pairs_done += num_pairs
+        self.time_spent += seconds
+        self.max_pair_cost = max(self.max_pair_cost, seconds / num_pairs)
@@ -0,0 +1,89 @@
+import sys, os
+from datetime import datetime
+from timeit import default_timer as timer
+try:
+    from humanfriendly import format_timespan, format_size
+except ImportError:
+    def format_timespan(seconds):
+        return "{:.2f} seconds".format(seconds)
+    def format_size(num_bytes):
+        return "{} bytes".format(num_bytes)
+
+import numpy as np
+
+from compressed_graph import compress_csr_graph, load_compressed_graph, ORDERS, DEFAULT_BLOCK_SIZE
+from shortest_path_length_utils import load_graph, as_csr_graph, get_shortest_path_lengths_for_vertex_pairs
+
+import logging
+logging.basicConfig(format='%(asctime)s %(name)s.%(lineno)d %(levelname)s : %(message)s',
+        datefmt="%H:%M:%S",
+        level=logging.INFO)
+# logger = logging.getLogger(__name__)
+logger = logging.getLogger('__main__').getChild(__name__)
+
+def time_queries(G, source_vertices, target_vertices, backend):
+    """(seconds, lengths) of answering the pairs with backend on G"""
+    start = timer()
+    sp_lengths = get_shortest_path_lengths_for_vertex_pairs(G, source_vertices, target_vertices, backend=backend)
+    return timer() - start, sp_lengths
+
+def main(args):
+    graph_fname = os.path.abspath(args.graph)
+    start = timer()
+    logger.debug("loading graph from file: {}...".format(graph_fname))
+    G = as_csr_graph(load_graph(graph_fname))
+    logger.debug("done loading graph. took {}".format(format_timespan(timer()-start)))
+
+    output_fname = os.path.abspath(args.output)
+    start = timer()
+    logger.debug("compressing {} vertices and {} adjacency entries in {} order, {} neighbor lists per block...".format(G.num_vertices, G.num_adjacency_entries(), args.order, args.block_size))
+    compress_csr_graph(G, output_fname, order=args.order, block_size=args.block_size, chunk_size=args.chunk_vertices)
+    logger.debug("done. took {}".format(format_timespan(timer()-start)))
+
+    C = load_compressed_graph(output_fname)
+    csr_bytes = G.offsets.nbytes + G.neighbors.nbytes
+    compressed_bytes = C.adjacency_nbytes()
+    logger.info("adjacency: {} as CSR arrays, {} compressed ({:.2f} bytes per entry, {} of them the encoded lists). compression ratio {:.2f}".format(
+        format_size(csr_bytes), format_size(compressed_bytes), compressed_bytes / max(1, C.num_adjacency_entries()), format_size(C.data.nbytes), csr_bytes / max(1, compressed_bytes)))
+    if os.path.exists(graph_fname) and not graph_fname.endswith('.net'):
+        logger.info("file size: {} (CSR file {})".format(format_size(os.path.getsize(output_fname)), format_size(os.path.getsize(graph_fname))))
+
+    if args.pairs > 0 and G.num_vertices > 0:
+        # the query slowdown: the same random pairs on both representations, which must agree
+        random_state = np.random.RandomState(args.seed)
+        source_vertices = random_state.randint(G.num_vertices, size=args.pairs)
+        target_vertices = random_state.randint(G.num_vertices, size=args.pairs)
+        for backend in args.backends:
+            csr_seconds, csr_lengths = time_queries(G, source_vertices, target_vertices, backend)
+            compressed_seconds, compressed_lengths = time_queries(C, source_vertices, target_vertices, backend)
+            if compressed_lengths != csr_lengths:
+                raise RuntimeError("the compressed graph gave different lengths than the CSR graph with the {} backend".format(backend))
+            logger.info("{} backend, {} pairs: {} on the CSR graph, {} on the compressed graph. slowdown {:.2f}x".format(
+                backend, args.pairs, format_timespan(csr_seconds), format_timespan(compressed_seconds), compressed_seconds / max(csr_seconds, 1e-9)))
+
+if __name__ == "__main__":
+    total_start = timer()
+    logger = logging.getLogger(__name__)
+    logger.info(" ".join(sys.argv))
+    logger.info( '{:%Y-%m-%d %H:%M:%S}'.format(datetime.now()) )
+    import argparse
+    parser = argparse.ArgumentParser(description="compress a graph's neighbor lists (vertices reordered for locality, gap-encoded variable-length integers, in blocks), for nodes that cannot hold the CSR arrays in memory. the BFS backends take the compressed file wherever they take a CSR file. reports the compression ratio and the query slowdown against the CSR graph", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("graph", help="network graph (binary CSR file, or Pajek .net file)")
+    parser.add_argument("output", help="output file for the compressed graph")
+    parser.add_argument("--order", choices=ORDERS, default='bfs', help="vertex order the neighbor lists are stored and numbered in: BFS order within each connected component, decreasing degree, or the order of the vertex indices")
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE, help="neighbor lists per block. only the start of every block is stored, and a list is decoded with the rest of its block, so larger blocks are smaller but slower")
+    parser.add_argument("--chunk-vertices", type=int, default=1 << 20, help="neighbor lists encoded at a time")
+    parser.add_argument("--pairs", type=int, default=200, help="number of random pairs to measure the query slowdown on (0 to skip)")
+    parser.add_argument("--backends", nargs='+', choices=['bibfs', 'grouped', 'msbfs'], default=['bibfs'], help="backends to measure the query slowdown of")
+    parser.add_argument("--seed", type=int, default=99, help="random seed for the pairs")
+    parser.add_argument("--debug", action='store_true', help="output debugging info")
+    global args
+    args = parser.parse_args()
+    if args.debug:
+        logger.setLevel(logging.DEBUG)
+        logger.debug('debug mode is on')
+    else:
+        logger.setLevel(logging.INFO)
+    main(args)
+    total_end = timer()
+    logger.info('all finished. total time: {}'.format(format_timespan(total_end-total_start)))
@@ -0,0 +1,313 @@
+import os, hashlib
+import numpy as np
+
+from csr_graph import CSRGraph, write_sections, map_section, _padding, _hash_chunks
+from vertex_id_index import VertexIdIndex
+from graph_reduction import connected_components
+from pruned_landmark_labeling import degree_order
+
+# binary compressed graph file layout (little-endian, sections padded to 8 bytes, see csr_graph.write_sections):
+#   magic (8 bytes)
+#   header: HEADER_FIELDS int64 values (version, num_vertices, num_entries, num_data_bytes, block_size, has_ids, order, 0)
+#   degrees: num_vertices int32 degree of every vertex
+#   positions: num_vertices int32 storage position of every vertex, unless order is 'none'
+#   vertices: num_vertices int32 vertex at every storage position, unless order is 'none'
+#   ids: num_vertices int64 (original network ids), and the id index (sorted ids, vertex indices), if has_ids
+#   data: num_data_bytes uint8 encoded neighbor lists, in storage order
+#   block_offsets: num_blocks + 1 int64 byte offset in data of every block of block_size storage positions
+#
+# the neighbor lists are stored in a different vertex order (see ORDERS) than the vertex indices, so that
+# neighbors get nearby positions. each list holds the positions of the neighbors, sorted: the first as the
+# zigzag-encoded difference to the vertex's own position, the others as the difference to the previous one,
+# all as variable-length integers (7 bits per byte, high bit set on all but the last byte of a value).
+# only the start of every block of lists is stored, and a list is decoded together with the rest of its block.
+# vertex indices are the same as in the CSR file the graph was compressed from, so ids and distance
+# indexes stay aligned with it. with the 'none' order, positions are vertex indices and the two
+# permutation arrays are left out
+COMPRESSED_MAGIC = b'SPLCMP\x00\x01'
+COMPRESSED_VERSION = 1
+HEADER_FIELDS = 8
+HEADER_SIZE = len(COMPRESSED_MAGIC) + 8 * HEADER_FIELDS
+
+# storage orders: 'bfs' numbers each connected component in BFS order from its highest degree vertex,
+# 'degree' by decreasing degree, 'none' keeps the vertex indices
+ORDERS = ['bfs', 'degree', 'none']
+DEFAULT_BLOCK_SIZE = 16
+
+def encode_varints(values):
+    """non-negative integers as concatenated variable-length integers (uint8 array)"""
+    values = np.asarray(values, dtype=np.uint64)
+    num_bytes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        more = values >= np.uint64(1 << (7 * k))
+        if not more.any():
+            break
+        num_bytes += more
+    ends = np.cumsum(num_bytes)
+    starts = ends - num_bytes
+    out = np.empty(int(ends[-1]) if len(values) else 0, dtype=np.uint8)
+    k = 0
+    selected = np.arange(len(values))
+    while len(selected):
+        payload = (values[selected] >> np.uint64(7 * k)) & np.uint64(0x7f)
+        continued = num_bytes[selected] > k + 1
+        out[starts[selected] + k] = payload | (continued.astype(np.uint64) << np.uint64(7))
+        selected = selected[continued]
+        k += 1
+    return out
+
+def decode_varints(data):
+    """the integers of a uint8 array of concatenated variable-length integers, as int64"""
+    data = np.asarray(data)
+    ends = np.flatnonzero(data < 0x80)
+    if len(ends) == len(data):
+        return data.astype(np.int64)
+    num_bytes = np.diff(ends, prepend=-1)
+    # most values are a single byte, so build the values from their last (highest) byte down,
+    # only touching the longer ones in later rounds
+    values = data[ends].astype(np.int64)
+    longer = np.flatnonzero(num_bytes > 1)
+    k = 1
+    while len(longer):
+        values[longer] = (values[longer] << 7) | (data[ends[longer] - k] & 0x7f)
+        k += 1
+        longer = longer[num_bytes[longer] > k]
+    return values
+
+def _zigzag(values):
+    return np.where(values < 0, -2 * values - 1, 2 * values)
+
+def _unzigzag(values):
+    return np.where(values & 1, -(values >> 1) - 1, values >> 1)
+
+class CompressedGraph(CSRGraph):
+    """undirected graph with compressed neighbor lists (see the top of this module), for graphs whose
+    CSR arrays do not fit in memory. it has the CSRGraph methods the BFS engines use (degree, degrees,
+    neighbors_of, expand, ...), so it can be passed wherever they take a CSRGraph, but no offsets and
+    neighbors arrays. vertex indices and ids are those of the CSRGraph it was compressed from"""
+    def __init__(self, block_offsets, data, vertex_degrees, positions, vertices, block_size, num_entries, ids=None, id_index=None, order=None):
+        self.offsets = None
+        self.neighbors = None
+        self.block_offsets = block_offsets
+        self.data = data
+        self.vertex_degrees = vertex_degrees
+        self.positions = positions
+        self.vertices = vertices
+        self.block_size = block_size
+        self.num_entries = num_entries
+        self.ids = ids
+        self.id_index = id_index
+        self.order = order
+        self.num_vertices = len(vertex_degrees)
+        self._workspace = None
+        self._count_workspace = None
+        self._bitset_workspace = None
+
+    def num_adjacency_entries(self):
+        return self.num_entries
+
+    def adjacency_nbytes(self):
+        """bytes of the arrays needed for traversals (not counting ids)"""
+        arrays = (self.block_offsets, self.data, self.vertex_degrees, self.positions, self.vertices)
+        return sum(arr.nbytes for arr in arrays if arr is not None)
+
+    def degree(self, v):
+        return int(self.vertex_degrees[v])
+
+    def degrees(self, vertices=None):
+        if vertices is None:
+            return np.asarray(self.vertex_degrees)
+        return self.vertex_degrees[vertices]
+
+    def neighbors_of(self, v):
+        return self.expand(np.array([v], dtype=np.int64))
+
+    def fingerprint(self, chunk_vertices=1 << 16):
+        """see CSRGraph.fingerprint (the same as that of the CSRGraph the file was compressed from).
+        the neighbor lists are decoded chunk_vertices vertices at a time, and sorted"""
+        h = hashlib.sha1()
+        _hash_chunks(h, self.ids)
+        _hash_chunks(h, self.degrees())
+        for start in range(0, self.num_vertices, chunk_vertices):
+            nbrs, segments = self.expand(np.arange(start, min(start + chunk_vertices, self.num_vertices), dtype=np.int64), return_segments=True)
+            _hash_chunks(h, nbrs[np.lexsort((nbrs, segments))])
+        return "v{}-e{}-{}".format(self.num_vertices, self.num_adjacency_entries(), h.hexdigest())
+
+    def decode_blocks(self, blocks):
+        """decode the neighbor lists of the (sorted, distinct) blocks.
+        returns (neighbor positions of all lists of the blocks, concatenated, and the degrees of the lists)"""
+        byte_starts = self.block_offsets[blocks]
+        byte_lengths = self.block_offsets[blocks+1] - byte_starts
+        total = int(byte_lengths.sum())
+        segment_starts = np.cumsum(byte_lengths) - byte_lengths
+        idx = np.arange(total, dtype=np.int64) + np.repeat(byte_starts - segment_starts, byte_lengths)
+        values = decode_varints(self.data[idx])
+        positions = (blocks[:, None] * self.block_size + np.arange(self.block_size)).reshape(-1)
+        # (only the last block can be partial, so this only drops positions from the end)
+        positions = positions[positions < self.num_vertices]
+        lengths = self.vertex_degrees[positions if self.vertices is None else self.vertices[positions]].astype(np.int64)
+        # undo the gaps: a running sum over all lists, restarted at the first neighbor of every list
+        list_starts = np.cumsum(lengths) - lengths
+        nonempty = lengths > 0
+        firsts = list_starts[nonempty]
+        values[firsts] = _unzigzag(values[firsts]) + positions[nonempty]
+        sums = np.cumsum(values)
+        sums -= np.repeat(sums[firsts] - values[firsts], lengths[nonempty])
+        return sums, lengths
+
+    def expand(self, frontier, return_segments=False):
+        """see CSRGraph.expand. the neighbors of each vertex are in storage order, not by vertex index"""
+        frontier = np.asarray(frontier, dtype=np.int64)
+        if len(frontier) == 0:
+            empty = np.empty(0, dtype=np.int32)
+            if return_segments:
+                return empty, np.empty(0, dtype=np.int64)
+            return empty
+        positions = frontier if self.positions is None else self.positions[frontier].astype(np.int64)
+        blocks, block_idx = np.unique(positions // self.block_size, return_inverse=True)
+        decoded, lengths = self.decode_blocks(blocks)
+        # each frontier vertex's list among the decoded ones
+        list_idx = block_idx.reshape(-1) * self.block_size + positions % self.block_size
+        starts = (np.cumsum(lengths) - lengths)[list_idx]
+        lengths = lengths[list_idx]
+        total = int(lengths.sum())
+        segment_starts = np.cumsum(lengths) - lengths
+        idx = np.arange(total, dtype=np.int64) + np.repeat(starts - segment_starts, lengths)
+        if self.vertices is None:
+            nbrs = decoded[idx].astype(np.int32)
+        else:
+            nbrs = self.vertices[decoded[idx]]
+        if return_segments:
+            return nbrs, np.repeat(np.arange(len(frontier), dtype=np.int64), lengths)
+        return nbrs
+
+def storage_order(G, order='bfs'):
+    """the vertices of the CSRGraph G in storage order (see ORDERS)"""
+    if order == 'none':
+        return np.arange(G.num_vertices, dtype=np.int64)
+    if order == 'degree':
+        return degree_order(G)
+    if order != 'bfs':
+        raise ValueError("unknown vertex order: {}".format(order))
+    # one BFS from the highest degree vertex of every component, all run together. every level keeps the
+    # order in which the previous level reaches its vertices, so neighbors of one vertex end up close together
+    components = connected_components(G)
+    by_degree = degree_order(G)
+    first = np.unique(components[by_degree], return_index=True)[1]
+    frontier = by_degree[first]
+    discovered = np.full(G.num_vertices, -1, dtype=np.int64)
+    discovered[frontier] = np.arange(len(frontier))
+    num_discovered = len(frontier)
+    while len(frontier):
+        nbrs = G.expand(frontier)
+        nbrs = nbrs[discovered[nbrs] < 0]
+        frontier = nbrs[np.sort(np.unique(nbrs, return_index=True)[1])].astype(np.int64)
+        discovered[frontier] = num_discovered + np.arange(len(frontier))
+        num_discovered += len(frontier)
+    # then the components one after another, largest first
+    sizes = np.bincount(components)
+    return np.lexsort((discovered, components, -sizes[components]))
+
+def encode_lists(G, vertices, positions, first_position):
+    """encoded neighbor lists of `vertices` (at consecutive storage positions from first_position).
+    positions is the storage position of every vertex (None if it is the vertex index).
+    returns (uint8 data, number of bytes of each list)"""
+    nbrs, segments = G.expand(vertices, return_segments=True)
+    if len(nbrs) == 0:
+        return np.empty(0, dtype=np.uint8), np.zeros(len(vertices), dtype=np.int64)
+    nbr_positions = (nbrs if positions is None else positions[nbrs]).astype(np.int64)
+    # sort every list by position: segments are already in order, so one sort of the combined key does it
+    keys = segments * G.num_vertices + nbr_positions
+    keys.sort()
+    nbr_positions = keys % G.num_vertices
+    segments = keys // G.num_vertices
+    gaps = np.empty(len(keys), dtype=np.int64)
+    gaps[1:] = nbr_positions[1:] - nbr_positions[:-1]
+    is_first = np.ones(len(keys), dtype=bool)
+    is_first[1:] = segments[1:] != segments[:-1]
+    gaps[is_first] = _zigzag(nbr_positions[is_first] - (first_position + segments[is_first]))
+    data = encode_varints(gaps)
+    value_ends = np.flatnonzero(data < 0x80) + 1
+    value_bytes = np.diff(np.concatenate([[0], value_ends]))
+    list_bytes = np.bincount(segments, weights=value_bytes, minlength=len(vertices)).astype(np.int64)
+    return data, list_bytes
+
+def compress_csr_graph(G, fname, order='bfs', block_size=DEFAULT_BLOCK_SIZE, chunk_size=1 << 20):
+    """write the CSRGraph G (e.g. memory-mapped from a CSR file) to fname as a compressed graph file.
+    the lists are encoded chunk_size vertices at a time, so G's arrays do not need to fit in memory
+    (but the 'bfs' order needs the component labels, see graph_reduction.connected_components)"""
+    n = G.num_vertices
+    sections = [np.ascontiguousarray(G.degrees(), dtype='<i4')]
+    if order == 'none':
+        vertices = np.arange(n, dtype=np.int64)
+        positions = None
+    else:
+        vertices = storage_order(G, order).astype('<i4')
+        positions = np.empty(n, dtype='<i4')
+        positions[vertices] = np.arange(n, dtype=np.int32)
+        sections.extend([positions, vertices])
+    has_ids = G.ids is not None
+    if has_ids:
+        ids = np.ascontiguousarray(G.ids, dtype='<i8')
+        id_index = G.id_index if G.id_index is not None else VertexIdIndex.from_ids(ids)
+        sections.extend([ids,
+                         np.ascontiguousarray(id_index.sorted_ids, dtype='<i8'),
+                         np.ascontiguousarray(id_index.vertex_indices, dtype='<i8')])
+    num_blocks = (n + block_size - 1) // block_size
+    block_offsets = np.zeros(num_blocks + 1, dtype='<i8')
+    chunk_size = max(1, chunk_size // block_size) * block_size
+    num_data_bytes = 0
+    def header():
+        return np.array([COMPRESSED_VERSION, n, G.num_adjacency_entries(), num_data_bytes, block_size, int(has_ids), ORDERS.index(order), 0], dtype='<i8')
+    tmp_fname = "{}.tmp{}".format(fname, os.getpid())
+    with open(tmp_fname, 'wb') as outf:
+        outf.write(COMPRESSED_MAGIC)
+        outf.write(header().tobytes())
+        write_sections(outf, sections)
+        for lo in range(0, n, chunk_size):
+            hi = min(n, lo + chunk_size)
+            data, list_bytes = encode_lists(G, vertices[lo:hi], positions, lo)
+            outf.write(data.tobytes())
+            # the chunk starts at a block boundary, so its blocks end every block_size lists (and at the chunk's end)
+            list_ends = num_data_bytes + np.cumsum(list_bytes)
+            block_ends = np.minimum(np.arange(block_size, hi - lo + block_size, block_size), hi - lo) - 1
+            block_offsets[lo // block_size + 1:lo // block_size + 1 + len(block_ends)] = list_ends[block_ends]
+            num_data_bytes += len(data)
+        outf.write(b'\x00' * _padding(num_data_bytes))
+        write_sections(outf, [block_offsets])
+        outf.seek(len(COMPRESSED_MAGIC))
+        outf.write(header().tobytes())
+    os.rename(tmp_fname, fname)
+
+def is_compressed_file(fname):
+    with open(fname, 'rb') as f:
+        return f.read(len(COMPRESSED_MAGIC)) == COMPRESSED_MAGIC
+
+def load_compressed_graph(fname):
+    """memory-map a compressed graph file (written by compress_csr_graph) as a CompressedGraph"""
+    with open(fname, 'rb') as f:
+        if f.read(len(COMPRESSED_MAGIC)) != COMPRESSED_MAGIC:
+            raise ValueError("{} is not a compressed graph file".format(fname))
+        header = np.frombuffer(f.read(8 * HEADER_FIELDS), dtype='<i8')
+    version, num_vertices, num_entries, num_data_bytes, block_size, has_ids, order = [int(x) for x in header[:7]]
+    if version != COMPRESSED_VERSION:
+        raise ValueError("unsupported compressed graph file version: {}".format(version))
+    pos = HEADER_SIZE
+    vertex_degrees, pos = map_section(fname, '<i4', num_vertices, pos)
+    positions = None
+    vertices = None
+    if ORDERS[order] != 'none':
+        positions, pos = map_section(fname, '<i4', num_vertices, pos)
+        vertices, pos = map_section(fname, '<i4', num_vertices, pos)
+    ids = None
+    id_index = None
+    if has_ids:
+        ids, pos = map_section(fname, '<i8', num_vertices, pos)
+        sorted_ids, pos = map_section(fname, '<i8', num_vertices, pos)
+        vertex_indices, pos = map_section(fname, '<i8', num_vertices, pos)
+        id_index = VertexIdIndex(sorted_ids, vertex_indices)
+    data, pos = map_section(fname, np.uint8, num_data_bytes, pos)
+    num_blocks = (num_vertices + block_size - 1) // block_size
+    block_offsets, pos = map_section(fname, '<i8', num_blocks + 1, pos)
+    return CompressedGraph(block_offsets, data, vertex_degrees, positions, vertices, block_size, num_entries,
+                           ids=ids, id_index=id_index, order=ORDERS[order])
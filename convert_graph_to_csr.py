@@ -0,0 +1,82 @@
+import sys, os
+from datetime import datetime
+from timeit import default_timer as timer
+try:
+    from humanfriendly import format_timespan
+except ImportError:
+    def format_timespan(seconds):
+        return "{:.2f} seconds".format(seconds)
+
+from csr_graph import read_pajek_edges, read_edgelist, csr_graph_from_edges, save_csr_graph
+from graph_ingest import ingest_to_csr_file
+
+import logging
+logging.basicConfig(format='%(asctime)s %(name)s.%(lineno)d %(levelname)s : %(message)s',
+        datefmt="%H:%M:%S",
+        level=logging.INFO)
+# logger = logging.getLogger(__name__)
+logger = logging.getLogger('__main__').getChild(__name__)
+
+def main(args):
+    input_fname = os.path.abspath(args.input)
+    input_format = args.format
+    if input_format is None:
+        input_format = 'pajek' if input_fname.endswith('.net') else 'edgelist'
+    output_fname = os.path.abspath(args.output)
+
+    if args.processes > 1:
+        total_start = timer()
+        def progress(phase, seconds):
+            logger.info("{} phase took {}".format(phase, format_timespan(seconds)))
+        logger.debug("converting {} file {} with {} processes, at most {} MB of edges in memory...".format(input_format, input_fname, args.processes, args.memory_mb))
+        num_vertices, num_edges, num_entries = ingest_to_csr_file(input_fname, output_fname, input_format=input_format, sep=args.sep,
+                processes=args.processes, chunk_bytes=args.chunk_mb << 20, memory_bytes=args.memory_mb << 20, tmpdir=args.tmpdir, progress=progress)
+        seconds = timer() - total_start
+        logger.info("{} vertices, {} edge lines, {} undirected edges after removing duplicates and self-loops. {:.0f} edges/sec".format(num_vertices, num_edges, num_entries // 2, num_edges / max(seconds, 1e-9)))
+        logger.debug("file size: {} bytes".format(os.path.getsize(output_fname)))
+        return
+
+    start = timer()
+    logger.debug("reading {} file: {}...".format(input_format, input_fname))
+    if input_format == 'pajek':
+        ids, sources, targets = read_pajek_edges(input_fname)
+    else:
+        ids, sources, targets = read_edgelist(input_fname, sep=args.sep)
+    logger.debug("done reading {} vertices and {} edges. took {}".format(len(ids), len(sources), format_timespan(timer()-start)))
+
+    start = timer()
+    logger.debug("building CSR arrays...")
+    G = csr_graph_from_edges(ids, sources, targets)
+    logger.debug("done. {} undirected edges after removing duplicates and self-loops. took {}".format(G.num_adjacency_entries() // 2, format_timespan(timer()-start)))
+
+    start = timer()
+    logger.debug("writing to {}...".format(output_fname))
+    save_csr_graph(G, output_fname)
+    logger.debug("done. file size: {} bytes. took {}".format(os.path.getsize(output_fname), format_timespan(timer()-start)))
+
+if __name__ == "__main__":
+    total_start = timer()
+    logger = logging.getLogger(__name__)
+    logger.info(" ".join(sys.argv))
+    logger.info( '{:%Y-%m-%d %H:%M:%S}'.format(datetime.now()) )
+    import argparse
+    parser = argparse.ArgumentParser(description="convert a network (Pajek .net file or edge list) to the binary CSR format, which load_graph memory-maps instead of parsing", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("input", help="network file (Pajek .net, or edge list with one pair of original ids per line)")
+    parser.add_argument("output", help="output file (binary CSR)")
+    parser.add_argument("--format", choices=['pajek', 'edgelist'], help="input format (default: pajek if the filename ends in .net, otherwise edgelist)")
+    parser.add_argument("--sep", help="delimiter for the edge list (default: any whitespace)")
+    parser.add_argument("--processes", type=int, default=1, help="number of processes to parse the input with. with more than 1, the file is parsed in chunks and the edges are sorted and deduplicated in buckets on disk, so that graphs larger than memory can be converted")
+    parser.add_argument("--chunk-mb", type=int, default=64, help="size of the chunks of the input file each process parses at a time (with --processes > 1)")
+    parser.add_argument("--memory-mb", type=int, default=2048, help="approximate memory for sorting edges, which sets the number of buckets (with --processes > 1)")
+    parser.add_argument("--tmpdir", help="directory for the temporary bucket files (with --processes > 1; default: the system temporary directory)")
+    parser.add_argument("--debug", action='store_true', help="output debugging info")
+    global args
+    args = parser.parse_args()
+    if args.debug:
+        logger.setLevel(logging.DEBUG)
+        logger.debug('debug mode is on')
+    else:
+        logger.setLevel(logging.INFO)
+    main(args)
+    total_end = timer()
+    logger.info('all finished. total time: {}'.format(format_timespan(total_end-total_start)))
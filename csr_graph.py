@@ -0,0 +1,325 @@
+import os, hashlib
+import numpy as np
+
+from vertex_id_index import VertexIdIndex
+
+# binary CSR file layout (all little-endian, every section starts on an 8-byte boundary):
+#   magic (8 bytes)
+#   header: HEADER_FIELDS int64 values (version, num_vertices, num_entries, offsets_itemsize, has_ids, 0, 0, 0)
+#   offsets: num_vertices + 1 integers (int32 or int64, see offsets_itemsize)
+#   neighbors: num_entries int32
+#   ids: num_vertices int64 (original network ids), if has_ids
+#   id index: num_vertices int64 sorted ids, then num_vertices int64 vertex indices, if has_ids
+CSR_MAGIC = b'SPLCSR\x00\x01'
+CSR_VERSION = 1
+HEADER_FIELDS = 8
+HEADER_SIZE = len(CSR_MAGIC) + 8 * HEADER_FIELDS
+
+def offsets_dtype(num_entries):
+    """smallest integer dtype that can hold offsets into an array of num_entries"""
+    if num_entries < np.iinfo(np.int32).max:
+        return np.int32
+    return np.int64
+
+class CSRGraph(object):
+    """undirected graph in compressed sparse row form.
+
+    the neighbors of vertex v are neighbors[offsets[v]:offsets[v+1]].
+    vertex indices are the same as the igraph vertex sequence ids,
+    and ids[v] is the id of vertex v in the original network."""
+    def __init__(self, offsets, neighbors, ids=None, id_index=None):
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.ids = ids
+        self.id_index = id_index
+        self.num_vertices = len(offsets) - 1
+        self._workspace = None
+        self._count_workspace = None
+        self._bitset_workspace = None
+
+    def vcount(self):
+        return self.num_vertices
+
+    def num_adjacency_entries(self):
+        """number of entries in the neighbors array (twice the number of undirected edges)"""
+        return int(self.offsets[-1])
+
+    def degree(self, v):
+        return int(self.offsets[v+1] - self.offsets[v])
+
+    def degrees(self, vertices=None):
+        """degrees of an array of vertices (all vertices if None)"""
+        if vertices is None:
+            return np.diff(self.offsets)
+        return self.offsets[vertices+1] - self.offsets[vertices]
+
+    def neighbors_of(self, v):
+        return self.neighbors[self.offsets[v]:self.offsets[v+1]]
+
+    def expand(self, frontier, return_segments=False):
+        """concatenated neighbors of all vertices in the array `frontier` (may contain duplicates).
+
+        if return_segments is True, also return, for each neighbor, the position in `frontier` of the vertex it came from"""
+        frontier = np.asarray(frontier)
+        starts = self.offsets[frontier].astype(np.int64)
+        lengths = self.offsets[frontier+1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            empty = np.empty(0, dtype=self.neighbors.dtype)
+            if return_segments:
+                return empty, np.empty(0, dtype=np.int64)
+            return empty
+        # index of every neighbor entry: start of its segment plus its position within the segment
+        segment_starts = np.cumsum(lengths) - lengths
+        idx = np.arange(total, dtype=np.int64) + np.repeat(starts - segment_starts, lengths)
+        nbrs = self.neighbors[idx]
+        if return_segments:
+            return nbrs, np.repeat(np.arange(len(frontier), dtype=np.int64), lengths)
+        return nbrs
+
+    def fingerprint(self):
+        """a string that identifies the graph by its contents: the numbers of vertices and adjacency
+        entries, and a SHA-1 hash of the original ids, the degrees and the neighbor lists (each in
+        increasing order, as build_csr stores them). the same graph gives the same fingerprint whatever
+        file it was loaded from, including a compressed graph file"""
+        h = hashlib.sha1()
+        _hash_chunks(h, self.ids)
+        _hash_chunks(h, self.degrees())
+        _hash_chunks(h, self.neighbors)
+        return "v{}-e{}-{}".format(self.num_vertices, self.num_adjacency_entries(), h.hexdigest())
+
+    def get_workspace(self):
+        """two distance arrays (one per search direction), all -1.
+
+        they are allocated once and reused across queries. engines must reset
+        every entry they set back to -1 before returning."""
+        if self._workspace is None:
+            self._workspace = (np.full(self.num_vertices, -1, dtype=np.int32),
+                               np.full(self.num_vertices, -1, dtype=np.int32))
+        return self._workspace
+
+    def get_count_workspace(self):
+        """two path count arrays (one per search direction), all 0. reused like get_workspace:
+        engines must reset every entry they set back to 0 before returning."""
+        if self._count_workspace is None:
+            self._count_workspace = (np.zeros(self.num_vertices, dtype=np.float64),
+                                     np.zeros(self.num_vertices, dtype=np.float64))
+        return self._count_workspace
+
+    def get_bitset_workspace(self, num_words):
+        """a (num_vertices, num_words) uint64 array of per-vertex bitsets for multi-source BFS, all 0.
+        reused like get_workspace (and reallocated if more words are needed): engines must reset
+        every row they set back to 0 before returning."""
+        if self._bitset_workspace is None or self._bitset_workspace.shape[1] < num_words:
+            self._bitset_workspace = np.zeros((self.num_vertices, num_words), dtype=np.uint64)
+        return self._bitset_workspace[:, :num_words]
+
+    def __getstate__(self):
+        # don't ship the scratch arrays when pickling
+        state = self.__dict__.copy()
+        state['_workspace'] = None
+        state['_count_workspace'] = None
+        state['_bitset_workspace'] = None
+        return state
+
+def _hash_chunks(h, arr, chunk_size=1 << 22):
+    """feed an integer array (if not None) to the hash h as little-endian int64s, a chunk at a time,
+    so that the hash does not depend on the array's dtype and a memory-mapped array is not copied whole"""
+    if arr is None:
+        return
+    for i in range(0, len(arr), chunk_size):
+        h.update(np.ascontiguousarray(arr[i:i+chunk_size], dtype='<i8').tobytes())
+
+def build_csr(sources, targets, num_vertices):
+    """build the (deduplicated, undirected) CSR arrays from two arrays of edge endpoints.
+
+    self-loops are dropped, since they never change a shortest path length.
+    returns (offsets, neighbors)"""
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    keep = sources != targets
+    sources = sources[keep]
+    targets = targets[keep]
+    # each edge in both directions, encoded as a single integer so that np.unique sorts and dedupes in one pass
+    keys = np.concatenate([sources * num_vertices + targets, targets * num_vertices + sources])
+    keys = np.unique(keys)
+    rows = keys // num_vertices
+    neighbors = (keys % num_vertices).astype(np.int32)
+    counts = np.bincount(rows, minlength=num_vertices)
+    offsets = np.zeros(num_vertices + 1, dtype=offsets_dtype(len(neighbors)))
+    np.cumsum(counts, out=offsets[1:])
+    return offsets, neighbors
+
+def parse_ids(ids):
+    """original network ids (strings, e.g. from the igraph `id` or `name` attribute) as an int64 array"""
+    return np.array([int(x) for x in ids], dtype=np.int64)
+
+def igraph_id_attribute(G):
+    """name of the vertex attribute of an igraph Graph that holds the original network ids:
+    `id` (where python-igraph 0.7 reads the Pajek vertex labels to), or `name` (where newer versions do).
+    None if there is neither"""
+    attributes = G.vs.attributes()
+    for attribute in ('id', 'name'):
+        if attribute in attributes:
+            return attribute
+    return None
+
+def csr_graph_from_igraph(G):
+    """convert an igraph Graph (as loaded by load_graph) to a CSRGraph, ignoring edge directions"""
+    num_vertices = G.vcount()
+    edges = np.array(G.get_edgelist(), dtype=np.int64).reshape(-1, 2)
+    offsets, neighbors = build_csr(edges[:, 0], edges[:, 1], num_vertices)
+    ids = None
+    id_attribute = igraph_id_attribute(G)
+    if id_attribute is not None:
+        ids = parse_ids(G.vs[id_attribute])
+    return CSRGraph(offsets, neighbors, ids=ids)
+
+def _padding(nbytes):
+    return (-nbytes) % 8
+
+def write_sections(outf, sections):
+    """write arrays back to back, each padded to an 8-byte boundary"""
+    for arr in sections:
+        outf.write(arr.tobytes())
+        outf.write(b'\x00' * _padding(arr.nbytes))
+
+def save_csr_graph(G, fname):
+    """write a CSRGraph to fname in the binary CSR layout (see the top of this module).
+    the id index is built and stored in the same file"""
+    offsets_itemsize = np.dtype(offsets_dtype(G.num_adjacency_entries())).itemsize
+    offsets = np.ascontiguousarray(G.offsets, dtype='<i{}'.format(offsets_itemsize))
+    neighbors = np.ascontiguousarray(G.neighbors, dtype='<i4')
+    has_ids = G.ids is not None
+    header = np.array([CSR_VERSION, G.num_vertices, len(neighbors), offsets.itemsize, int(has_ids), 0, 0, 0], dtype='<i8')
+    sections = [offsets, neighbors]
+    if has_ids:
+        ids = np.ascontiguousarray(G.ids, dtype='<i8')
+        id_index = G.id_index if G.id_index is not None else VertexIdIndex.from_ids(ids)
+        sections.extend([ids,
+                         np.ascontiguousarray(id_index.sorted_ids, dtype='<i8'),
+                         np.ascontiguousarray(id_index.vertex_indices, dtype='<i8')])
+    tmp_fname = "{}.tmp{}".format(fname, os.getpid())
+    with open(tmp_fname, 'wb') as outf:
+        outf.write(CSR_MAGIC)
+        outf.write(header.tobytes())
+        write_sections(outf, sections)
+    os.rename(tmp_fname, fname)
+
+def is_csr_file(fname):
+    with open(fname, 'rb') as f:
+        return f.read(len(CSR_MAGIC)) == CSR_MAGIC
+
+def map_section(fname, dtype, count, offset):
+    """memory-map `count` items of `dtype` at byte `offset` of a file written with write_sections.
+    returns (array, offset of the next section)"""
+    if count == 0:
+        return np.empty(0, dtype=dtype), offset
+    arr = np.memmap(fname, dtype=dtype, mode='r', offset=offset, shape=(count,))
+    nbytes = arr.nbytes
+    return arr, offset + nbytes + _padding(nbytes)
+
+def load_csr_graph(fname):
+    """memory-map a binary CSR file (written by save_csr_graph) as a CSRGraph.
+
+    nothing is read up front; pages are loaded on demand and shared
+    through the page cache between all processes that map the same file"""
+    with open(fname, 'rb') as f:
+        magic = f.read(len(CSR_MAGIC))
+        if magic != CSR_MAGIC:
+            raise ValueError("{} is not a binary CSR graph file".format(fname))
+        header = np.frombuffer(f.read(8 * HEADER_FIELDS), dtype='<i8')
+    version, num_vertices, num_entries, offsets_itemsize, has_ids = [int(x) for x in header[:5]]
+    if version != CSR_VERSION:
+        raise ValueError("unsupported CSR graph file version: {}".format(version))
+    pos = HEADER_SIZE
+    offsets, pos = map_section(fname, '<i{}'.format(offsets_itemsize), num_vertices + 1, pos)
+    neighbors, pos = map_section(fname, '<i4', num_entries, pos)
+    ids = None
+    id_index = None
+    if has_ids:
+        ids, pos = map_section(fname, '<i8', num_vertices, pos)
+        sorted_ids, pos = map_section(fname, '<i8', num_vertices, pos)
+        vertex_indices, pos = map_section(fname, '<i8', num_vertices, pos)
+        id_index = VertexIdIndex(sorted_ids, vertex_indices)
+    return CSRGraph(offsets, neighbors, ids=ids, id_index=id_index)
+
+def _iter_data_lines(f):
+    for line in f:
+        line = line.strip()
+        if line and line[0] != '%':
+            yield line
+
+def read_pajek_edges(fname):
+    """parse a Pajek .net file into arrays, without building an igraph Graph.
+
+    returns (ids, sources, targets): ids[v] is the label of vertex v (its number in the
+    file, if it has no label), and sources/targets are 0-based vertex indices.
+    vertex indices match the igraph vertex sequence ids from load_graph"""
+    ids = None
+    sources = []
+    targets = []
+    section = None
+    with open(fname, 'r') as f:
+        for line in _iter_data_lines(f):
+            if line[0] == '*':
+                parts = line.split()
+                section = parts[0].lower()
+                if section == '*vertices':
+                    num_vertices = int(parts[1])
+                    ids = np.arange(1, num_vertices + 1, dtype=np.int64)
+                continue
+            if section == '*vertices':
+                parts = line.split(None, 1)
+                if len(parts) > 1:
+                    label = parts[1]
+                    if label[0] == '"':
+                        label = label[1:label.index('"', 1)]
+                    else:
+                        label = label.split()[0]
+                    ids[int(parts[0]) - 1] = int(label)
+            elif section in ('*arcs', '*edges'):
+                parts = line.split()
+                sources.append(int(parts[0]) - 1)
+                targets.append(int(parts[1]) - 1)
+            elif section in ('*arcslist', '*edgeslist'):
+                parts = line.split()
+                for other in parts[1:]:
+                    sources.append(int(parts[0]) - 1)
+                    targets.append(int(other) - 1)
+    if ids is None:
+        raise ValueError("no *Vertices section in {}".format(fname))
+    return ids, np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64)
+
+def read_edgelist(fname, sep=None):
+    """parse a plain edge list (one "source_id target_id" pair per line, original ids).
+
+    vertices are numbered in order of increasing original id.
+    returns (ids, sources, targets) like read_pajek_edges"""
+    sources = []
+    targets = []
+    with open(fname, 'r') as f:
+        for line in _iter_data_lines(f):
+            if line[0] == '#':
+                continue
+            parts = line.split(sep)
+            sources.append(int(parts[0]))
+            targets.append(int(parts[1]))
+    sources = np.array(sources, dtype=np.int64)
+    targets = np.array(targets, dtype=np.int64)
+    ids = np.unique(np.concatenate([sources, targets]))
+    return ids, np.searchsorted(ids, sources), np.searchsorted(ids, targets)
+
+def csr_graph_from_edges(ids, sources, targets):
+    offsets, neighbors = build_csr(sources, targets, len(ids))
+    return CSRGraph(offsets, neighbors, ids=ids, id_index=VertexIdIndex.from_ids(ids))
+
+def convert_to_csr_file(input_fname, output_fname, input_format='pajek', sep=None):
+    """one-time conversion of a Pajek .net file or an edge list to a binary CSR file. returns the CSRGraph"""
+    if input_format == 'pajek':
+        ids, sources, targets = read_pajek_edges(input_fname)
+    else:
+        ids, sources, targets = read_edgelist(input_fname, sep=sep)
+    G = csr_graph_from_edges(ids, sources, targets)
+    save_csr_graph(G, output_fname)
+    return G
@@ -0,0 +1,177 @@
+import sqlite3
+from collections import OrderedDict, Counter
+
+from csr_graph import CSRGraph
+from landmarks import bfs_distances, UNREACHABLE
+
+# length stored for pairs with no path
+_NO_PATH = -1
+
+class DistanceCache(object):
+    """persistent (source id, target id) -> shortest path length cache in an SQLite file.
+
+    keys are the original network ids, stored with the smaller id first, since lengths are undirected.
+    the graph's fingerprint (see CSRGraph.fingerprint) is recorded on creation, and checked when the file
+    is reopened, so that a cache is never used with a different graph (or a changed version of it).
+    lookups and hits count the pairs looked up / found"""
+    def __init__(self, fname, graph_fingerprint, timeout=60.0):
+        self.fname = fname
+        self.conn = sqlite3.connect(fname, timeout=timeout)
+        # several processes may share the file. WAL lets them read while one writes
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS lengths (u INTEGER, v INTEGER, length INTEGER, PRIMARY KEY (u, v)) WITHOUT ROWID")
+        self.conn.commit()
+        meta = dict(self.conn.execute("SELECT key, value FROM meta").fetchall())
+        if meta and 'graph_fingerprint' not in meta:
+            # (written by an earlier version, which only recorded the number of vertices)
+            raise ValueError("distance cache {} has no graph fingerprint, so it may be for a different graph. remove it to start a new cache".format(fname))
+        self.conn.execute("INSERT OR IGNORE INTO meta VALUES ('graph_fingerprint', ?)", (graph_fingerprint, ))
+        self.conn.commit()
+        cached_fingerprint = self.conn.execute("SELECT value FROM meta WHERE key = 'graph_fingerprint'").fetchone()[0]
+        if cached_fingerprint != graph_fingerprint:
+            raise ValueError("distance cache {} is for a different graph (fingerprint {}, not {})".format(fname, cached_fingerprint, graph_fingerprint))
+        self.lookups = 0
+        self.hits = 0
+
+    def get_many(self, source_ids, target_ids):
+        """cached lengths for pairs of original ids (int or float('inf')), None where not cached"""
+        cursor = self.conn.cursor()
+        sp_lengths = []
+        for u, v in zip(source_ids, target_ids):
+            u, v = sorted((int(u), int(v)))
+            row = cursor.execute("SELECT length FROM lengths WHERE u = ? AND v = ?", (u, v)).fetchone()
+            if row is None:
+                sp_lengths.append(None)
+            else:
+                sp_lengths.append(float('inf') if row[0] == _NO_PATH else row[0])
+        self.lookups += len(sp_lengths)
+        self.hits += sum(1 for sp_length in sp_lengths if sp_length is not None)
+        return sp_lengths
+
+    def put_many(self, source_ids, target_ids, sp_lengths):
+        """store lengths for pairs of original ids. None lengths (ids not in the graph) are skipped"""
+        rows = []
+        for u, v, sp_length in zip(source_ids, target_ids, sp_lengths):
+            if sp_length is None:
+                continue
+            u, v = sorted((int(u), int(v)))
+            rows.append((u, v, _NO_PATH if sp_length == float('inf') else int(sp_length)))
+        if rows:
+            with self.conn:
+                self.conn.executemany("INSERT OR REPLACE INTO lengths VALUES (?, ?, ?)", rows)
+
+    def close(self):
+        self.conn.close()
+
+class SourceDistanceCache(object):
+    """in-memory LRU cache of full BFS distance arrays (uint8, see landmarks.bfs_distances) of recent endpoints.
+
+    a pair with a cached endpoint is answered by looking up the other endpoint in its array.
+    an endpoint gets a full BFS (and a cache entry) once it has been seen in min_uses pairs, counting
+    earlier batches, since one BFS then serves all of its pairs. arrays are evicted, least recently used
+    first, to stay under max_bytes.
+    lookups and hits count pairs looked up / answered from an array of an earlier batch, num_bfs the BFSs run,
+    and bfs_answered the pairs answered by the BFSs run for their own batch (which are not hits)"""
+    def __init__(self, max_bytes, min_uses=2):
+        self.max_bytes = max_bytes
+        self.min_uses = min_uses
+        self.arrays = OrderedDict()
+        self.uses = Counter()
+        # endpoints whose distances do not fit in uint8 arrays
+        self.too_far = set()
+        self.num_bytes = 0
+        self.lookups = 0
+        self.hits = 0
+        self.num_bfs = 0
+        self.bfs_answered = 0
+
+    def get(self, vertex):
+        dists = self.arrays.get(vertex)
+        if dists is not None:
+            self.arrays.move_to_end(vertex)
+        return dists
+
+    def add(self, vertex, dists):
+        if dists.nbytes > self.max_bytes:
+            return
+        while self.arrays and self.num_bytes + dists.nbytes > self.max_bytes:
+            _, evicted = self.arrays.popitem(last=False)
+            self.num_bytes -= evicted.nbytes
+        self.arrays[vertex] = dists
+        self.num_bytes += dists.nbytes
+
+    def _lookup(self, source, target):
+        for vertex, other in ((source, target), (target, source)):
+            dists = self.get(vertex)
+            if dists is not None:
+                d = int(dists[other])
+                return float('inf') if d == UNREACHABLE else d
+        return None
+
+    def shortest_path_lengths(self, G, source_vertices, target_vertices):
+        """lengths for pairs of vertex indices of the CSRGraph G that cached arrays can answer, running a
+        full BFS first from every endpoint that has reached min_uses. None for the other pairs"""
+        source_vertices = [int(v) for v in source_vertices]
+        target_vertices = [int(v) for v in target_vertices]
+        self.uses.update(source_vertices)
+        self.uses.update(target_vertices)
+        sp_lengths = [self._lookup(u, v) for u, v in zip(source_vertices, target_vertices)]
+        num_hits = sum(1 for sp_length in sp_lengths if sp_length is not None)
+        for pos, (u, v) in enumerate(zip(source_vertices, target_vertices)):
+            if sp_lengths[pos] is not None:
+                continue
+            # an array from a BFS run earlier in this batch
+            sp_lengths[pos] = self._lookup(u, v)
+            if sp_lengths[pos] is not None:
+                continue
+            # the endpoint used more often serves more pairs from its array
+            root = u if self.uses[u] >= self.uses[v] else v
+            if self.uses[root] < self.min_uses or root in self.too_far:
+                continue
+            try:
+                dists = bfs_distances(G, root)
+            except ValueError:
+                # leave its pairs to the backend
+                self.too_far.add(root)
+                continue
+            self.add(root, dists)
+            self.num_bfs += 1
+            sp_lengths[pos] = self._lookup(u, v)
+        self.lookups += len(sp_lengths)
+        self.hits += num_hits
+        self.bfs_answered += sum(1 for sp_length in sp_lengths if sp_length is not None) - num_hits
+        return sp_lengths
+
+def cached_shortest_path_lengths(G, source_ids, target_ids, source_vertices, target_vertices, compute, cache=None, source_cache=None):
+    """shortest path lengths for a batch of pairs, checking the persistent DistanceCache first, then the
+    SourceDistanceCache (if G is a CSRGraph), and calling compute(source_vertices, target_vertices) for the rest.
+    source_ids/target_ids are the original ids of the pairs, and source_vertices/target_vertices their
+    vertex indices (-1 if not in the graph, which gives None). new lengths are added to the persistent cache"""
+    sp_lengths = [None] * len(source_vertices)
+    todo = [pos for pos in range(len(source_vertices)) if source_vertices[pos] >= 0 and target_vertices[pos] >= 0]
+    if cache is not None and todo:
+        for pos, sp_length in zip(todo, cache.get_many([source_ids[pos] for pos in todo], [target_ids[pos] for pos in todo])):
+            sp_lengths[pos] = sp_length
+        todo = [pos for pos in todo if sp_lengths[pos] is None]
+    computed = list(todo)
+    if source_cache is not None and todo and isinstance(G, CSRGraph):
+        for pos, sp_length in zip(todo, source_cache.shortest_path_lengths(G, [source_vertices[pos] for pos in todo], [target_vertices[pos] for pos in todo])):
+            sp_lengths[pos] = sp_length
+        todo = [pos for pos in todo if sp_lengths[pos] is None]
+    if todo:
+        for pos, sp_length in zip(todo, compute([source_vertices[pos] for pos in todo], [target_vertices[pos] for pos in todo])):
+            sp_lengths[pos] = sp_length
+    if cache is not None and computed:
+        cache.put_many([source_ids[pos] for pos in computed], [target_ids[pos] for pos in computed], [sp_lengths[pos] for pos in computed])
+    return sp_lengths
+
+def format_cache_stats(cache=None, source_cache=None):
+    """one line summary of the hit rates, for the end of a run"""
+    parts = []
+    if cache is not None:
+        parts.append("persistent cache answered {} of {} pairs ({:.1f}%)".format(cache.hits, cache.lookups, 100.0 * cache.hits / cache.lookups if cache.lookups else 0.0))
+    if source_cache is not None:
+        parts.append("source distance arrays of earlier batches answered {} of {} pairs ({:.1f}%), and {} BFSs answered {} pairs of their own batch".format(
+            source_cache.hits, source_cache.lookups, 100.0 * source_cache.hits / source_cache.lookups if source_cache.lookups else 0.0, source_cache.num_bfs, source_cache.bfs_answered))
+    return ". ".join(parts)
@@ -1,4 +1,4 @@
-import sys, os, time
+import sys
 from datetime import datetime
 from timeit import default_timer as timer
 try:
@@ -10,6 +10,8 @@ except ImportError:
 import pandas as pd
 import numpy as np
 
+from pairs_file import write_offsets, write_groups, get_offsets_fname, get_groups_fname
+
 import logging
 logging.basicConfig(format='%(asctime)s %(name)s.%(lineno)d %(levelname)s : %(message)s',
         datefmt="%H:%M:%S",
@@ -17,25 +19,63 @@ logging.basicConfig(format='%(asctime)s %(name)s.%(lineno)d %(levelname)s : %(me
 # logger = logging.getLogger(__name__)
 logger = logging.getLogger('__main__').getChild(__name__)
 
+def get_category_indices(df, category_colname, min_papers):
+    """[(category, row positions of its papers)] for the categories with more than min_papers papers, sorted by category"""
+    positions = df.groupby(category_colname).indices
+    return [(name, positions[name]) for name in sorted(positions) if len(positions[name]) > min_papers]
+
+def sample_index_pairs(random_state, num_sources, num_targets, sample_size, unique=False):
+    """(source, target) pairs of positions in range(num_sources) x range(num_targets), drawn uniformly
+    until sample_size distinct pairs have been drawn.
+
+    the draws are those of the old loop, which drew each source and target with one random_state.choice,
+    and leave random_state where that loop left it, so a seed gives the same pairs as before.
+    all draws are returned, repeated pairs included, or with unique=True only the first draw of each pair.
+    returns two int64 arrays"""
+    if sample_size > num_sources * num_targets:
+        raise ValueError("cannot sample {} distinct pairs out of {}".format(sample_size, num_sources * num_targets))
+    keys = np.empty(0, dtype=np.int64)
+    num_distinct = 0
+    while num_distinct < sample_size:
+        # every draw adds at most one distinct pair, so drawing the number still missing never draws past the last one needed.
+        # sources and targets alternate, with the same random numbers as alternating scalar draws
+        draws = random_state.randint(0, np.tile([num_sources, num_targets], sample_size - num_distinct)).astype(np.int64)
+        keys = np.concatenate([keys, draws[0::2] * num_targets + draws[1::2]])
+        num_distinct = len(np.unique(keys))
+    if unique:
+        _, first = np.unique(keys, return_index=True)
+        keys = keys[np.sort(first)]
+    return keys // num_targets, keys % num_targets
+
 def main(args):
     df = pd.read_csv(args.input, sep=args.sep, dtype=str)
-    gb = df.groupby(args.category_colname).filter(lambda x: len(x) > args.min_papers).groupby(args.category_colname)
+    categories = get_category_indices(df, args.category_colname, args.min_papers)
+    # "arxiv_id<tab>mag_id" of every paper, extracted once
+    paper_ids = (df['arxiv_id'] + '\t' + df['mag_id']).values
     random_state = np.random.RandomState(args.seed)
-    outf = open(args.output, 'w')
-    for name1, indices1 in gb.groups.items():
-        for name2, indices2 in gb.groups.items():
-            pairs_str = "# {}{}{}".format(name1, '\t', name2)
-            outf.write(pairs_str)
-            outf.write('\n')
-            sample_pairs = set()
-            while len(sample_pairs) < args.sample_size:
-                source = random_state.choice(indices1)
-                target = random_state.choice(indices2)
-                pair = (source, target)
-                sample_pairs.add(pair)
-                outf.write('\t'.join([df.loc[source]['arxiv_id'], df.loc[source]['mag_id'], df.loc[target]['arxiv_id'], df.loc[target]['mag_id']]))
-                outf.write('\n')
-    outf.close()
+    offsets = []
+    groups = []
+    num_pairs = 0
+    pos = 0
+    with open(args.output, 'wb') as outf:
+        for name1, indices1 in categories:
+            for name2, indices2 in categories:
+                if not args.no_headers:
+                    header = "# {}{}{}\n".format(name1, '\t', name2).encode('utf8')
+                    outf.write(header)
+                    pos += len(header)
+                sources, targets = sample_index_pairs(random_state, len(indices1), len(indices2), args.sample_size, unique=args.unique)
+                lines = [(source + '\t' + target + '\n').encode('utf8') for source, target in zip(paper_ids[indices1[sources]], paper_ids[indices2[targets]])]
+                line_lengths = np.fromiter((len(line) for line in lines), dtype=np.int64, count=len(lines))
+                offsets.append(pos + np.concatenate([[0], np.cumsum(line_lengths)[:-1]]))
+                groups.append((num_pairs, num_pairs + len(lines), name1, name2))
+                num_pairs += len(lines)
+                outf.write(b''.join(lines))
+                pos += int(line_lengths.sum())
+    # written after the pairs file, so that the runners see them as up to date (see pairs_file.load_pairs_index)
+    write_offsets(np.concatenate(offsets) if offsets else [], get_offsets_fname(args.output))
+    write_groups(groups, get_groups_fname(args.output))
+    logger.info("wrote {} pairs for {} category pairs".format(num_pairs, len(groups)))
 
 if __name__ == "__main__":
     total_start = timer()
@@ -45,12 +85,14 @@ if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="get sample pairs by broad category", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
     parser.add_argument("input", help="filename for input (TSV)")
-    parser.add_argument("output", help="filename for output (TSV)")
+    parser.add_argument("output", help="filename for output (TSV with columns source_arxiv_id, source_mag_id, target_arxiv_id, target_mag_id). the category pair of each pair and the byte offset of each line are written to sidecar files (<output>.groups.tsv and <output>.offsets.npy)")
     parser.add_argument("--sep", default='\t', help="delimiter for the input file (default: tab)")
     parser.add_argument("--category-colname", default='category_broad', help="column name for the category")
     parser.add_argument("--min-papers", type=int, default=500, help="categories with fewer than this many papers will be filtered out")
     parser.add_argument("--seed", type=int, default=99, help="random seed")
-    parser.add_argument("--sample-size", type=int, default=500, help="number of sample pairs for each pair of categories")
+    parser.add_argument("--sample-size", type=int, default=500, help="number of distinct sample pairs for each pair of categories. pairs drawn more than once are written every time they are drawn, unless --unique is given")
+    parser.add_argument("--unique", action='store_true', help="write each pair only once, so that every category pair has exactly --sample-size pairs")
+    parser.add_argument("--no-headers", action='store_true', help="don't write the '# category1<tab>category2' line before the pairs of each category pair (the groups sidecar file has the category pairs)")
     parser.add_argument("--debug", action='store_true', help="output debugging info")
     global args
     args = parser.parse_args()
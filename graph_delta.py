@@ -0,0 +1,195 @@
+import numpy as np
+
+from csr_graph import CSRGraph, build_csr, _iter_data_lines
+from vertex_id_index import VertexIdIndex
+from result_store import STATUS_OK, STATUS_MISSING, STATUS_PENDING
+
+# graph delta files: the changes between two snapshots of the network, one change per line
+# (fields separated by whitespace, lines starting with % or # are comments):
+#   +v <id>            add a vertex
+#   -v <id>            remove a vertex, and all of its edges
+#   +e <id1> <id2>     add an edge (endpoints that are not in the graph yet are added as vertices)
+#   -e <id1> <id2>     remove an edge
+# ids are ids in the original network, like the vertex labels of the Pajek file.
+#
+# vertex indices stay the same when a delta is applied, so that distance indexes and earlier results stay
+# aligned with the graph: new vertices are appended (in order of increasing id), and a removed vertex keeps
+# its index but loses its edges and its id (it gets REMOVED_ID, so lookups no longer find it)
+REMOVED_ID = -1
+
+class GraphDelta(object):
+    """the changes of a graph delta file, as int64 arrays of original ids"""
+    def __init__(self, added_vertices, removed_vertices, added_edges, removed_edges):
+        self.added_vertices = added_vertices
+        self.removed_vertices = removed_vertices
+        # (num_edges, 2) arrays
+        self.added_edges = added_edges
+        self.removed_edges = removed_edges
+
+def read_graph_delta(fname):
+    changes = {'+v': [], '-v': [], '+e': [], '-e': []}
+    with open(fname, 'r') as f:
+        for line in _iter_data_lines(f):
+            if line[0] == '#':
+                continue
+            parts = line.split()
+            op = parts[0].lower()
+            if op not in changes:
+                raise ValueError("unknown change in graph delta {}: {}".format(fname, line))
+            num_ids = 1 if op[1] == 'v' else 2
+            if len(parts) != num_ids + 1:
+                raise ValueError("expected {} id(s) after {} in graph delta {}: {}".format(num_ids, op, fname, line))
+            changes[op].append([int(x) for x in parts[1:]])
+    vertices = lambda rows: np.array(rows, dtype=np.int64).reshape(-1)
+    edges = lambda rows: np.array(rows, dtype=np.int64).reshape(-1, 2)
+    return GraphDelta(vertices(changes['+v']), vertices(changes['-v']), edges(changes['+e']), edges(changes['-e']))
+
+class GraphChanges(object):
+    """what applying a GraphDelta actually changed, in vertex indices of the new graph
+    (which are the same as in the old graph for the old vertices).
+    inserted and removed edges are (num_edges, 2) arrays, each undirected edge once, and only the edges that
+    were not / were in the graph before. removed edges include those of removed vertices"""
+    def __init__(self, num_old_vertices, new_vertices, removed_vertices, inserted_edges, removed_edges, num_ignored):
+        self.num_old_vertices = num_old_vertices
+        self.new_vertices = new_vertices
+        self.removed_vertices = removed_vertices
+        self.inserted_edges = inserted_edges
+        self.removed_edges = removed_edges
+        # changes of the delta that had no effect (edges already there or not there, unknown ids)
+        self.num_ignored = num_ignored
+
+    def insertions_only(self):
+        """True if the delta only added vertices and edges (so distances can only get shorter)"""
+        return len(self.removed_edges) == 0 and len(self.removed_vertices) == 0
+
+    def summary(self):
+        return "{} new vertices, {} removed vertices, {} inserted edges, {} removed edges ({} changes had no effect)".format(
+            len(self.new_vertices), len(self.removed_vertices), len(self.inserted_edges), len(self.removed_edges), self.num_ignored)
+
+def _edge_keys(edges, num_vertices):
+    """one int64 key per undirected edge (smaller endpoint first)"""
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    low = np.minimum(edges[:, 0], edges[:, 1])
+    high = np.maximum(edges[:, 0], edges[:, 1])
+    return low * num_vertices + high
+
+def _keys_to_edges(keys, num_vertices):
+    return np.column_stack([keys // num_vertices, keys % num_vertices])
+
+def apply_graph_delta(G, delta):
+    """apply a GraphDelta to the CSRGraph G (with ids). returns (the new CSRGraph, GraphChanges).
+    the new graph's arrays are in memory; save it with csr_graph.save_csr_graph"""
+    if G.ids is None:
+        raise ValueError("graph deltas refer to original ids, but the graph has none")
+    if G.offsets is None:
+        raise ValueError("graph deltas are applied to the CSR arrays; use the CSR file the compressed graph was made from")
+    id_index = G.id_index if G.id_index is not None else VertexIdIndex.from_ids(G.ids)
+    num_ignored = 0
+
+    # new vertices, appended in order of increasing id
+    endpoint_ids = np.concatenate([delta.added_vertices, delta.added_edges.reshape(-1)])
+    candidates = np.unique(endpoint_ids)
+    new_ids = candidates[id_index.lookup_many(candidates) < 0]
+    num_ignored += len(delta.added_vertices) - int(np.isin(delta.added_vertices, new_ids).sum())
+    n_old = G.num_vertices
+    n = n_old + len(new_ids)
+    ids = np.concatenate([np.asarray(G.ids, dtype=np.int64), new_ids])
+    new_id_index = VertexIdIndex.from_ids(ids)
+
+    removed_vertices = id_index.lookup_many(delta.removed_vertices)
+    num_ignored += int((removed_vertices < 0).sum())
+    removed_vertices = np.unique(removed_vertices[removed_vertices >= 0])
+
+    # existing edges as keys, each undirected edge once
+    sources = np.repeat(np.arange(n_old, dtype=np.int64), np.diff(G.offsets))
+    targets = np.asarray(G.neighbors, dtype=np.int64)
+    once = sources < targets
+    old_keys = sources[once] * n + targets[once]
+    del sources, targets, once
+
+    # removed edges: the listed ones and all edges of removed vertices
+    removed = new_id_index.lookup_many(delta.removed_edges.reshape(-1)).reshape(-1, 2)
+    known = (removed >= 0).all(axis=1)
+    listed_keys = np.unique(_edge_keys(removed[known], n))
+    num_ignored += int((~known).sum()) + int((~np.isin(listed_keys, old_keys)).sum())
+    removed_keys = listed_keys
+    if len(removed_vertices):
+        nbrs, segments = G.expand(removed_vertices, return_segments=True)
+        removed_keys = np.concatenate([removed_keys, _edge_keys(np.column_stack([removed_vertices[segments], nbrs]), n)])
+    removed_keys = np.unique(removed_keys)
+    removed_keys = removed_keys[np.isin(removed_keys, old_keys)]
+
+    # inserted edges: the ones not in the graph already (self-loops never change a distance)
+    added = new_id_index.lookup_many(delta.added_edges.reshape(-1)).reshape(-1, 2)
+    added = added[added[:, 0] != added[:, 1]]
+    added_keys = np.unique(_edge_keys(added, n))
+    added_keys = added_keys[~np.isin(added_keys, old_keys)]
+    # an edge to a removed vertex is not added back
+    if len(removed_vertices):
+        added_edges = _keys_to_edges(added_keys, n)
+        added_keys = added_keys[~np.isin(added_edges, removed_vertices).any(axis=1)]
+    num_ignored += len(delta.added_edges) - len(added_keys)
+
+    keys = np.concatenate([old_keys[~np.isin(old_keys, removed_keys)], added_keys])
+    edges = _keys_to_edges(keys, n)
+    offsets, neighbors = build_csr(edges[:, 0], edges[:, 1], n)
+    ids[removed_vertices] = REMOVED_ID
+    G_new = CSRGraph(offsets, neighbors, ids=ids, id_index=VertexIdIndex.from_ids(ids))
+    changes = GraphChanges(n_old, np.arange(n_old, n, dtype=np.int64), removed_vertices,
+                           _keys_to_edges(added_keys, n), _keys_to_edges(removed_keys, n), num_ignored)
+    return G_new, changes
+
+def distances_to_nearest(G, roots):
+    """BFS distances in the CSRGraph G from the nearest of the vertices `roots`, as a float64 array (inf if unreachable)"""
+    dist = np.full(G.num_vertices, np.inf)
+    frontier = np.unique(np.asarray(roots, dtype=np.int64))
+    level = 0
+    dist[frontier] = 0
+    while len(frontier):
+        nbrs = G.expand(frontier)
+        frontier = np.unique(nbrs[np.isinf(dist[nbrs])])
+        level += 1
+        dist[frontier] = level
+    return dist
+
+def find_affected_pairs(G_old, changes, source_vertices, target_vertices, records, max_exact_removals=32):
+    """the result records (RESULT_DTYPE, of the old graph) whose lengths may be different in the new graph.
+    source_vertices and target_vertices are the vertex indices of the pairs in the new graph (-1 if not in it).
+
+    if a pair gets closer, a new shortest path uses inserted edges: its part before the first one and its part after
+    the last one are paths of the old graph, so the new length is at least d(s, X) + 1 + d(X, t), with X the endpoints
+    of the inserted edges. if a pair gets farther apart, each of its old shortest paths used a removed edge, so the old
+    length is at least d(s, Y) + 1 + d(Y, t), with Y the endpoints of the removed edges. pairs for which neither bound
+    allows a change keep their length. the distances to X and Y come from one multi-source BFS each on the old graph.
+    with at most max_exact_removals removed edges, the test for them is exact instead: a pair is affected only if
+    d(s, a) + 1 + d(b, t) is its old length for some removed edge (a, b), with two BFSs per removed edge.
+    returns a boolean mask over the records (pending records are never affected)"""
+    status = records['status']
+    old_length = np.where(status == STATUS_OK, records['length'], np.inf).astype(np.float64)
+    affected = np.zeros(len(records), dtype=bool)
+    done = status != STATUS_PENDING
+    n_old = changes.num_old_vertices
+    in_old = (source_vertices >= 0) & (source_vertices < n_old) & (target_vertices >= 0) & (target_vertices < n_old)
+    # the pair's ids are in the new graph but were not in the old one, or the other way round
+    in_new = (source_vertices >= 0) & (target_vertices >= 0)
+    affected |= done & ( (status == STATUS_MISSING) != ~in_new )
+    check = done & in_old & in_new & (status != STATUS_MISSING)
+    s = source_vertices[check]
+    t = target_vertices[check]
+    if len(changes.inserted_edges):
+        # (inserted edges between new vertices cannot be the first or last of a path between old vertices,
+        # and the BFS is on the old graph, so only old endpoints count)
+        endpoints = changes.inserted_edges.reshape(-1)
+        dist = distances_to_nearest(G_old, endpoints[endpoints < n_old])
+        affected[np.flatnonzero(check)[dist[s] + 1 + dist[t] < old_length[check]]] = True
+    if len(changes.removed_edges) > max_exact_removals:
+        dist = distances_to_nearest(G_old, changes.removed_edges.reshape(-1))
+        affected[np.flatnonzero(check)[dist[s] + 1 + dist[t] <= old_length[check]]] = True
+    elif len(changes.removed_edges):
+        on_shortest_path = np.zeros(len(s), dtype=bool)
+        for a, b in changes.removed_edges.tolist():
+            dist_a = distances_to_nearest(G_old, [a])
+            dist_b = distances_to_nearest(G_old, [b])
+            on_shortest_path |= (dist_a[s] + 1 + dist_b[t] == old_length[check]) | (dist_b[s] + 1 + dist_a[t] == old_length[check])
+        affected[np.flatnonzero(check)[on_shortest_path]] = True
+    return affected
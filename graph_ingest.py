@@ -0,0 +1,316 @@
+import os, shutil, tempfile
+from multiprocessing import Pool
+import numpy as np
+
+from csr_graph import CSR_MAGIC, CSR_VERSION, offsets_dtype, write_sections, _padding, _iter_data_lines
+from vertex_id_index import VertexIdIndex
+
+# parallel, bounded-memory conversion of large Pajek files and edge lists to the binary CSR format.
+#
+# 1. the file is split into byte ranges that start at line boundaries, and a pool of processes parses
+#    the ranges into integer arrays.
+# 2. vertices are relabeled to dense indices: Pajek vertex numbers are already dense (number - 1), and
+#    the original ids of an edge list are numbered in increasing order (like csr_graph.read_edgelist).
+# 3. every edge, in both directions, becomes a key source * num_vertices + target, and the keys are
+#    distributed over buckets of consecutive source vertices, stored in temporary files.
+# 4. each bucket is sorted and deduplicated in memory on its own (an external distribution sort),
+#    and its neighbors are appended to the output. only one bucket is in memory at a time.
+# the CSR file is the same, byte for byte, as the one convert_to_csr_file writes.
+
+EDGE_SECTIONS = ('*arcs', '*edges')
+LIST_SECTIONS = ('*arcslist', '*edgeslist')
+
+def find_pajek_sections(fname, block_size=1 << 24):
+    """the sections of a Pajek file, without parsing its data lines: [(name, header line, data start, data end)],
+    with lowercase names and byte positions"""
+    headers = []
+    with open(fname, 'rb') as f:
+        pos = 0
+        # a header line starts the file or follows a newline
+        prev = b'\n'
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            data = prev + block
+            i = data.find(b'\n*')
+            while i >= 0:
+                headers.append(pos - len(prev) + i + 1)
+                i = data.find(b'\n*', i + 1)
+            prev = block[-1:]
+            pos += len(block)
+        size = pos
+        sections = []
+        for k, header_pos in enumerate(headers):
+            f.seek(header_pos)
+            line = f.readline()
+            end = headers[k + 1] if k + 1 < len(headers) else size
+            sections.append((line.split()[0].decode('utf8').lower(), line.decode('utf8').strip(), header_pos + len(line), end))
+    return sections
+
+def split_byte_range(fname, start, end, chunk_bytes):
+    """split [start, end) of a file into ranges of about chunk_bytes that begin and end at line boundaries"""
+    boundaries = [start]
+    with open(fname, 'rb') as f:
+        while boundaries[-1] + chunk_bytes < end:
+            f.seek(boundaries[-1] + chunk_bytes)
+            f.readline()
+            if f.tell() >= end:
+                break
+            boundaries.append(f.tell())
+    boundaries.append(end)
+    return [(boundaries[k], boundaries[k + 1]) for k in range(len(boundaries) - 1)]
+
+def _read_range(fname, start, end):
+    with open(fname, 'rb') as f:
+        f.seek(start)
+        return f.read(end - start)
+
+def _parse_ints(data):
+    """all integers of `data` in one numpy call (the fast path), or None if it holds anything else
+    (comments, quoted labels, weights)"""
+    if b'%' in data or b'#' in data or b'"' in data:
+        return None
+    try:
+        return np.fromstring(data, dtype=np.int64, sep=' ')
+    except ValueError:
+        return None
+
+def _count_lines(data):
+    return data.count(b'\n') + (0 if data.endswith(b'\n') or not data else 1)
+
+def _parse_int_rows(data, num_columns):
+    """the integers of `data`, one row per line, if every line has exactly num_columns of them. None otherwise"""
+    values = _parse_ints(data)
+    if values is None or len(values) != _count_lines(data) * num_columns:
+        return None
+    return values.reshape(-1, num_columns)
+
+def parse_vertices(data):
+    """(vertex numbers, labels) of the lines of a *Vertices section. a vertex without a label gets its
+    number as the label, as in csr_graph.read_pajek_edges"""
+    values = _parse_ints(data.replace(b'"', b' '))
+    if values is not None:
+        num_lines = _count_lines(data)
+        if len(values) == 2 * num_lines:
+            return values[0::2], values[1::2]
+        if len(values) == num_lines:
+            return values, values
+    numbers = []
+    labels = []
+    for line in _iter_data_lines(data.decode('utf8').splitlines()):
+        parts = line.split(None, 1)
+        label = parts[0]
+        if len(parts) > 1:
+            label = parts[1]
+            if label[0] == '"':
+                label = label[1:label.index('"', 1)]
+            else:
+                label = label.split()[0]
+        numbers.append(int(parts[0]))
+        labels.append(int(label))
+    return np.array(numbers, dtype=np.int64), np.array(labels, dtype=np.int64)
+
+def parse_edges(data, section):
+    """(sources, targets) of the lines of an edge section, as written in the file (Pajek numbers or original ids).
+    extra columns (weights) are ignored"""
+    if section in LIST_SECTIONS:
+        sources = []
+        targets = []
+        for line in _iter_data_lines(data.decode('utf8').splitlines()):
+            parts = line.split()
+            for other in parts[1:]:
+                sources.append(int(parts[0]))
+                targets.append(int(other))
+        return np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64)
+    rows = _parse_int_rows(data, 2)
+    if rows is not None:
+        return rows[:, 0], rows[:, 1]
+    sources = []
+    targets = []
+    for line in _iter_data_lines(data.decode('utf8').splitlines()):
+        if line[0] in '#*':
+            continue
+        parts = line.split()
+        sources.append(int(parts[0]))
+        targets.append(int(parts[1]))
+    return np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64)
+
+def _sorted_unique(keys):
+    """np.unique of an int64 array, by sorting it in place (np.unique may take a slower hashing path)"""
+    keys.sort()
+    if len(keys) == 0:
+        return keys
+    keep = np.empty(len(keys), dtype=bool)
+    keep[0] = True
+    np.not_equal(keys[1:], keys[:-1], out=keep[1:])
+    return keys[keep]
+
+def get_bucket_fname(tmpdir, bucket, chunk_idx):
+    return os.path.join(tmpdir, "bucket{:05d}".format(bucket), "chunk{:06d}.npy".format(chunk_idx))
+
+def write_buckets(tmpdir, chunk_idx, sources, targets, num_vertices, bucket_bounds):
+    """distribute the keys of both directions of the edges (dense vertex indices) over the buckets.
+    self-loops are dropped. returns the number of keys written"""
+    keep = sources != targets
+    sources = sources[keep]
+    targets = targets[keep]
+    keys = np.concatenate([sources * num_vertices + targets, targets * num_vertices + sources])
+    # sorting here makes each bucket a contiguous slice, and the later merge cheaper
+    keys.sort()
+    cuts = np.searchsorted(keys, bucket_bounds * num_vertices)
+    for bucket in range(len(bucket_bounds) - 1):
+        part = keys[cuts[bucket]:cuts[bucket + 1]]
+        if len(part):
+            np.save(get_bucket_fname(tmpdir, bucket, chunk_idx), part)
+    return len(keys)
+
+def _pajek_edges_task(task):
+    """parse one byte range of a Pajek edge section and write its keys to the buckets"""
+    fname, start, end, section, chunk_idx, tmpdir, num_vertices, bucket_bounds = task
+    sources, targets = parse_edges(_read_range(fname, start, end), section)
+    if len(sources) and (min(sources.min(), targets.min()) < 1 or max(sources.max(), targets.max()) > num_vertices):
+        raise ValueError("vertex number out of range 1..{} in bytes {}-{} of {}".format(num_vertices, start, end, fname))
+    return len(sources), write_buckets(tmpdir, chunk_idx, sources - 1, targets - 1, num_vertices, bucket_bounds)
+
+def _vertices_task(task):
+    fname, start, end = task
+    return parse_vertices(_read_range(fname, start, end))
+
+def _edgelist_parse_task(task):
+    """parse one byte range of an edge list. the endpoints are kept in a temporary file for the second
+    pass, and the distinct ids are returned for numbering the vertices"""
+    fname, start, end, sep, chunk_idx, tmpdir = task
+    data = _read_range(fname, start, end)
+    if sep is not None:
+        data = data.replace(sep.encode('utf8'), b' ')
+    sources, targets = parse_edges(data, '*edges')
+    np.save(os.path.join(tmpdir, "endpoints{:06d}.npy".format(chunk_idx)), np.stack([sources, targets]))
+    return len(sources), _sorted_unique(np.concatenate([sources, targets]))
+
+def _edgelist_relabel_task(task):
+    tmpdir, chunk_idx, ids_fname, num_vertices, bucket_bounds = task
+    endpoints_fname = os.path.join(tmpdir, "endpoints{:06d}.npy".format(chunk_idx))
+    sources, targets = np.load(endpoints_fname)
+    os.remove(endpoints_fname)
+    ids = np.load(ids_fname, mmap_mode='r')
+    return write_buckets(tmpdir, chunk_idx, np.searchsorted(ids, sources), np.searchsorted(ids, targets), num_vertices, bucket_bounds)
+
+def get_bucket_bounds(num_vertices, num_keys, max_bucket_keys):
+    """vertex boundaries of buckets of consecutive source vertices, so that a bucket holds about
+    max_bucket_keys keys (if the keys are spread evenly over the vertices)"""
+    num_buckets = max(1, int(np.ceil(num_keys / float(max_bucket_keys))))
+    return np.unique(np.linspace(0, num_vertices, num_buckets + 1).astype(np.int64))
+
+def estimate_num_lines(fname, start, end, sample_bytes=1 << 20):
+    if end <= start:
+        return 0
+    sample = _read_range(fname, start, min(end, start + sample_bytes))
+    return int((end - start) * max(1, sample.count(b'\n')) / float(len(sample)))
+
+def write_csr_from_buckets(output_fname, tmpdir, ids, bucket_bounds):
+    """sort and deduplicate the keys of each bucket in turn, and write the binary CSR file
+    (the layout of csr_graph.save_csr_graph). returns the number of adjacency entries"""
+    num_vertices = len(ids)
+    counts = np.zeros(num_vertices, dtype=np.int64)
+    neighbors_fname = os.path.join(tmpdir, "neighbors.bin")
+    with open(neighbors_fname, 'wb') as neighbors_file:
+        for bucket in range(len(bucket_bounds) - 1):
+            bucket_dir = os.path.dirname(get_bucket_fname(tmpdir, bucket, 0))
+            parts = [np.load(os.path.join(bucket_dir, name)) for name in sorted(os.listdir(bucket_dir))]
+            shutil.rmtree(bucket_dir)
+            if not parts:
+                continue
+            keys = _sorted_unique(np.concatenate(parts))
+            del parts
+            counts += np.bincount(keys // num_vertices, minlength=num_vertices)
+            neighbors_file.write((keys % num_vertices).astype('<i4').tobytes())
+    num_entries = int(counts.sum())
+    offsets = np.zeros(num_vertices + 1, dtype='<i{}'.format(np.dtype(offsets_dtype(num_entries)).itemsize))
+    np.cumsum(counts, out=offsets[1:])
+    ids = np.ascontiguousarray(ids, dtype='<i8')
+    id_index = VertexIdIndex.from_ids(ids)
+    header = np.array([CSR_VERSION, num_vertices, num_entries, offsets.itemsize, 1, 0, 0, 0], dtype='<i8')
+    tmp_fname = "{}.tmp{}".format(output_fname, os.getpid())
+    with open(tmp_fname, 'wb') as outf:
+        outf.write(CSR_MAGIC)
+        outf.write(header.tobytes())
+        write_sections(outf, [offsets])
+        with open(neighbors_fname, 'rb') as neighbors_file:
+            shutil.copyfileobj(neighbors_file, outf, 1 << 24)
+        outf.write(b'\x00' * _padding(4 * num_entries))
+        write_sections(outf, [ids,
+                              np.ascontiguousarray(id_index.sorted_ids, dtype='<i8'),
+                              np.ascontiguousarray(id_index.vertex_indices, dtype='<i8')])
+    os.rename(tmp_fname, output_fname)
+    os.remove(neighbors_fname)
+    return num_entries
+
+def ingest_to_csr_file(input_fname, output_fname, input_format='pajek', sep=None, processes=4, chunk_bytes=1 << 26, memory_bytes=1 << 31, tmpdir=None, progress=None):
+    """convert a Pajek file or an edge list to a binary CSR file with a pool of processes, holding at most
+    about memory_bytes of edge keys in memory at a time (see the top of this module).
+    progress(phase, seconds) is called as each phase ends, if given.
+    returns (number of vertices, number of edge lines parsed, number of adjacency entries)"""
+    from timeit import default_timer as timer
+    # a bucket is held as its parts, their concatenation and the deduplicated copy
+    max_bucket_keys = max(1, memory_bytes // 24)
+    work_dir = tempfile.mkdtemp(prefix='ingest_', dir=tmpdir)
+    pool = Pool(processes=processes)
+    try:
+        start = timer()
+        if input_format == 'pajek':
+            sections = find_pajek_sections(input_fname)
+            vertex_sections = [s for s in sections if s[0] == '*vertices']
+            if not vertex_sections:
+                raise ValueError("no *Vertices section in {}".format(input_fname))
+            name, header, data_start, data_end = vertex_sections[0]
+            num_vertices = int(header.split()[1])
+            ids = np.arange(1, num_vertices + 1, dtype=np.int64)
+            for numbers, labels in pool.imap(_vertices_task, [(input_fname, a, b) for a, b in split_byte_range(input_fname, data_start, data_end, chunk_bytes)]):
+                ids[numbers - 1] = labels
+            edge_sections = [s for s in sections if s[0] in EDGE_SECTIONS + LIST_SECTIONS]
+            num_keys = 2 * sum(estimate_num_lines(input_fname, s[2], s[3]) for s in edge_sections)
+            bucket_bounds = get_bucket_bounds(num_vertices, num_keys, max_bucket_keys)
+            for bucket in range(len(bucket_bounds) - 1):
+                os.mkdir(os.path.dirname(get_bucket_fname(work_dir, bucket, 0)))
+            tasks = []
+            for name, header, data_start, data_end in edge_sections:
+                for a, b in split_byte_range(input_fname, data_start, data_end, chunk_bytes):
+                    tasks.append((input_fname, a, b, name, len(tasks), work_dir, num_vertices, bucket_bounds))
+            num_edges = sum(num_lines for num_lines, _ in pool.imap_unordered(_pajek_edges_task, tasks))
+            if progress is not None:
+                progress('parse', timer() - start)
+        else:
+            size = os.path.getsize(input_fname)
+            tasks = [(input_fname, a, b, sep, chunk_idx, work_dir) for chunk_idx, (a, b) in enumerate(split_byte_range(input_fname, 0, size, chunk_bytes))]
+            num_edges = 0
+            chunk_ids = []
+            for num_lines, distinct in pool.imap(_edgelist_parse_task, tasks):
+                num_edges += num_lines
+                chunk_ids.append(distinct)
+            ids = _sorted_unique(np.concatenate(chunk_ids)) if chunk_ids else np.zeros(0, dtype=np.int64)
+            del chunk_ids
+            num_vertices = len(ids)
+            if progress is not None:
+                progress('parse', timer() - start)
+            start = timer()
+            ids_fname = os.path.join(work_dir, "ids.npy")
+            np.save(ids_fname, ids)
+            bucket_bounds = get_bucket_bounds(num_vertices, 2 * num_edges, max_bucket_keys)
+            for bucket in range(len(bucket_bounds) - 1):
+                os.mkdir(os.path.dirname(get_bucket_fname(work_dir, bucket, 0)))
+            for _ in pool.imap_unordered(_edgelist_relabel_task, [(work_dir, chunk_idx, ids_fname, num_vertices, bucket_bounds) for chunk_idx in range(len(tasks))]):
+                pass
+            if progress is not None:
+                progress('relabel', timer() - start)
+        pool.close()
+        pool.join()
+
+        start = timer()
+        num_entries = write_csr_from_buckets(output_fname, work_dir, ids, bucket_bounds)
+        if progress is not None:
+            progress('sort', timer() - start)
+    finally:
+        pool.terminate()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return num_vertices, num_edges, num_entries
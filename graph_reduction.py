@@ -0,0 +1,198 @@
+import os
+import numpy as np
+
+from csr_graph import CSRGraph, build_csr, write_sections, map_section, offsets_dtype
+
+# binary reduction file layout (little-endian, sections padded to 8 bytes, see csr_graph.write_sections):
+#   magic (8 bytes)
+#   header: HEADER_FIELDS int64 values (version, num_vertices, num_core_vertices, num_core_entries, core_offsets_itemsize, 0, 0, 0)
+#   components: num_vertices int32 component label of every vertex
+#   parents: num_vertices int32 tree parent of every peeled vertex (-1 for core vertices)
+#   attachments: num_vertices int32 core vertex each vertex hangs from (itself for core vertices)
+#   depths: num_vertices int32 distance from each vertex to its attachment
+#   core_index: num_vertices int32 index of each core vertex in the core graph (-1 for peeled vertices)
+#   core_offsets: num_core_vertices + 1 integers, and core_neighbors: num_core_entries int32 (the core graph in CSR form)
+REDUCTION_MAGIC = b'SPLRED\x00\x01'
+REDUCTION_VERSION = 1
+HEADER_FIELDS = 8
+HEADER_SIZE = len(REDUCTION_MAGIC) + 8 * HEADER_FIELDS
+
+class ReducedGraph(object):
+    """a graph preprocessed for pair queries.
+
+    components[v] labels the connected component of v, so pairs in different components are
+    disconnected without any search. degree-1 trees are peeled off: a peeled vertex hangs from a
+    core vertex attachments[v] at tree depth depths[v], and `core` is the remaining graph (the 2-core,
+    plus one root for every component that is a tree), renumbered with core_index"""
+    def __init__(self, components, parents, attachments, depths, core_index, core):
+        self.components = components
+        self.parents = parents
+        self.attachments = attachments
+        self.depths = depths
+        self.core_index = core_index
+        self.core = core
+        self.num_vertices = len(components)
+
+    def tree_distance(self, u, v):
+        """distance between two vertices hanging from the same attachment vertex. the shortest path
+        stays inside their tree, so it goes through their lowest common ancestor"""
+        du = int(self.depths[u])
+        dv = int(self.depths[v])
+        a, b = u, v
+        for _ in range(du - dv):
+            a = int(self.parents[a])
+        for _ in range(dv - du):
+            b = int(self.parents[b])
+        lca_depth = min(du, dv)
+        while a != b:
+            a = int(self.parents[a])
+            b = int(self.parents[b])
+            lca_depth -= 1
+        return du + dv - 2 * lca_depth
+
+    def shortest_path_lengths(self, source_vertices, target_vertices, core_lengths):
+        """lengths for a batch of pairs of vertex indices. pairs with a negative vertex index get None.
+
+        core_lengths(core, core_sources, core_targets) computes the lengths between the attachment
+        vertices on the core graph (e.g. with one of the traversal backends)"""
+        sp_lengths = [None] * len(source_vertices)
+        core_positions = []
+        core_sources = []
+        core_targets = []
+        for pos, (u, v) in enumerate(zip(source_vertices, target_vertices)):
+            if u < 0 or v < 0:
+                continue
+            if self.components[u] != self.components[v]:
+                sp_lengths[pos] = float('inf')
+                continue
+            attachment_u = self.attachments[u]
+            attachment_v = self.attachments[v]
+            if attachment_u == attachment_v:
+                sp_lengths[pos] = self.tree_distance(int(u), int(v))
+                continue
+            core_positions.append(pos)
+            core_sources.append(int(self.core_index[attachment_u]))
+            core_targets.append(int(self.core_index[attachment_v]))
+        if core_positions:
+            for pos, core_length in zip(core_positions, core_lengths(self.core, core_sources, core_targets)):
+                sp_lengths[pos] = core_length + int(self.depths[source_vertices[pos]]) + int(self.depths[target_vertices[pos]])
+        return sp_lengths
+
+    def save(self, fname):
+        core_offsets_itemsize = np.dtype(offsets_dtype(self.core.num_adjacency_entries())).itemsize
+        header = np.array([REDUCTION_VERSION, self.num_vertices, self.core.num_vertices, self.core.num_adjacency_entries(), core_offsets_itemsize, 0, 0, 0], dtype='<i8')
+        tmp_fname = "{}.tmp{}".format(fname, os.getpid())
+        with open(tmp_fname, 'wb') as outf:
+            outf.write(REDUCTION_MAGIC)
+            outf.write(header.tobytes())
+            write_sections(outf, [np.ascontiguousarray(arr, dtype='<i4') for arr in (self.components, self.parents, self.attachments, self.depths, self.core_index)] +
+                                 [np.ascontiguousarray(self.core.offsets, dtype='<i{}'.format(core_offsets_itemsize)),
+                                  np.ascontiguousarray(self.core.neighbors, dtype='<i4')])
+        os.rename(tmp_fname, fname)
+
+def is_reduction_file(fname):
+    with open(fname, 'rb') as f:
+        return f.read(len(REDUCTION_MAGIC)) == REDUCTION_MAGIC
+
+def load_reduced_graph(fname):
+    """memory-map a reduction file written by ReducedGraph.save"""
+    with open(fname, 'rb') as f:
+        if f.read(len(REDUCTION_MAGIC)) != REDUCTION_MAGIC:
+            raise ValueError("{} is not a graph reduction file".format(fname))
+        header = np.frombuffer(f.read(8 * HEADER_FIELDS), dtype='<i8')
+    version, num_vertices, num_core_vertices, num_core_entries, core_offsets_itemsize = [int(x) for x in header[:5]]
+    if version != REDUCTION_VERSION:
+        raise ValueError("unsupported graph reduction file version: {}".format(version))
+    pos = HEADER_SIZE
+    arrays = []
+    for _ in range(5):
+        arr, pos = map_section(fname, '<i4', num_vertices, pos)
+        arrays.append(arr)
+    core_offsets, pos = map_section(fname, '<i{}'.format(core_offsets_itemsize), num_core_vertices + 1, pos)
+    core_neighbors, pos = map_section(fname, '<i4', num_core_entries, pos)
+    components, parents, attachments, depths, core_index = arrays
+    return ReducedGraph(components, parents, attachments, depths, core_index, CSRGraph(core_offsets, core_neighbors))
+
+def connected_components(G):
+    """component label (0, 1, ...) of every vertex of the CSRGraph G.
+
+    min-label propagation with pointer jumping: every round, each vertex takes the smallest label
+    among itself and its neighbors, then follows labels to their own labels until they settle"""
+    if G.offsets is None:
+        raise ValueError("component labels need the CSR arrays; use the CSR file the compressed graph was made from")
+    n = G.num_vertices
+    labels = np.arange(n, dtype=np.int64)
+    degrees = G.degrees()
+    has_neighbors = degrees > 0
+    # np.minimum.reduceat needs non-empty segments
+    segment_starts = np.asarray(G.offsets[:-1])[has_neighbors].astype(np.int64)
+    neighbors = np.asarray(G.neighbors)
+    while True:
+        new_labels = labels.copy()
+        if len(segment_starts):
+            neighbor_min = np.minimum.reduceat(labels[neighbors], segment_starts)
+            new_labels[has_neighbors] = np.minimum(labels[has_neighbors], neighbor_min)
+        while True:
+            jumped = new_labels[new_labels]
+            if np.array_equal(jumped, new_labels):
+                break
+            new_labels = jumped
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+    return np.unique(labels, return_inverse=True)[1].astype(np.int32)
+
+def peel_trees(G):
+    """repeatedly remove degree-1 vertices until none are left.
+
+    returns (parents, rounds): parents[v] is the neighbor a removed vertex was attached to
+    when it was removed (-1 if never removed), and rounds is the list of arrays of vertices
+    removed in each round. for a component that is a tree, its smallest vertex is kept as root"""
+    n = G.num_vertices
+    degrees = G.degrees().astype(np.int64)
+    alive = np.ones(n, dtype=bool)
+    parents = np.full(n, -1, dtype=np.int64)
+    rounds = []
+    candidates = np.flatnonzero(degrees == 1)
+    while len(candidates):
+        nbrs, segments = G.expand(candidates, return_segments=True)
+        alive_nbr = alive[nbrs]
+        # each candidate has exactly one neighbor left
+        candidate_parents = np.empty(len(candidates), dtype=np.int64)
+        candidate_parents[segments[alive_nbr]] = nbrs[alive_nbr]
+        # when both ends of an edge have degree 1, only remove the larger one
+        is_candidate = np.zeros(n, dtype=bool)
+        is_candidate[candidates] = True
+        remove = ~( is_candidate[candidate_parents] & (candidates < candidate_parents) )
+        removed = candidates[remove]
+        removed_parents = candidate_parents[remove]
+        alive[removed] = False
+        degrees[removed] = 0
+        parents[removed] = removed_parents
+        degrees -= np.bincount(removed_parents, minlength=n)
+        rounds.append(removed)
+        touched = np.unique(removed_parents)
+        candidates = touched[alive[touched] & (degrees[touched] == 1)]
+    return parents, rounds
+
+def reduce_graph(G):
+    """label components and peel degree-1 trees off the CSRGraph G. returns a ReducedGraph"""
+    n = G.num_vertices
+    components = connected_components(G)
+    parents, rounds = peel_trees(G)
+    attachments = np.arange(n, dtype=np.int64)
+    depths = np.zeros(n, dtype=np.int64)
+    # vertices removed later are closer to the core, so resolve them first
+    for removed in reversed(rounds):
+        attachments[removed] = attachments[parents[removed]]
+        depths[removed] = depths[parents[removed]] + 1
+    is_core = parents < 0
+    core_vertices = np.flatnonzero(is_core)
+    core_index = np.full(n, -1, dtype=np.int64)
+    core_index[core_vertices] = np.arange(len(core_vertices))
+    # edges between two core vertices, in core numbering
+    sources = np.repeat(np.arange(n, dtype=np.int64), G.degrees().astype(np.int64))
+    targets = np.asarray(G.neighbors).astype(np.int64)
+    keep = is_core[sources] & is_core[targets] & (sources < targets)
+    core_offsets, core_neighbors = build_csr(core_index[sources[keep]], core_index[targets[keep]], len(core_vertices))
+    return ReducedGraph(components, parents, attachments, depths, core_index, CSRGraph(core_offsets, core_neighbors))
@@ -0,0 +1,201 @@
+import os
+import multiprocessing
+import numpy as np
+
+from csr_graph import write_sections, map_section
+from bidirectional_bfs import SearchSide
+
+# binary landmark file layout (little-endian, sections padded to 8 bytes, see csr_graph.write_sections):
+#   magic (8 bytes)
+#   header: HEADER_FIELDS int64 values (version, num_vertices, num_landmarks, 0, 0, 0, 0, 0)
+#   landmarks: num_landmarks int32 vertex indices
+#   dists: num_vertices * num_landmarks uint8, vertex-major (the distances of one vertex to all landmarks are adjacent)
+LANDMARKS_MAGIC = b'SPLLMK\x00\x01'
+LANDMARKS_VERSION = 1
+HEADER_FIELDS = 8
+HEADER_SIZE = len(LANDMARKS_MAGIC) + 8 * HEADER_FIELDS
+# distance stored for vertices a landmark cannot reach
+UNREACHABLE = np.iinfo(np.uint8).max
+
+class LandmarkIndex(object):
+    """BFS distances from a few landmark vertices to every vertex.
+
+    by the triangle inequality, for every landmark l:
+        |d(l, u) - d(l, v)| <= d(u, v) <= d(l, u) + d(l, v)
+    so the distance vectors give a lower and an upper bound for any pair.
+    num_queries and num_resolved count how many pairs went through bounds() / were settled by the bounds alone"""
+    def __init__(self, landmarks, dists):
+        self.landmarks = landmarks
+        self.dists = dists
+        self.num_vertices, self.num_landmarks = dists.shape
+        self.num_queries = 0
+        self.num_resolved = 0
+
+    def size_in_bytes(self):
+        return self.landmarks.nbytes + self.dists.nbytes
+
+    def bounds(self, source_vertices, target_vertices):
+        """lower and upper bounds (float arrays, may be inf) on the shortest path length of each pair of vertex indices.
+        if exactly one endpoint is reachable from some landmark, the pair is disconnected and both bounds are inf"""
+        source_vertices = np.asarray(source_vertices, dtype=np.int64)
+        target_vertices = np.asarray(target_vertices, dtype=np.int64)
+        dists_source = self.dists[source_vertices].astype(np.int32)
+        dists_target = self.dists[target_vertices].astype(np.int32)
+        reached_source = dists_source != UNREACHABLE
+        reached_target = dists_target != UNREACHABLE
+        both = reached_source & reached_target
+        # (with no landmark reaching both endpoints, these reduce to 0 and inf)
+        lower = np.zeros(len(source_vertices), dtype=np.float64)
+        upper = np.full(len(source_vertices), np.inf)
+        if self.num_landmarks > 0:
+            lower = np.where(both, np.abs(dists_source - dists_target), 0).max(axis=1).astype(np.float64)
+            upper = np.where(both, dists_source + dists_target, np.iinfo(np.int32).max).min(axis=1).astype(np.float64)
+            upper[~both.any(axis=1)] = np.inf
+        # distinct vertices are at least one step apart
+        distinct = source_vertices != target_vertices
+        lower[distinct] = np.maximum(lower[distinct], 1)
+        lower[~distinct] = 0
+        upper[~distinct] = 0
+        disconnected = (reached_source ^ reached_target).any(axis=1) & distinct
+        lower[disconnected] = np.inf
+        upper[disconnected] = np.inf
+        self.num_queries += len(source_vertices)
+        self.num_resolved += int((lower == upper).sum())
+        return lower, upper
+
+    def save(self, fname):
+        header = np.array([LANDMARKS_VERSION, self.num_vertices, self.num_landmarks, 0, 0, 0, 0, 0], dtype='<i8')
+        tmp_fname = "{}.tmp{}".format(fname, os.getpid())
+        with open(tmp_fname, 'wb') as outf:
+            outf.write(LANDMARKS_MAGIC)
+            outf.write(header.tobytes())
+            write_sections(outf, [np.ascontiguousarray(self.landmarks, dtype='<i4'),
+                                  np.ascontiguousarray(self.dists, dtype=np.uint8)])
+        os.rename(tmp_fname, fname)
+
+def is_landmarks_file(fname):
+    with open(fname, 'rb') as f:
+        return f.read(len(LANDMARKS_MAGIC)) == LANDMARKS_MAGIC
+
+def load_landmarks(fname):
+    """memory-map a landmark file written by LandmarkIndex.save"""
+    with open(fname, 'rb') as f:
+        if f.read(len(LANDMARKS_MAGIC)) != LANDMARKS_MAGIC:
+            raise ValueError("{} is not a landmark file".format(fname))
+        header = np.frombuffer(f.read(8 * HEADER_FIELDS), dtype='<i8')
+    version, num_vertices, num_landmarks = [int(x) for x in header[:3]]
+    if version != LANDMARKS_VERSION:
+        raise ValueError("unsupported landmark file version: {}".format(version))
+    pos = HEADER_SIZE
+    landmarks, pos = map_section(fname, '<i4', num_landmarks, pos)
+    dists, pos = map_section(fname, np.uint8, num_vertices * num_landmarks, pos)
+    return LandmarkIndex(landmarks, dists.reshape(num_vertices, num_landmarks))
+
+def bfs_distances(G, root):
+    """full BFS from root on the CSRGraph G. returns a uint8 array of distances (UNREACHABLE if not reachable)"""
+    dist, _ = G.get_workspace()
+    dist[root] = 0
+    try:
+        search = SearchSide(G, dist, root)
+        while len(search.step()) > 0:
+            pass
+        if search.level - 1 >= UNREACHABLE:
+            raise ValueError("distance {} from landmark {} does not fit in uint8".format(search.level - 1, root))
+        out = np.where(dist >= 0, dist, UNREACHABLE).astype(np.uint8)
+    finally:
+        dist.fill(-1)
+    return out
+
+def select_landmarks_by_degree(G, num_landmarks):
+    return np.argsort(-G.degrees().astype(np.int64), kind='mergesort')[:num_landmarks]
+
+def select_landmarks_farthest_first(G, num_landmarks):
+    """start from the highest-degree vertex, then repeatedly add the vertex farthest from all chosen landmarks
+    (vertices no landmark reaches yet count as farthest, so every large component gets a landmark).
+    returns (landmarks, their distance vectors), since the BFSs are done anyway"""
+    landmarks = []
+    dist_vectors = []
+    closest = np.full(G.num_vertices, np.iinfo(np.int32).max, dtype=np.int64)
+    degrees = G.degrees().astype(np.int64)
+    candidate = int(np.argmax(degrees))
+    while len(landmarks) < min(num_landmarks, G.num_vertices):
+        landmarks.append(candidate)
+        dists = bfs_distances(G, candidate)
+        dist_vectors.append(dists)
+        reached = dists != UNREACHABLE
+        closest[reached] = np.minimum(closest[reached], dists[reached])
+        # farthest vertex, preferring high degree among ties
+        score = closest * (degrees.max() + 1) + degrees
+        score[np.asarray(landmarks)] = -1
+        candidate = int(np.argmax(score))
+    return np.array(landmarks, dtype=np.int64), dist_vectors
+
+# graph inherited by forked workers (see build_landmark_index)
+_build_graph = None
+
+def _bfs_distances_worker(root):
+    return bfs_distances(_build_graph, root)
+
+def build_landmark_index(G, num_landmarks, strategy='degree', processes=1):
+    """BFS distance vectors from num_landmarks landmarks chosen by `strategy` ('degree' or 'farthest').
+    with 'degree', the BFSs are independent and run on `processes` processes"""
+    global _build_graph
+    if strategy == 'farthest':
+        landmarks, dist_vectors = select_landmarks_farthest_first(G, num_landmarks)
+    elif strategy == 'degree':
+        landmarks = select_landmarks_by_degree(G, num_landmarks)
+        if processes > 1:
+            _build_graph = G
+            pool = multiprocessing.get_context('fork').Pool(processes=processes)
+            try:
+                dist_vectors = pool.map(_bfs_distances_worker, [int(l) for l in landmarks])
+            finally:
+                pool.close()
+                pool.join()
+                _build_graph = None
+        else:
+            dist_vectors = [bfs_distances(G, int(l)) for l in landmarks]
+    else:
+        raise ValueError("unknown landmark selection strategy: {}".format(strategy))
+    if len(dist_vectors) == 0:
+        dists = np.zeros((G.num_vertices, 0), dtype=np.uint8)
+    else:
+        dists = np.ascontiguousarray(np.column_stack(dist_vectors))
+    return LandmarkIndex(np.asarray(landmarks, dtype=np.int32), dists)
+
+def _propagate_decreases(G, dist, changed):
+    """after some entries of dist (BFS distances from one root, int64 with inf as a large value) were lowered,
+    lower the distances of every vertex they lead to. changed are the vertices that were lowered.
+    the vertices are settled in order of distance, as in Dijkstra's algorithm with unit weights"""
+    while len(changed):
+        level = dist[changed].min()
+        at_level = dist[changed] == level
+        nbrs = G.expand(changed[at_level])
+        improved = np.unique(nbrs[dist[nbrs] > level + 1])
+        dist[improved] = level + 1
+        changed = np.union1d(changed[~at_level], improved)
+
+def insert_edges(index, G, inserted_edges):
+    """update a LandmarkIndex for edges inserted into the graph (and vertices appended to it).
+    G is the CSRGraph after the insertions, and inserted_edges a (num_edges, 2) array of its vertex indices.
+    distances can only get shorter, so each landmark's distances are lowered starting at the endpoints of the
+    new edges, and only the vertices whose distance changes are visited. returns a new LandmarkIndex"""
+    n_old = index.num_vertices
+    infinite = np.iinfo(np.int64).max // 2
+    dists = np.full((G.num_vertices, index.num_landmarks), UNREACHABLE, dtype=np.uint8)
+    dists[:n_old] = index.dists
+    a = np.concatenate([inserted_edges[:, 0], inserted_edges[:, 1]]).astype(np.int64)
+    b = np.concatenate([inserted_edges[:, 1], inserted_edges[:, 0]]).astype(np.int64)
+    for k in range(index.num_landmarks):
+        dist = dists[:, k].astype(np.int64)
+        dist[dist == UNREACHABLE] = infinite
+        # (the new edges are processed together: a decrease at one endpoint is propagated over the other new edges too)
+        candidate = dist[a] + 1
+        lower = candidate < dist[b]
+        np.minimum.at(dist, b[lower], candidate[lower])
+        _propagate_decreases(G, dist, np.unique(b[lower]))
+        reached = dist < infinite
+        if reached.any() and dist[reached].max() >= UNREACHABLE:
+            raise ValueError("distance {} from landmark {} does not fit in uint8".format(dist[reached].max(), index.landmarks[k]))
+        dists[:, k] = np.where(reached, dist, UNREACHABLE)
+    return LandmarkIndex(np.asarray(index.landmarks, dtype=np.int32), dists)
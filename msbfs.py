@@ -0,0 +1,130 @@
+import numpy as np
+
+from batch_bfs import group_pairs_by_endpoint
+
+# number of BFS sources advanced together in one sweep over the adjacency (a multiple of 64)
+DEFAULT_WIDTH = 64
+
+def _slot_bits(slots):
+    """(word index, bit mask) of each source slot in the per-vertex bitsets"""
+    slots = np.asarray(slots, dtype=np.int64)
+    return slots // 64, np.left_shift(np.uint64(1), (slots % 64).astype(np.uint64))
+
+def popcount_rows(bits):
+    """number of set bits in each row of a 2-d uint64 array"""
+    bits = np.ascontiguousarray(bits)
+    return np.unpackbits(bits.view(np.uint8), axis=1).sum(axis=1, dtype=np.int64)
+
+def msbfs_levels(G, roots, root_slots=None):
+    """multi-source BFS (MS-BFS) from all of `roots` at once on the CSRGraph G.
+
+    every vertex carries a bitset with one bit per slot (numpy uint64 words), so each level
+    is a single pass over the neighbors of the frontier, shared by all roots.
+    root_slots[i] is the slot (bit) of roots[i] (by default, its position in roots).
+    roots that share a slot act as one BFS from all of them (distances to the nearest one).
+    yields (level, frontier, frontier_bits, seen) for level 0 (the roots) and every further level:
+    the vertices first reached by some slot at this level, the bits of the slots that reached them,
+    and the bits of all slots that have reached each vertex so far.
+    seen is the graph's bitset workspace (see CSRGraph.get_bitset_workspace): it is only valid until
+    the next level, and its rows are cleared once the sweep ends (or the generator is closed)"""
+    roots = np.asarray(roots, dtype=np.int64)
+    if root_slots is None:
+        root_slots = np.arange(len(roots))
+    root_slots = np.asarray(root_slots, dtype=np.int64)
+    num_words = (int(root_slots.max()) + 1 + 63) // 64 if len(root_slots) else 1
+    seen = G.get_bitset_workspace(num_words)
+    root_words, root_masks = _slot_bits(root_slots)
+    # roots may repeat, so OR the bits in with ufunc.at instead of fancy assignment
+    np.bitwise_or.at(seen, (roots, root_words), root_masks)
+    frontier = np.unique(roots)
+    frontier_bits = seen[frontier]
+    # every vertex that gets a bit is in exactly one frontier
+    touched = [frontier]
+
+    try:
+        level = 0
+        while len(frontier) > 0:
+            yield level, frontier, frontier_bits, seen
+            nbrs, segments = G.expand(frontier, return_segments=True)
+            if len(nbrs) == 0:
+                break
+            # OR together the bitsets arriving at each neighbor
+            order = np.argsort(nbrs, kind='mergesort')
+            nbrs = nbrs[order]
+            incoming = frontier_bits[segments[order]]
+            starts = np.flatnonzero(np.concatenate([[True], nbrs[1:] != nbrs[:-1]]))
+            candidates = nbrs[starts].astype(np.int64)
+            incoming = np.bitwise_or.reduceat(incoming, starts, axis=0)
+            # only the roots that had not reached a vertex yet carry on from it
+            new_bits = incoming & ~seen[candidates]
+            keep = new_bits.any(axis=1)
+            frontier = candidates[keep]
+            frontier_bits = new_bits[keep]
+            seen[frontier] |= frontier_bits
+            touched.append(frontier)
+            level += 1
+    finally:
+        # reset only the rows this sweep set, for the next sweep on the graph
+        seen[np.concatenate(touched)] = 0
+
+def msbfs_sweep(G, roots, pair_slots, pair_targets):
+    """MS-BFS from all of `roots` at once (see msbfs_levels).
+    pair_slots[i] is a position in roots, and pair_targets[i] is a vertex whose distance from
+    that root is wanted. the sweep stops once all of them are reached.
+    returns an int64 array of lengths for the (slot, target) pairs, with -1 for unreachable"""
+    pair_words, pair_masks = _slot_bits(pair_slots)
+    pair_targets = np.asarray(pair_targets, dtype=np.int64)
+    lengths = np.full(len(pair_targets), -1, dtype=np.int64)
+    pending = np.arange(len(pair_targets))
+    levels = msbfs_levels(G, roots)
+    for level, frontier, frontier_bits, seen in levels:
+        reached = (seen[pair_targets[pending], pair_words[pending]] & pair_masks[pending]) != 0
+        lengths[pending[reached]] = level
+        pending = pending[~reached]
+        if len(pending) == 0:
+            break
+    # (clears the workspace now, rather than whenever the generator is collected)
+    levels.close()
+    return lengths
+
+def msbfs_level_counts(G, roots, root_slots, target_vertices, target_groups, num_groups):
+    """MS-BFS (see msbfs_levels) that runs to the end, counting at each level how many
+    (slot, target) combinations are first reached, by group of the target.
+
+    target_vertices may repeat (e.g. one vertex for several papers), each occurrence counts.
+    returns an int64 array of shape (num_groups, number of levels)"""
+    target_vertices = np.asarray(target_vertices, dtype=np.int64)
+    target_groups = np.asarray(target_groups, dtype=np.int64)
+    reached_count = np.zeros(G.num_vertices, dtype=np.int64)
+    counts = []
+    for level, frontier, frontier_bits, seen in msbfs_levels(G, roots, root_slots):
+        reached_count[frontier] = popcount_rows(frontier_bits)
+        counts.append(np.bincount(target_groups, weights=reached_count[target_vertices], minlength=num_groups).astype(np.int64))
+        reached_count[frontier] = 0
+    if not counts:
+        return np.zeros((num_groups, 0), dtype=np.int64)
+    return np.column_stack(counts)
+
+def msbfs_shortest_path_lengths(G, source_vertices, target_vertices, width=DEFAULT_WIDTH):
+    """shortest path lengths for a batch of pairs of vertex indices, using MS-BFS sweeps of up to
+    `width` roots at a time. roots are the endpoints chosen by group_pairs_by_endpoint.
+    returns a list in pair order, with None for pairs with a negative vertex index (not in the graph)
+    and float('inf') for unreachable pairs"""
+    if width <= 0 or width % 64 != 0:
+        raise ValueError("width must be a positive multiple of 64")
+    sp_lengths = [None] * len(source_vertices)
+    groups = group_pairs_by_endpoint(source_vertices, target_vertices)
+    for batch_start in range(0, len(groups), width):
+        batch = groups[batch_start:batch_start+width]
+        roots = [endpoint for endpoint, positions, others in batch]
+        pair_slots = []
+        pair_targets = []
+        pair_positions = []
+        for slot, (endpoint, positions, others) in enumerate(batch):
+            pair_slots.extend([slot] * len(positions))
+            pair_targets.extend(others)
+            pair_positions.extend(positions)
+        lengths = msbfs_sweep(G, roots, pair_slots, pair_targets)
+        for pos, length in zip(pair_positions, lengths):
+            sp_lengths[pos] = int(length) if length >= 0 else float('inf')
+    return sp_lengths
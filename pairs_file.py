@@ -0,0 +1,140 @@
+import os
+from bisect import bisect_right
+import numpy as np
+
+class Pair(object):
+    def __init__(self, source_arxiv_id, source_mag_id, target_arxiv_id, target_mag_id):
+        self.source_arxiv_id = source_arxiv_id
+        self.source_mag_id = source_mag_id
+        self.target_arxiv_id = target_arxiv_id
+        self.target_mag_id = target_mag_id
+
+class PairsIndex(object):
+    """byte offset of every pair in a pairs file, plus the category pair each pair belongs to.
+
+    pairs are numbered from 0 in file order, not counting "# category1<tab>category2" header lines.
+    groups is a list of (start_idx, end_idx, category1, category2), one per header line"""
+    def __init__(self, offsets, groups):
+        self.offsets = offsets
+        self.groups = groups
+        self._group_starts = [g[0] for g in groups]
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def get_group(self, pair_idx):
+        """(category1, category2) for the pair with index pair_idx, or None if it comes before any header line"""
+        i = bisect_right(self._group_starts, pair_idx) - 1
+        if i < 0 or pair_idx >= self.groups[i][1]:
+            return None
+        return self.groups[i][2], self.groups[i][3]
+
+def get_offsets_fname(pairs_fname):
+    return pairs_fname + ".offsets.npy"
+
+def get_groups_fname(pairs_fname):
+    return pairs_fname + ".groups.tsv"
+
+def _is_current(sidecar_fname, pairs_fname):
+    return os.path.exists(sidecar_fname) and os.path.getmtime(sidecar_fname) >= os.path.getmtime(pairs_fname)
+
+def scan_pairs_file(pairs_fname):
+    """one pass over a pairs file. returns (offsets, groups) as described in PairsIndex"""
+    offsets = []
+    groups = []
+    pos = 0
+    with open(pairs_fname, 'rb') as f:
+        for line in f:
+            if line[:1] == b'#':
+                categories = line[1:].strip().decode('utf8').split('\t')
+                if groups:
+                    groups[-1][1] = len(offsets)
+                groups.append([len(offsets), None] + categories[:2])
+            elif line.strip():
+                offsets.append(pos)
+            pos += len(line)
+    if groups:
+        groups[-1][1] = len(offsets)
+    return np.array(offsets, dtype=np.int64), [tuple(g) for g in groups]
+
+def write_groups(groups, groups_fname):
+    tmp_fname = "{}.tmp{}".format(groups_fname, os.getpid())
+    with open(tmp_fname, 'w') as outf:
+        for start_idx, end_idx, category1, category2 in groups:
+            outf.write("\t".join([str(start_idx), str(end_idx), category1, category2]))
+            outf.write("\n")
+    os.rename(tmp_fname, groups_fname)
+
+def read_groups(groups_fname):
+    groups = []
+    with open(groups_fname, 'r') as f:
+        for line in f:
+            start_idx, end_idx, category1, category2 = line.rstrip('\n').split('\t')
+            groups.append((int(start_idx), int(end_idx), category1, category2))
+    return groups
+
+def write_offsets(offsets, offsets_fname):
+    tmp_fname = "{}.tmp{}".format(offsets_fname, os.getpid())
+    with open(tmp_fname, 'wb') as outf:
+        np.save(outf, np.asarray(offsets, dtype=np.int64))
+    os.rename(tmp_fname, offsets_fname)
+
+def build_pairs_index(pairs_fname):
+    """scan the pairs file and write the sidecar files next to it.
+    a pairs file without header lines keeps its existing groups file (e.g. one written by get_sample_pairs.py)"""
+    offsets, groups = scan_pairs_file(pairs_fname)
+    write_offsets(offsets, get_offsets_fname(pairs_fname))
+    groups_fname = get_groups_fname(pairs_fname)
+    if groups or not os.path.exists(groups_fname):
+        write_groups(groups, groups_fname)
+    else:
+        groups = read_groups(groups_fname)
+        # make sure the groups file is not seen as stale from now on
+        os.utime(groups_fname, None)
+    return PairsIndex(offsets, groups)
+
+def load_pairs_index(pairs_fname):
+    """the PairsIndex for a pairs file. the offsets are memory-mapped from the sidecar file,
+    which is (re)built first if it is missing or older than the pairs file"""
+    offsets_fname = get_offsets_fname(pairs_fname)
+    groups_fname = get_groups_fname(pairs_fname)
+    if not ( _is_current(offsets_fname, pairs_fname) and _is_current(groups_fname, pairs_fname) ):
+        try:
+            return build_pairs_index(pairs_fname)
+        except (IOError, OSError):
+            # e.g. read-only data directory. scan without saving
+            offsets, groups = scan_pairs_file(pairs_fname)
+            return PairsIndex(offsets, groups)
+    return PairsIndex(np.load(offsets_fname, mmap_mode='r'), read_groups(groups_fname))
+
+def read_pairs(pairs_fname, start_idx, end_idx, pairs_index=None):
+    """the pairs with index in [start_idx, end_idx), read by seeking straight to pair start_idx"""
+    if pairs_index is None:
+        pairs_index = load_pairs_index(pairs_fname)
+    end_idx = min(end_idx, len(pairs_index))
+    pairs = []
+    if start_idx >= end_idx:
+        return pairs
+    with open(pairs_fname, 'rb') as f:
+        f.seek(int(pairs_index.offsets[start_idx]))
+        while len(pairs) < end_idx - start_idx:
+            line = f.readline()
+            if not line:
+                break
+            if line[:1] == b'#' or not line.strip():
+                continue
+            line = line.decode('utf8').strip().split('\t')
+            pairs.append(Pair(*line))
+    return pairs
+
+def read_pairs_by_index(pairs_fname, pair_indices, pairs_index=None):
+    """the pairs with the given indices (in that order), each read by seeking to its offset"""
+    if pairs_index is None:
+        pairs_index = load_pairs_index(pairs_fname)
+    pairs = []
+    with open(pairs_fname, 'rb') as f:
+        for pair_idx in pair_indices:
+            f.seek(int(pairs_index.offsets[pair_idx]))
+            line = f.readline().decode('utf8').strip().split('\t')
+            pairs.append(Pair(*line))
+    return pairs
@@ -0,0 +1,145 @@
+import sys, os
+from glob import glob
+from datetime import datetime
+from timeit import default_timer as timer
+try:
+    from humanfriendly import format_timespan
+except ImportError:
+    def format_timespan(seconds):
+        return "{:.2f} seconds".format(seconds)
+
+import numpy as np
+
+from pairs_file import load_pairs_index, read_pairs
+from landmarks import LandmarkIndex
+from graph_reduction import ReducedGraph
+from task_planner import read_completed_pairs, estimate_pair_costs, group_by_source, pack_tasks, SHARED_TRAVERSAL_BACKENDS
+from shortest_path_length_utils import load_graph, as_csr_graph, load_id_index, get_vertex_seq_ids_for_pairs, load_distance_index, BACKENDS
+
+import logging
+logging.basicConfig(format='%(asctime)s %(name)s.%(lineno)d %(levelname)s : %(message)s',
+        datefmt="%H:%M:%S",
+        level=logging.INFO)
+# logger = logging.getLogger(__name__)
+logger = logging.getLogger('__main__').getChild(__name__)
+
+def output_one_line(path_to_script, path_to_graph, path_to_pairs, indices_fname, output_fname, log_fname, args):
+    # build the command as a list of strings, which can be concatenated at the end
+    out = ['python']
+    out.append(path_to_script)
+    out.append(path_to_graph)
+    out.append(path_to_pairs)
+    out.append("-o {}".format(output_fname))
+    out.append("--indices {}".format(indices_fname))
+    out.append("--backend {}".format(args.backend))
+    if args.index:
+        out.append("--index {}".format(os.path.abspath(args.index)))
+    if args.backend in ('landmarks', 'reduced'):
+        out.append("--fallback-backend {}".format(args.fallback_backend))
+    if args.time_budget:
+        out.append("--time-budget {}".format(args.time_budget))
+    out.append('--debug')
+    out.append('>& {}'.format(log_fname))  # output stdout and stderr to a file
+    return ' '.join(out)
+
+def main(args):
+    script = os.path.abspath(args.script)
+    script_dirname = os.path.split(script)[0]
+    outdir = os.path.abspath(args.outdir) if args.outdir else os.path.join(script_dirname, "output")
+    logdir = os.path.abspath(args.logdir) if args.logdir else os.path.join(script_dirname, "logs")
+    taskdir = os.path.abspath(args.taskdir) if args.taskdir else os.path.join(script_dirname, "tasks")
+    name = args.name or "tasks_{:%Y%m%d-%H%M%S}".format(datetime.now())
+    taskfile = os.path.abspath(args.taskfile) if args.taskfile else os.path.join(script_dirname, "tasklist_{}.txt".format(name))
+    manifest_fname = os.path.join(taskdir, "{}_manifest.tsv".format(name))
+    for fname in (taskfile, manifest_fname):
+        if os.path.exists(fname):
+            raise RuntimeError("path {} already exists".format(fname))
+    if not os.path.isdir(taskdir):
+        os.makedirs(taskdir)
+
+    graph_fname = os.path.abspath(args.graph)
+    pairs_fname = os.path.abspath(args.pairs)
+
+    start = timer()
+    pairs_index = load_pairs_index(pairs_fname)
+    pairs = read_pairs(pairs_fname, 0, len(pairs_index), pairs_index=pairs_index)
+    existing = [fname for pattern in (args.existing or [os.path.join(outdir, '*.tsv')]) for fname in glob(pattern)]
+    completed = read_completed_pairs(existing, pairs)
+    todo = [pair_idx for pair_idx, pair in enumerate(pairs) if (pair.source_arxiv_id, pair.target_arxiv_id) not in completed]
+    logger.info("{} pairs, {} of them already in {} existing output files. {} pairs to plan".format(len(pairs), len(pairs) - len(todo), len(existing), len(todo)))
+    if not todo:
+        return
+
+    logger.debug("loading graph from file: {}...".format(graph_fname))
+    G = as_csr_graph(load_graph(graph_fname))
+    id_index = load_id_index(graph_fname, G)
+    source_vertices, target_vertices, missing_ids = get_vertex_seq_ids_for_pairs(id_index, [pairs[pair_idx] for pair_idx in todo])
+    landmarks = None
+    reduced = None
+    for fname in (args.index, args.landmarks, args.reduced):
+        if fname:
+            index = load_distance_index(os.path.abspath(fname))
+            if isinstance(index, LandmarkIndex):
+                landmarks = index
+            elif isinstance(index, ReducedGraph):
+                reduced = index
+    costs = estimate_pair_costs(G, source_vertices, target_vertices, args.backend, landmarks=landmarks, reduced=reduced, fallback_backend=args.fallback_backend)
+    logger.debug("probed {} pairs. took {}".format(len(todo), format_timespan(timer()-start)))
+
+    groups = group_by_source(todo, source_vertices, costs, args.backend in SHARED_TRAVERSAL_BACKENDS)
+    tasks = pack_tasks(groups, args.target_seconds, args.load_seconds, args.traversal_seconds, args.pair_seconds)
+
+    logger.info("writing {} tasks to {}".format(len(tasks), taskfile))
+    with open(taskfile, 'w') as outf, open(manifest_fname, 'w') as manifest:
+        manifest.write("\t".join(['task', 'num_pairs', 'num_sources', 'estimated_seconds', 'indices_fname', 'output_fname', 'log_fname']))
+        manifest.write("\n")
+        for i, task in enumerate(tasks):
+            task_name = "{}_{:05d}".format(name, i)
+            indices_fname = os.path.join(taskdir, "{}.npy".format(task_name))
+            output_fname = os.path.join(outdir, "{}.tsv".format(task_name))
+            log_fname = os.path.join(logdir, "{}.log".format(task_name))
+            np.save(indices_fname, np.array(task.pair_indices, dtype=np.int64))
+            outf.write(output_one_line(script, graph_fname, pairs_fname, indices_fname, output_fname, log_fname, args))
+            outf.write("\n")
+            manifest.write("\t".join([task_name, str(len(task.pair_indices)), str(task.num_sources), "{:.1f}".format(task.seconds), indices_fname, output_fname, log_fname]))
+            manifest.write("\n")
+    seconds = [task.seconds for task in tasks]
+    logger.info("estimated time per task: {} to {} (mean {}). manifest: {}".format(format_timespan(min(seconds)), format_timespan(max(seconds)), format_timespan(sum(seconds) / len(seconds)), manifest_fname))
+
+if __name__ == "__main__":
+    total_start = timer()
+    logger = logging.getLogger(__name__)
+    logger.info(" ".join(sys.argv))
+    logger.info( '{:%Y-%m-%d %H:%M:%S}'.format(datetime.now()) )
+    import argparse
+    parser = argparse.ArgumentParser(description="write a tasklist for use with parallel-sql, packing the pairs that are not done yet into tasks of about the same estimated run time", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("script", help="script file for each task to run (calculate_shortest_paths.py)")
+    parser.add_argument("graph", help="network graph (Pajek .net file or binary CSR file)")
+    parser.add_argument("pairs", help="tsv file with pairs samples")
+    parser.add_argument("-o", "--outdir", help="output directory of the tasks")
+    parser.add_argument("-l", "--logdir", help="logfiles directory")
+    parser.add_argument("--taskdir", help="directory for the pair indices of each task and the manifest")
+    parser.add_argument("--taskfile", help="path to the tasklist file written by this program")
+    parser.add_argument("--name", help="prefix for the task files (default: tasks_<date>-<time>)")
+    parser.add_argument("--existing", nargs='+', help="glob patterns of output files with pairs that are already done (default: all .tsv files in the output directory). .npy result files count their done rows")
+    parser.add_argument("--backend", choices=BACKENDS, default='igraph', help="backend the tasks run with (also used for the cost estimates)")
+    parser.add_argument("--fallback-backend", choices=['igraph', 'bibfs', 'grouped', 'msbfs'], default='bibfs', help="fallback backend the tasks run with, for --backend landmarks or reduced")
+    parser.add_argument("--index", help="distance index file the tasks run with (see calculate_shortest_paths.py). landmark and reduction files are also used for the cost estimates")
+    parser.add_argument("--landmarks", help="landmark file (from build_landmarks.py) for distance estimates in the cost probe")
+    parser.add_argument("--reduced", help="reduction file (from reduce_graph.py) for component labels in the cost probe")
+    parser.add_argument("--target-seconds", type=float, default=3.5 * 3600, help="target run time of each task")
+    parser.add_argument("--load-seconds", type=float, default=300.0, help="estimated time for a task to load the graph")
+    parser.add_argument("--traversal-seconds", type=float, default=150.0, help="estimated time for a traversal of the whole graph with the backend")
+    parser.add_argument("--pair-seconds", type=float, default=0.001, help="estimated overhead per pair")
+    parser.add_argument("--time-budget", type=float, help="pass --time-budget (seconds) to each task")
+    parser.add_argument("--debug", action='store_true', help="output debugging info")
+    global args
+    args = parser.parse_args()
+    if args.debug:
+        logger.setLevel(logging.DEBUG)
+        logger.debug('debug mode is on')
+    else:
+        logger.setLevel(logging.INFO)
+    main(args)
+    total_end = timer()
+    logger.info('all finished. total time: {}'.format(format_timespan(total_end-total_start)))
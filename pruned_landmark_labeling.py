@@ -0,0 +1,330 @@
+import os
+import multiprocessing
+from array import array
+from collections import deque
+import numpy as np
+
+from csr_graph import write_sections, map_section
+
+# binary label file layout (little-endian, sections padded to 8 bytes, see csr_graph.write_sections):
+#   magic (8 bytes)
+#   header: HEADER_FIELDS int64 values (version, num_vertices, num_entries, 0, 0, 0, 0, 0)
+#   order: num_vertices int32. order[rank] is the vertex with that rank (rank 0 has the highest degree)
+#   offsets: num_vertices + 1 int64
+#   hubs: num_entries int32. the label of vertex v is hubs[offsets[v]:offsets[v+1]] (hub ranks, ascending)
+#   dists: num_entries uint8. distance from v to each hub in its label
+PLL_MAGIC = b'SPLPLL\x00\x01'
+PLL_VERSION = 1
+HEADER_FIELDS = 8
+HEADER_SIZE = len(PLL_MAGIC) + 8 * HEADER_FIELDS
+MAX_LABEL_DIST = np.iinfo(np.uint8).max
+
+# larger than any sum of two label distances
+_NO_LABEL = 2 * MAX_LABEL_DIST + 1
+
+class DistanceLabels(object):
+    """pruned landmark labeling (2-hop cover) index for exact undirected shortest path lengths.
+
+    for any two vertices, some hub on a shortest path between them is in both of their labels,
+    so the distance is the minimum of d(u, hub) + d(hub, v) over their common hubs"""
+    def __init__(self, order, offsets, hubs, dists):
+        self.order = order
+        self.offsets = offsets
+        self.hubs = hubs
+        self.dists = dists
+        self.num_vertices = len(offsets) - 1
+
+    def num_entries(self):
+        return int(self.offsets[-1])
+
+    def size_in_bytes(self):
+        return sum(arr.nbytes for arr in (self.order, self.offsets, self.hubs, self.dists))
+
+    def label(self, v):
+        """(hub ranks, distances) of the label of vertex v"""
+        start = self.offsets[v]
+        end = self.offsets[v+1]
+        return self.hubs[start:end], self.dists[start:end]
+
+    def query(self, u, v):
+        """shortest path length between vertex indices u and v, or float('inf') if there is no path"""
+        if u == v:
+            return 0
+        hubs_u, dists_u = self.label(u)
+        hubs_v, dists_v = self.label(v)
+        if len(hubs_u) == 0 or len(hubs_v) == 0:
+            return float('inf')
+        # both labels are sorted by hub rank, so a binary search finds the common hubs
+        pos = np.minimum(np.searchsorted(hubs_v, hubs_u), len(hubs_v) - 1)
+        common = hubs_v[pos] == hubs_u
+        if not common.any():
+            return float('inf')
+        return int((dists_u[common].astype(np.int64) + dists_v[pos[common]]).min())
+
+    def query_many(self, source_vertices, target_vertices):
+        """lengths for a batch of vertex pairs. pairs with a negative vertex index (not in the graph) get None"""
+        sp_lengths = []
+        for source, target in zip(source_vertices, target_vertices):
+            if source < 0 or target < 0:
+                sp_lengths.append(None)
+            else:
+                sp_lengths.append(self.query(int(source), int(target)))
+        return sp_lengths
+
+    def save(self, fname):
+        header = np.array([PLL_VERSION, self.num_vertices, self.num_entries(), 0, 0, 0, 0, 0], dtype='<i8')
+        tmp_fname = "{}.tmp{}".format(fname, os.getpid())
+        with open(tmp_fname, 'wb') as outf:
+            outf.write(PLL_MAGIC)
+            outf.write(header.tobytes())
+            write_sections(outf, [np.ascontiguousarray(self.order, dtype='<i4'),
+                                  np.ascontiguousarray(self.offsets, dtype='<i8'),
+                                  np.ascontiguousarray(self.hubs, dtype='<i4'),
+                                  np.ascontiguousarray(self.dists, dtype=np.uint8)])
+        os.rename(tmp_fname, fname)
+
+def is_pll_file(fname):
+    with open(fname, 'rb') as f:
+        return f.read(len(PLL_MAGIC)) == PLL_MAGIC
+
+def load_distance_labels(fname):
+    """memory-map a label file written by DistanceLabels.save"""
+    with open(fname, 'rb') as f:
+        if f.read(len(PLL_MAGIC)) != PLL_MAGIC:
+            raise ValueError("{} is not a distance label file".format(fname))
+        header = np.frombuffer(f.read(8 * HEADER_FIELDS), dtype='<i8')
+    version, num_vertices, num_entries = [int(x) for x in header[:3]]
+    if version != PLL_VERSION:
+        raise ValueError("unsupported distance label file version: {}".format(version))
+    pos = HEADER_SIZE
+    order, pos = map_section(fname, '<i4', num_vertices, pos)
+    offsets, pos = map_section(fname, '<i8', num_vertices + 1, pos)
+    hubs, pos = map_section(fname, '<i4', num_entries, pos)
+    dists, pos = map_section(fname, np.uint8, num_entries, pos)
+    return DistanceLabels(order, offsets, hubs, dists)
+
+def degree_order(G):
+    """vertices by decreasing degree (ties by vertex index). high degree vertices make the best hubs"""
+    return np.argsort(-G.degrees().astype(np.int64), kind='mergesort')
+
+def pruned_bfs(G, root, rank, label_hubs, label_dists, dist, root_label):
+    """BFS from root that stops expanding at every vertex whose distance from root is
+    already covered by the labels found so far.
+
+    label_hubs/label_dists are per-vertex lists of the labels so far.
+    dist (all -1) and root_label (all _NO_LABEL) are scratch arrays of length num_vertices,
+    restored before returning. returns the list of (vertex, distance) that get hub `rank`"""
+    for hub, d in zip(label_hubs[root], label_dists[root]):
+        root_label[hub] = d
+    new_labels = []
+    visited = [root]
+    dist[root] = 0
+    queue = deque([root])
+    try:
+        while queue:
+            u = queue.popleft()
+            du = dist[u]
+            covered = False
+            for hub, d in zip(label_hubs[u], label_dists[u]):
+                if root_label[hub] + d <= du:
+                    covered = True
+                    break
+            if covered:
+                continue
+            if du > MAX_LABEL_DIST:
+                raise ValueError("distance {} does not fit in a label".format(du))
+            new_labels.append((u, du))
+            for w in G.neighbors_of(u).tolist():
+                if dist[w] < 0:
+                    dist[w] = du + 1
+                    visited.append(w)
+                    queue.append(w)
+    finally:
+        for v in visited:
+            dist[v] = -1
+        for hub in label_hubs[root]:
+            root_label[hub] = _NO_LABEL
+    return new_labels
+
+def _scratch_arrays(num_vertices):
+    return array('i', [-1]) * num_vertices, array('i', [_NO_LABEL]) * num_vertices
+
+def _add_labels(label_hubs, label_dists, rank, new_labels):
+    for v, d in new_labels:
+        label_hubs[v].append(rank)
+        label_dists[v].append(d)
+
+# (G, label_hubs, label_dists) inherited by the forked build workers (see build_distance_labels)
+_build_state = None
+
+def _label_roots(roots):
+    """build worker task: pruned BFS from each (rank, root) in order, with the labels as of the start of the round.
+    labels from this worker's own earlier roots are used too (they are final labels of higher-ranked hubs)"""
+    G, label_hubs, label_dists = _build_state
+    dist, root_label = _scratch_arrays(G.num_vertices)
+    results = []
+    for rank, root in roots:
+        new_labels = pruned_bfs(G, root, rank, label_hubs, label_dists, dist, root_label)
+        _add_labels(label_hubs, label_dists, rank, new_labels)
+        results.append((rank, new_labels))
+    return results
+
+def build_distance_labels(G, processes=1, sequential_roots=1024, chunk_size=64, max_round_size=1 << 16, progress=None):
+    """build the pruned landmark labeling of the CSRGraph G, ranking vertices by degree.
+
+    the first `sequential_roots` roots (the hubs that prune the most) run one after the other.
+    after that, with processes > 1, roots are labeled in rounds that double in size: the roots of a
+    round run in parallel against the labels of all earlier rounds. this only prunes less, so the
+    labels stay exact (they may just be somewhat larger than with a fully sequential build).
+    progress(num_roots_done) is called after every round, if given"""
+    global _build_state
+    order = degree_order(G)
+    n = G.num_vertices
+    label_hubs = [[] for _ in range(n)]
+    label_dists = [[] for _ in range(n)]
+
+    pos = 0
+    num_sequential = n if processes <= 1 else min(n, sequential_roots)
+    dist, root_label = _scratch_arrays(n)
+    while pos < num_sequential:
+        root = int(order[pos])
+        _add_labels(label_hubs, label_dists, pos, pruned_bfs(G, root, pos, label_hubs, label_dists, dist, root_label))
+        pos += 1
+    if progress is not None:
+        progress(pos)
+
+    round_size = max(pos, processes * chunk_size)
+    context = multiprocessing.get_context('fork')
+    while pos < n:
+        roots = [(rank, int(order[rank])) for rank in range(pos, min(n, pos + round_size))]
+        chunks = [roots[i:i+chunk_size] for i in range(0, len(roots), chunk_size)]
+        _build_state = (G, label_hubs, label_dists)
+        pool = context.Pool(processes=processes)
+        try:
+            results = [r for chunk_results in pool.map(_label_roots, chunks) for r in chunk_results]
+        finally:
+            pool.close()
+            pool.join()
+            _build_state = None
+        # merge in rank order, so every label stays sorted by hub rank
+        for rank, new_labels in sorted(results, key=lambda r: r[0]):
+            _add_labels(label_hubs, label_dists, rank, new_labels)
+        pos += len(roots)
+        round_size = min(round_size * 2, max_round_size)
+        if progress is not None:
+            progress(pos)
+
+    sizes = np.array([len(hubs) for hubs in label_hubs], dtype=np.int64)
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(sizes, out=offsets[1:])
+    hubs = np.fromiter((hub for label in label_hubs for hub in label), dtype=np.int32, count=int(offsets[-1]))
+    dists = np.fromiter((d for label in label_dists for d in label), dtype=np.uint8, count=int(offsets[-1]))
+    return DistanceLabels(order.astype(np.int32), offsets, hubs, dists)
+
+class _LabelUpdates(object):
+    """the labels of a DistanceLabels index, plus the entries added (or lowered) since, as per-vertex dicts"""
+    def __init__(self, labels):
+        self.labels = labels
+        self.updates = {}
+
+    def items(self, v):
+        """(hub rank, distance) entries of the label of v. a hub may appear twice (old and lowered distance)"""
+        items = []
+        if v < self.labels.num_vertices:
+            hubs, dists = self.labels.label(v)
+            items = list(zip(hubs.tolist(), dists.tolist()))
+        if v in self.updates:
+            items.extend(self.updates[v].items())
+        return items
+
+    def set(self, v, rank, d):
+        self.updates.setdefault(v, {})[rank] = d
+
+    def merged(self, order):
+        """DistanceLabels with the updates merged in (the smallest distance of each hub, labels sorted by hub rank)"""
+        n = len(order)
+        old = self.labels
+        update_vertices = np.fromiter((v for v, label in self.updates.items() for _ in label), dtype=np.int64)
+        update_hubs = np.fromiter((rank for label in self.updates.values() for rank in label), dtype=np.int64)
+        update_dists = np.fromiter((d for label in self.updates.values() for d in label.values()), dtype=np.int64)
+        vertices = np.concatenate([np.repeat(np.arange(old.num_vertices, dtype=np.int64), np.diff(old.offsets)), update_vertices])
+        hubs = np.concatenate([np.asarray(old.hubs, dtype=np.int64), update_hubs])
+        dists = np.concatenate([np.asarray(old.dists, dtype=np.int64), update_dists])
+        entries = np.lexsort((dists, hubs, vertices))
+        vertices = vertices[entries]
+        hubs = hubs[entries]
+        dists = dists[entries]
+        first = np.ones(len(entries), dtype=bool)
+        first[1:] = (vertices[1:] != vertices[:-1]) | (hubs[1:] != hubs[:-1])
+        vertices = vertices[first]
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(vertices, minlength=n), out=offsets[1:])
+        return DistanceLabels(np.asarray(order, dtype=np.int32), offsets, hubs[first].astype(np.int32), dists[first].astype(np.uint8))
+
+def resumed_pruned_bfs(G, rank, root, start, start_dist, labels, dist, root_label):
+    """pruned BFS for hub `rank` (vertex root), resumed at vertex start at distance start_dist from root over a new edge.
+    labels is a _LabelUpdates, and gets the new entries. dist and root_label are scratch arrays as in pruned_bfs.
+    returns the number of entries added"""
+    root_items = labels.items(root)
+    for hub, d in root_items:
+        root_label[hub] = min(root_label[hub], d)
+    num_added = 0
+    visited = [start]
+    dist[start] = start_dist
+    queue = deque([start])
+    try:
+        while queue:
+            u = queue.popleft()
+            du = dist[u]
+            covered = False
+            for hub, d in labels.items(u):
+                if root_label[hub] + d <= du:
+                    covered = True
+                    break
+            if covered:
+                continue
+            if du > MAX_LABEL_DIST:
+                raise ValueError("distance {} does not fit in a label".format(du))
+            labels.set(u, rank, du)
+            num_added += 1
+            for w in G.neighbors_of(u).tolist():
+                if dist[w] < 0:
+                    dist[w] = du + 1
+                    visited.append(w)
+                    queue.append(w)
+    finally:
+        for v in visited:
+            dist[v] = -1
+        for hub, _ in root_items:
+            root_label[hub] = _NO_LABEL
+    return num_added
+
+def insert_edges(labels, G, inserted_edges, progress=None):
+    """update DistanceLabels for edges inserted into the graph (and vertices appended to it), with the
+    resumed pruned BFSs of dynamic pruned landmark labeling (Akiba, Iwata and Yoshida, 2014).
+    G is the CSRGraph after the insertions, and inserted_edges a (num_edges, 2) array of its vertex indices.
+
+    for a new edge (a, b), the BFS of every hub in the label of a is resumed at b (and the other way round),
+    and adds entries only where the labels no longer give the distance. entries whose distance got shorter
+    are kept too, which only makes the labels somewhat larger than a rebuild: queries stay exact.
+    new vertices get the lowest ranks. progress(num_edges_done) is called every 1000 edges, if given.
+    returns (new DistanceLabels, number of BFSs resumed, number of entries added)"""
+    n_old = labels.num_vertices
+    n = G.num_vertices
+    order = np.concatenate([np.asarray(labels.order, dtype=np.int64), np.arange(n_old, n, dtype=np.int64)])
+    updates = _LabelUpdates(labels)
+    # every vertex is the hub of its own label (the new vertices have rank == vertex index)
+    for v in range(n_old, n):
+        updates.set(v, v, 0)
+    dist, root_label = _scratch_arrays(n)
+    num_resumed = 0
+    num_added = 0
+    for i, (a, b) in enumerate(np.asarray(inserted_edges, dtype=np.int64).tolist()):
+        # hubs of both endpoints in rank order, so the higher ranked hubs prune the later BFSs
+        entries = sorted([(hub, d, b) for hub, d in updates.items(a)] + [(hub, d, a) for hub, d in updates.items(b)])
+        for hub, d, start in entries:
+            num_added += resumed_pruned_bfs(G, hub, int(order[hub]), start, d + 1, updates, dist, root_label)
+            num_resumed += 1
+        if progress is not None and (i + 1) % 1000 == 0:
+            progress(i + 1)
+    return updates.merged(order), num_resumed, num_added
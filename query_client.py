@@ -0,0 +1,63 @@
+import socket, json
+
+# pairs per request: requests stay well below the longest line the server reads (query_server.STREAM_LIMIT)
+DEFAULT_BATCH_SIZE = 1000
+
+def parse_server_address(address):
+    """(family, address) for socket.socket: 'host:port' (e.g. 'localhost:8765') is a TCP address,
+    anything else is the path of a Unix socket"""
+    host, sep, port = address.rpartition(':')
+    if sep and host and port.isdigit() and '/' not in address:
+        return socket.AF_INET, (host, int(port))
+    return socket.AF_UNIX, address
+
+class QueryClient(object):
+    """connection to a query server (see query_server.py).
+
+    the protocol is one JSON object per line in each direction: a request
+    {"pairs": [[source_mag_id, target_mag_id], ...]} gets {"results": [[value, ...], ...]},
+    one list of output values per pair (the shortest path length, or with a --bounds-only server
+    the lower and upper bounds). null means the id is not in the graph, and Infinity that there is no path.
+    {"command": "options"} gets the server's backend options (see options())"""
+    def __init__(self, address, timeout=None):
+        family, addr = parse_server_address(address)
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(addr)
+        self.reader = self.sock.makefile('rb')
+
+    def request(self, message):
+        self.sock.sendall(json.dumps(message).encode('utf8') + b'\n')
+        line = self.reader.readline()
+        if not line:
+            raise IOError("the query server closed the connection")
+        response = json.loads(line.decode('utf8'))
+        if 'error' in response:
+            raise RuntimeError("query server error: {}".format(response['error']))
+        return response
+
+    def query(self, pairs, batch_size=DEFAULT_BATCH_SIZE):
+        """output values for each of a list of Pair objects (see pairs_file.Pair), as tuples.
+        the pairs are sent batch_size at a time"""
+        results = []
+        for i in range(0, len(pairs), batch_size):
+            response = self.request({'pairs': [[pair.source_mag_id, pair.target_mag_id] for pair in pairs[i:i+batch_size]]})
+            results.extend(tuple(values) for values in response['results'])
+        return results
+
+    def stats(self):
+        return self.request({'command': 'stats'})['stats']
+
+    def options(self):
+        """the backend options the server answers with: backend, fallback_backend and bounds_only"""
+        return self.request({'command': 'options'})['options']
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
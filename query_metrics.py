@@ -0,0 +1,130 @@
+import json, math
+from collections import Counter
+from timeit import default_timer as timer
+
+from result_store import STATUS_OK, STATUS_UNREACHABLE, STATUS_MISSING
+from shortest_path_length_utils import get_shortest_path_lengths_for_vertex_pairs
+
+STATUS_NAMES = {STATUS_OK: 'ok', STATUS_UNREACHABLE: 'unreachable', STATUS_MISSING: 'missing'}
+
+# backends whose traversals fill in a TraversalStats (for 'landmarks' and 'reduced', only with one of
+# these as the fallback backend). 'pll' does no traversal, so its counters are 0.
+# the counters of the other backends are recorded as null
+COUNTED_BACKENDS = ['bibfs', 'grouped']
+
+# fields of a query record that are aggregated into histograms, and the unit they are bucketed in
+HISTOGRAM_FIELDS = [
+    ('lookup_seconds', 1e6, 'microseconds'),
+    ('traversal_seconds', 1e6, 'microseconds'),
+    ('vertices_visited', 1, 'vertices'),
+    ('edges_scanned', 1, 'adjacency entries'),
+    ('max_frontier', 1, 'vertices'),
+]
+
+class TraversalStats(object):
+    """BFS work done for one query, added up by the traversals that take a `stats` argument"""
+    def __init__(self):
+        self.vertices_visited = 0
+        self.edges_scanned = 0
+        self.max_frontier = 0
+
+    def add_search(self, vertices_visited, sides):
+        """add a finished search: the number of vertices it reached, and its SearchSides"""
+        self.vertices_visited += vertices_visited
+        for side in sides:
+            self.edges_scanned += side.edges_scanned
+            self.max_frontier = max(self.max_frontier, side.max_frontier)
+
+def is_counted(backend, fallback_backend):
+    if backend in ('landmarks', 'reduced'):
+        return fallback_backend in COUNTED_BACKENDS
+    return backend in COUNTED_BACKENDS or backend == 'pll'
+
+def get_status(sp_length):
+    if sp_length is None:
+        return STATUS_NAMES[STATUS_MISSING]
+    if sp_length == float('inf'):
+        return STATUS_NAMES[STATUS_UNREACHABLE]
+    return STATUS_NAMES[STATUS_OK]
+
+class QueryMetrics(object):
+    """sink for per-query records (dicts with the HISTOGRAM_FIELDS, 'status' and the pair's ids).
+
+    with a .jsonl file name, every record is written as one JSON line. otherwise the records are
+    aggregated into power-of-two histograms (and status counts), written as JSON by close()"""
+    def __init__(self, fname):
+        self.fname = fname
+        self.per_query = fname.endswith('.jsonl')
+        self.outf = open(fname, 'w') if self.per_query else None
+        self.histograms = {name: Counter() for name, _, _ in HISTOGRAM_FIELDS}
+        self.sums = Counter()
+        self.maxima = {}
+        self.statuses = Counter()
+        self.num_queries = 0
+
+    def record(self, record):
+        self.num_queries += 1
+        if self.per_query:
+            self.outf.write(json.dumps(record))
+            self.outf.write("\n")
+            return
+        self.statuses[record['status']] += 1
+        for name, scale, _ in HISTOGRAM_FIELDS:
+            value = record.get(name)
+            if value is None:
+                continue
+            value *= scale
+            # bucket b holds values in [2**(b-1), 2**b), and bucket 0 values below 1
+            self.histograms[name][0 if value < 1 else int(math.log(value, 2)) + 1] += 1
+            self.sums[name] += value
+            self.maxima[name] = max(self.maxima.get(name, value), value)
+
+    def summary(self):
+        out = {'queries': self.num_queries, 'status': dict(self.statuses)}
+        for name, _, unit in HISTOGRAM_FIELDS:
+            histogram = self.histograms[name]
+            count = sum(histogram.values())
+            out[name] = {
+                'unit': unit,
+                'count': count,
+                'mean': self.sums[name] / count if count else None,
+                'max': self.maxima.get(name),
+                'buckets': [{'upper': 2 ** b, 'count': histogram[b]} for b in sorted(histogram)],
+            }
+        return out
+
+    def close(self):
+        if self.per_query:
+            self.outf.close()
+        else:
+            with open(self.fname, 'w') as outf:
+                json.dump(self.summary(), outf, indent=2)
+
+def measured_shortest_path_lengths(G, id_index, pairs, metrics, backend, index=None, fallback_backend='bibfs'):
+    """shortest path lengths for a list of Pair objects, answered one pair at a time so that the id lookup
+    time, traversal time and traversal work (see TraversalStats) of each pair can be recorded in metrics.
+    the grouped and msbfs backends then get no traversals to share"""
+    counted = is_counted(backend, fallback_backend)
+    sp_lengths = []
+    for pair in pairs:
+        start = timer()
+        source_vertex, target_vertex = id_index.lookup_many([pair.source_mag_id, pair.target_mag_id])
+        lookup_seconds = timer() - start
+        stats = TraversalStats()
+        start = timer()
+        sp_length = get_shortest_path_lengths_for_vertex_pairs(G, [source_vertex], [target_vertex], backend=backend, index=index, fallback_backend=fallback_backend, stats=stats)[0]
+        traversal_seconds = timer() - start
+        sp_lengths.append(sp_length)
+        status = get_status(sp_length)
+        metrics.record({
+            'source_id': pair.source_mag_id,
+            'target_id': pair.target_mag_id,
+            'status': status,
+            'length': int(sp_length) if status == STATUS_NAMES[STATUS_OK] else None,
+            'lookup_seconds': lookup_seconds,
+            'traversal_seconds': traversal_seconds,
+            'vertices_visited': stats.vertices_visited if counted else None,
+            'edges_scanned': stats.edges_scanned if counted else None,
+            'max_frontier': stats.max_frontier if counted else None,
+        })
+    return sp_lengths
@@ -0,0 +1,204 @@
+import sys, os, time, json, signal, asyncio, tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from timeit import default_timer as timer
+try:
+    from humanfriendly import format_timespan, format_size
+except ImportError:
+    def format_timespan(seconds):
+        return "{:.2f} seconds".format(seconds)
+    def format_size(num_bytes):
+        return "{} bytes".format(num_bytes)
+
+from pairs_file import Pair
+from calculate_shortest_paths_multiprocessing import init_worker, calculate_paths_for_chunk, get_shared_graph_fname
+from shortest_path_length_utils import BACKENDS, INDEX_BACKENDS
+
+import logging
+logging.basicConfig(format='%(asctime)s %(name)s.%(lineno)d %(levelname)s : %(message)s',
+        datefmt="%H:%M:%S",
+        level=logging.INFO)
+# logger = logging.getLogger(__name__)
+logger = logging.getLogger('__main__').getChild(__name__)
+
+# longest request line the server reads (asyncio's default of 64 KiB is about 5000 pairs)
+STREAM_LIMIT = 64 << 20
+
+class QueryServer(object):
+    """asyncio front end for shortest path queries (see query_client.QueryClient for the protocol).
+
+    requests that arrive within batch_window seconds of each other (up to max_batch_pairs pairs)
+    are coalesced into one batch, so pairs from different clients that share an endpoint share a
+    traversal. batches run on the worker processes of `executor`, at most max_in_flight at a time"""
+    def __init__(self, executor, options, max_in_flight, batch_window=0.005, max_batch_pairs=1000):
+        self.executor = executor
+        self.options = options
+        self.batch_window = batch_window
+        self.max_batch_pairs = max_batch_pairs
+        self.queue = asyncio.Queue()
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+        self.stats = {'requests': 0, 'pairs': 0, 'batches': 0, 'connections': 0}
+
+    async def handle_connection(self, reader, writer):
+        self.stats['connections'] += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError) as e:
+                    # the request line is longer than STREAM_LIMIT. the rest of it would not parse, so the connection ends here
+                    logger.debug("request too long: {}".format(e))
+                    writer.write(json.dumps({'error': "request longer than {} bytes: send fewer pairs per request".format(STREAM_LIMIT)}).encode('utf8') + b'\n')
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                try:
+                    response = await self.handle_request(json.loads(line.decode('utf8')))
+                except Exception as e:
+                    logger.debug("error in request: {}".format(e))
+                    response = {'error': str(e)}
+                writer.write(json.dumps(response).encode('utf8') + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, request):
+        if request.get('command') == 'stats':
+            return {'stats': dict(self.stats)}
+        if request.get('command') == 'options':
+            return {'options': dict(self.options)}
+        pairs = [Pair(None, str(source_id), None, str(target_id)) for source_id, target_id in request['pairs']]
+        self.stats['requests'] += 1
+        self.stats['pairs'] += len(pairs)
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((pairs, future))
+        return {'results': await future}
+
+    async def batcher(self):
+        """collect queued requests into batches and start each batch on a worker"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            num_pairs = len(batch[0][0])
+            deadline = loop.time() + self.batch_window
+            while num_pairs < self.max_batch_pairs:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                num_pairs += len(item[0])
+            await self.in_flight.acquire()
+            asyncio.ensure_future(self.run_batch(batch))
+
+    async def run_batch(self, batch):
+        try:
+            batch_idx = self.stats['batches']
+            self.stats['batches'] += 1
+            pairs = [pair for request_pairs, future in batch for pair in request_pairs]
+            _, results, _ = await asyncio.get_running_loop().run_in_executor(self.executor, calculate_paths_for_chunk, (batch_idx, pairs, self.options))
+            pos = 0
+            for request_pairs, future in batch:
+                if not future.done():
+                    future.set_result([list(values) for values in results[pos:pos+len(request_pairs)]])
+                pos += len(request_pairs)
+        except Exception as e:
+            for request_pairs, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self.in_flight.release()
+
+async def serve(executor, options, args):
+    # (created here, so its queue belongs to the running event loop)
+    server = QueryServer(executor, options, max_in_flight=args.processes, batch_window=args.batch_window / 1000.0, max_batch_pairs=args.max_batch_pairs)
+    if args.port:
+        listener = await asyncio.start_server(server.handle_connection, host='127.0.0.1', port=args.port, limit=STREAM_LIMIT)
+        logger.info("listening on 127.0.0.1:{}".format(args.port))
+    else:
+        listener = await asyncio.start_unix_server(server.handle_connection, path=args.socket, limit=STREAM_LIMIT)
+        logger.info("listening on {}".format(args.socket))
+    batcher = asyncio.ensure_future(server.batcher())
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    await stop.wait()
+    logger.info("shutting down. served {requests} requests ({pairs} pairs) in {batches} batches".format(**server.stats))
+    batcher.cancel()
+    listener.close()
+    await listener.wait_closed()
+
+def main(args):
+    graph_fname = os.path.abspath(args.graph)
+    start = timer()
+    logger.debug("preparing shared graph file from: {}...".format(graph_fname))
+    shared_graph_fname, created = get_shared_graph_fname(graph_fname, args.shm_dir)
+    logger.debug("done. workers will map {} ({}). took {}".format(shared_graph_fname, format_size(os.path.getsize(shared_graph_fname)), format_timespan(timer()-start)))
+    index_fname = os.path.abspath(args.index) if args.index else None
+    if ( index_fname is None ) and ( args.backend in INDEX_BACKENDS ):
+        raise RuntimeError("the {} backend needs a distance index (--index)".format(args.backend))
+    if args.bounds_only and args.backend != 'landmarks':
+        raise RuntimeError("--bounds-only needs the landmarks backend")
+    if not args.port:
+        args.socket = os.path.abspath(args.socket)
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+    options = {
+        'backend': args.backend,
+        'fallback_backend': args.fallback_backend,
+        'bounds_only': args.bounds_only,
+        'paths': False,
+        'count_paths': False
+    }
+
+    executor = ProcessPoolExecutor(max_workers=args.processes, initializer=init_worker, initargs=(shared_graph_fname, index_fname))
+    try:
+        # start the workers (each maps the graph as it starts) now, rather than on the first request
+        list(executor.map(time.sleep, [0.1] * args.processes))
+        logger.debug("started {} workers. took {}".format(args.processes, format_timespan(timer()-start)))
+        asyncio.run(serve(executor, options, args))
+    finally:
+        executor.shutdown()
+        if not args.port and os.path.exists(args.socket):
+            os.remove(args.socket)
+        if created and not args.keep_shared_graph:
+            logger.debug("removing shared graph file {}".format(shared_graph_fname))
+            os.remove(shared_graph_fname)
+
+if __name__ == "__main__":
+    total_start = timer()
+    logger = logging.getLogger(__name__)
+    logger.info(" ".join(sys.argv))
+    logger.info( '{:%Y-%m-%d %H:%M:%S}'.format(datetime.now()) )
+    import argparse
+    parser = argparse.ArgumentParser(description="load the graph once and serve shortest path length queries over a Unix socket (or localhost TCP), until interrupted. use with calculate_shortest_paths.py --server", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("graph", help="network graph (Pajek .net file or binary CSR file from convert_graph_to_csr.py)")
+    parser.add_argument("--socket", default=os.path.join(tempfile.gettempdir(), 'shortest_paths.sock'), help="path of the Unix socket to listen on")
+    parser.add_argument("--port", type=int, help="listen on this port of 127.0.0.1 instead of a Unix socket")
+    parser.add_argument("--processes", type=int, default=4, help="number of worker processes")
+    parser.add_argument("--batch-window", type=float, default=5.0, help="milliseconds to wait for more requests to batch with the first one")
+    parser.add_argument("--max-batch-pairs", type=int, default=1000, help="maximum number of pairs in a batch")
+    parser.add_argument("--backend", choices=[b for b in BACKENDS if b != 'igraph'], default='grouped', help="shortest path engine (see calculate_shortest_paths_multiprocessing.py)")
+    parser.add_argument("--fallback-backend", choices=['bibfs', 'grouped', 'msbfs'], default='bibfs', help="with --backend landmarks: backend for the pairs whose bounds differ. with --backend reduced: backend for the queries on the core graph")
+    parser.add_argument("--bounds-only", action='store_true', help="with --backend landmarks: answer with the lower and upper bounds instead of exact lengths")
+    parser.add_argument("--index", help="precomputed distance index file for the index backends")
+    parser.add_argument("--shm-dir", default='/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), help="directory for the shared binary CSR graph, if the graph is a Pajek file")
+    parser.add_argument("--keep-shared-graph", action='store_true', help="don't remove the shared graph file from --shm-dir at the end")
+    parser.add_argument("--debug", action='store_true', help="output debugging info")
+    global args
+    args = parser.parse_args()
+    if args.debug:
+        logger.setLevel(logging.DEBUG)
+        logger.debug('debug mode is on')
+    else:
+        logger.setLevel(logging.INFO)
+    main(args)
+    total_end = timer()
+    logger.info('all finished. total time: {}'.format(format_timespan(total_end-total_start)))
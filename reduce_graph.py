@@ -0,0 +1,64 @@
+import sys, os
+from datetime import datetime
+from timeit import default_timer as timer
+try:
+    from humanfriendly import format_timespan, format_size
+except ImportError:
+    def format_timespan(seconds):
+        return "{:.2f} seconds".format(seconds)
+    def format_size(num_bytes):
+        return "{} bytes".format(num_bytes)
+
+import numpy as np
+
+from graph_reduction import reduce_graph
+from shortest_path_length_utils import load_graph, as_csr_graph
+
+import logging
+logging.basicConfig(format='%(asctime)s %(name)s.%(lineno)d %(levelname)s : %(message)s',
+        datefmt="%H:%M:%S",
+        level=logging.INFO)
+# logger = logging.getLogger(__name__)
+logger = logging.getLogger('__main__').getChild(__name__)
+
+def main(args):
+    graph_fname = os.path.abspath(args.graph)
+    start = timer()
+    logger.debug("loading graph from file: {}...".format(graph_fname))
+    G = as_csr_graph(load_graph(graph_fname))
+    logger.debug("done loading graph. took {}".format(format_timespan(timer()-start)))
+
+    start = timer()
+    logger.debug("labeling components and peeling degree-1 trees...")
+    reduced = reduce_graph(G)
+    build_time = timer() - start
+
+    component_sizes = np.bincount(reduced.components)
+    num_peeled = G.num_vertices - reduced.core.num_vertices
+    logger.info("{} vertices in {} components (largest: {} vertices)".format(G.num_vertices, len(component_sizes), int(component_sizes.max()) if len(component_sizes) else 0))
+    logger.info("peeled {} vertices in degree-1 trees (max depth {}). core graph: {} vertices, {} edges (was {} edges)".format(num_peeled, int(reduced.depths.max()) if G.num_vertices else 0, reduced.core.num_vertices, reduced.core.num_adjacency_entries() // 2, G.num_adjacency_entries() // 2))
+
+    output_fname = os.path.abspath(args.output)
+    reduced.save(output_fname)
+    logger.info("reduced the graph in {}. file size: {}".format(format_timespan(build_time), format_size(os.path.getsize(output_fname))))
+
+if __name__ == "__main__":
+    total_start = timer()
+    logger = logging.getLogger(__name__)
+    logger.info(" ".join(sys.argv))
+    logger.info( '{:%Y-%m-%d %H:%M:%S}'.format(datetime.now()) )
+    import argparse
+    parser = argparse.ArgumentParser(description="label connected components and peel degree-1 trees off the graph, for queries with --backend reduced", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("graph", help="network graph (Pajek .net file or binary CSR file)")
+    parser.add_argument("output", help="output file for the reduced graph")
+    parser.add_argument("--debug", action='store_true', help="output debugging info")
+    global args
+    args = parser.parse_args()
+    if args.debug:
+        logger.setLevel(logging.DEBUG)
+        logger.debug('debug mode is on')
+    else:
+        logger.setLevel(logging.INFO)
+    main(args)
+    total_end = timer()
+    logger.info('all finished. total time: {}'.format(format_timespan(total_end-total_start)))
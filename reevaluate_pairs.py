@@ -0,0 +1,110 @@
+import sys, os
+from datetime import datetime
+from timeit import default_timer as timer
+try:
+    from humanfriendly import format_timespan
+except ImportError:
+    def format_timespan(seconds):
+        return "{:.2f} seconds".format(seconds)
+
+import numpy as np
+
+from pairs_file import read_pairs_by_index
+from result_store import create_result_file, load_results, encode_lengths, STATUS_PENDING
+from graph_delta import read_graph_delta, apply_graph_delta, find_affected_pairs
+from shortest_path_length_utils import load_graph, as_csr_graph, get_vertex_seq_ids_for_pairs, get_shortest_path_lengths_for_vertex_pairs, load_distance_index, BACKENDS, INDEX_BACKENDS
+
+import logging
+logging.basicConfig(format='%(asctime)s %(name)s.%(lineno)d %(levelname)s : %(message)s',
+        datefmt="%H:%M:%S",
+        level=logging.INFO)
+# logger = logging.getLogger(__name__)
+logger = logging.getLogger('__main__').getChild(__name__)
+
+def main(args):
+    graph_fname = os.path.abspath(args.graph)
+    start = timer()
+    logger.debug("loading graph from file: {}...".format(graph_fname))
+    G = as_csr_graph(load_graph(graph_fname))
+    G_new, changes = apply_graph_delta(G, read_graph_delta(os.path.abspath(args.delta)))
+    logger.info("applied delta: {}. took {}".format(changes.summary(), format_timespan(timer()-start)))
+    index = None
+    if args.index:
+        index = load_distance_index(os.path.abspath(args.index))
+        if getattr(index, 'num_vertices', G_new.num_vertices) != G_new.num_vertices:
+            raise RuntimeError("{} has {} vertices, but the new graph has {}. the index must be for the new graph (see apply_graph_delta.py --update-index)".format(args.index, index.num_vertices, G_new.num_vertices))
+    elif args.backend in INDEX_BACKENDS:
+        raise RuntimeError("the {} backend needs a distance index of the new graph (--index)".format(args.backend))
+
+    records = np.array(load_results(os.path.abspath(args.results)))
+    done = records['status'] != STATUS_PENDING
+    pairs = read_pairs_by_index(args.pairs, records['pair_idx'])
+    # (the vertex indices of the old vertices are the same in both graphs)
+    source_vertices, target_vertices, _ = get_vertex_seq_ids_for_pairs(G_new.id_index, pairs)
+
+    start = timer()
+    affected = find_affected_pairs(G, changes, source_vertices, target_vertices, records, max_exact_removals=args.max_exact_removals)
+    screen_time = timer() - start
+    positions = np.flatnonzero(affected)
+    logger.info("{} of {} done pairs may have a different length in the new graph. screening took {}".format(len(positions), int(done.sum()), format_timespan(screen_time)))
+
+    output_fname = os.path.abspath(args.output)
+    outf = create_result_file(output_fname, records['pair_idx'])
+    outf.records['length'] = records['length']
+    outf.records['status'] = records['status']
+    start = timer()
+    for batch_start in range(0, len(positions), args.batch_size):
+        batch = positions[batch_start:batch_start+args.batch_size]
+        sp_lengths = get_shortest_path_lengths_for_vertex_pairs(G_new, source_vertices[batch], target_vertices[batch], backend=args.backend, index=index, fallback_backend=args.fallback_backend)
+        for pos, sp_length in zip(batch.tolist(), sp_lengths):
+            outf.write(pos, [sp_length])
+    recompute_time = timer() - start
+    outf.close()
+
+    num_kept = int(done.sum()) - len(positions)
+    if len(positions):
+        # what recomputing every done pair would have cost, at the measured time per pair
+        full_time = recompute_time / len(positions) * int(done.sum())
+        logger.info("recomputed {} pairs in {}, kept {} ({:.1f}% of the done pairs). recomputing all of them would have taken about {}, so about {} was saved".format(
+            len(positions), format_timespan(recompute_time), num_kept, 100.0 * num_kept / max(1, int(done.sum())), format_timespan(full_time), format_timespan(max(0.0, full_time - recompute_time - screen_time))))
+    else:
+        logger.info("no pair can have changed. kept all {} done pairs".format(num_kept))
+    if args.verify:
+        logger.debug("recomputing all done pairs to verify...")
+        check = np.flatnonzero(done)
+        lengths, status = encode_lengths(get_shortest_path_lengths_for_vertex_pairs(G_new, source_vertices[check], target_vertices[check], backend=args.backend, index=index, fallback_backend=args.fallback_backend))
+        results = load_results(output_fname)[check]
+        mismatched = ( results['length'] != lengths ) | ( results['status'] != status )
+        if mismatched.any():
+            raise RuntimeError("{} kept pairs have a different length in the new graph".format(int(mismatched.sum())))
+        logger.info("verified: all {} done pairs match a full recomputation".format(len(check)))
+
+if __name__ == "__main__":
+    total_start = timer()
+    logger = logging.getLogger(__name__)
+    logger.info(" ".join(sys.argv))
+    logger.info( '{:%Y-%m-%d %H:%M:%S}'.format(datetime.now()) )
+    import argparse
+    parser = argparse.ArgumentParser(description="update a result file of the old snapshot for a graph delta: only the pairs whose shortest path length can have changed are recomputed on the new graph, and the rest are kept", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("graph", help="network graph of the old snapshot (Pajek .net file or binary CSR file)")
+    parser.add_argument("delta", help="graph delta file from the old snapshot to the new one (see graph_delta.py)")
+    parser.add_argument("pairs", help="tsv file with pairs samples")
+    parser.add_argument("results", help="result file (.npy) computed on the old snapshot")
+    parser.add_argument("-o", "--output", required=True, help="output result file (.npy) for the new snapshot, with the same pairs")
+    parser.add_argument("--backend", choices=[b for b in BACKENDS if b != 'igraph'], default='bibfs', help="shortest path engine for the recomputed pairs, on the new graph")
+    parser.add_argument("--fallback-backend", choices=['bibfs', 'grouped', 'msbfs'], default='bibfs', help="with --backend landmarks or reduced: backend for the exact queries")
+    parser.add_argument("--index", help="distance index of the new graph for the index backends (e.g. updated with apply_graph_delta.py --update-index)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="number of pairs recomputed at a time")
+    parser.add_argument("--max-exact-removals", type=int, default=32, help="with up to this many removed edges, pairs are screened against each removed edge (two BFSs per edge) rather than against all of them at once (one BFS, but more pairs recomputed)")
+    parser.add_argument("--verify", action='store_true', help="also recompute every done pair, and check that the kept ones did not change")
+    parser.add_argument("--debug", action='store_true', help="output debugging info")
+    global args
+    args = parser.parse_args()
+    if args.debug:
+        logger.setLevel(logging.DEBUG)
+        logger.debug('debug mode is on')
+    else:
+        logger.setLevel(logging.INFO)
+    main(args)
+    total_end = timer()
+    logger.info('all finished. total time: {}'.format(format_timespan(total_end-total_start)))
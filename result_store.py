@@ -0,0 +1,152 @@
+import os
+import numpy as np
+
+# result files: one .npy file per run, with one record per pair of the task (RESULT_DTYPE).
+# the file is created full size, with every row STATUS_PENDING, and rows are filled in as pairs are done,
+# so a run with a time budget can resume into the same file (see open_result_file_for_task)
+RESULT_DTYPE = np.dtype([('pair_idx', np.int64), ('length', np.int32), ('status', np.uint8)])
+
+# status of a result row. length is only meaningful for STATUS_OK (it is -1 otherwise)
+STATUS_OK = 0
+STATUS_UNREACHABLE = 1
+# one of the ids is not in the graph
+STATUS_MISSING = 2
+# not calculated yet
+STATUS_PENDING = 255
+
+def is_result_file(fname):
+    return fname.endswith('.npy')
+
+def encode_lengths(sp_lengths):
+    """(length, status) arrays for a list of shortest path lengths as the backends return them
+    (int, float('inf') for unreachable pairs, None for ids not in the graph)"""
+    lengths = np.full(len(sp_lengths), -1, dtype=np.int32)
+    status = np.full(len(sp_lengths), STATUS_OK, dtype=np.uint8)
+    for pos, sp_length in enumerate(sp_lengths):
+        if sp_length is None:
+            status[pos] = STATUS_MISSING
+        elif sp_length == float('inf'):
+            status[pos] = STATUS_UNREACHABLE
+        else:
+            lengths[pos] = sp_length
+    return lengths, status
+
+class ResultFile(object):
+    """a memory-mapped result file. row i holds the result of the task's i-th pair"""
+    def __init__(self, fname, records):
+        self.fname = fname
+        self.records = records
+
+    def __len__(self):
+        return len(self.records)
+
+    def write(self, pos, sp_lengths):
+        """store the shortest path lengths of rows pos, pos+1, ..."""
+        lengths, status = encode_lengths(sp_lengths)
+        self.records['length'][pos:pos+len(lengths)] = lengths
+        self.records['status'][pos:pos+len(status)] = status
+
+    def flush(self):
+        """make the rows written so far durable"""
+        self.records.flush()
+
+    def close(self):
+        self.records.flush()
+        self.records = None
+
+def create_result_file(fname, pair_indices):
+    """a new ResultFile for the pairs with the given indices in the pairs file, all of them STATUS_PENDING.
+    the file is built under a temporary name and renamed, so it is never seen half-initialized"""
+    tmp_fname = "{}.tmp{}".format(fname, os.getpid())
+    records = np.lib.format.open_memmap(tmp_fname, mode='w+', dtype=RESULT_DTYPE, shape=(len(pair_indices), ))
+    records['pair_idx'] = pair_indices
+    records['length'] = -1
+    records['status'] = STATUS_PENDING
+    records.flush()
+    del records
+    os.rename(tmp_fname, fname)
+    return ResultFile(fname, np.lib.format.open_memmap(fname, mode='r+'))
+
+def open_result_file_for_task(fname, pair_indices, checkpoint, task):
+    """open the result file of a task for writing, resuming it if checkpoint (or None) is for the same task.
+    pair_indices are the indices in the pairs file of all of the task's pairs.
+    returns (result_file, checkpoint) like checkpoint.open_output_for_task.
+    rows at or after checkpoint.next_idx are left as they are, to be overwritten"""
+    if checkpoint is not None and checkpoint.is_same_task(task) and os.path.exists(fname):
+        records = np.lib.format.open_memmap(fname, mode='r+')
+        if records.dtype == RESULT_DTYPE and np.array_equal(records['pair_idx'], pair_indices):
+            return ResultFile(fname, records), checkpoint
+        del records
+    return create_result_file(fname, pair_indices), task
+
+def load_results(fname):
+    """the records of a result file, memory-mapped"""
+    records = np.load(fname, mmap_mode='r')
+    if records.dtype != RESULT_DTYPE:
+        raise ValueError("{} is not a result file".format(fname))
+    return records
+
+class CategoryPairAggregator(object):
+    """per category pair distance histograms, accumulated one result file at a time.
+
+    groups are the category pairs of the pairs file (see pairs_file.PairsIndex). a pair that appears in
+    several result files (e.g. overlapping tasks) is counted once, from the first file it is done in.
+    counts[g, d] is the number of pairs of group g at distance d, and unreachable[g] / missing[g] / done[g]
+    the number of pairs of the group with STATUS_UNREACHABLE / STATUS_MISSING / any status but STATUS_PENDING"""
+    def __init__(self, pairs_index):
+        self.groups = pairs_index.groups
+        self.group_starts = np.array([g[0] for g in self.groups], dtype=np.int64)
+        self.group_ends = np.array([g[1] for g in self.groups], dtype=np.int64)
+        num_groups = len(self.groups)
+        self.counts = np.zeros((num_groups, 1), dtype=np.int64)
+        self.unreachable = np.zeros(num_groups, dtype=np.int64)
+        self.missing = np.zeros(num_groups, dtype=np.int64)
+        self.done = np.zeros(num_groups, dtype=np.int64)
+        self.seen = np.zeros(len(pairs_index), dtype=bool)
+        self.num_duplicates = 0
+        self.num_ungrouped = 0
+
+    def add(self, records):
+        """add the done rows of a result file's records"""
+        records = records[records['status'] != STATUS_PENDING]
+        pair_idx = np.asarray(records['pair_idx'])
+        _, first = np.unique(pair_idx, return_index=True)
+        keep = np.zeros(len(records), dtype=bool)
+        keep[first] = True
+        keep &= ~self.seen[pair_idx]
+        self.num_duplicates += len(records) - int(keep.sum())
+        records = records[keep]
+        pair_idx = pair_idx[keep]
+        self.seen[pair_idx] = True
+
+        group = np.searchsorted(self.group_starts, pair_idx, side='right') - 1
+        grouped = group >= 0
+        grouped[grouped] = pair_idx[grouped] < self.group_ends[group[grouped]]
+        self.num_ungrouped += len(records) - int(grouped.sum())
+        group = group[grouped]
+        status = np.asarray(records['status'])[grouped]
+        lengths = np.asarray(records['length'])[grouped]
+        num_groups = len(self.groups)
+        self.done += np.bincount(group, minlength=num_groups)
+        self.unreachable += np.bincount(group[status == STATUS_UNREACHABLE], minlength=num_groups)
+        self.missing += np.bincount(group[status == STATUS_MISSING], minlength=num_groups)
+        ok = status == STATUS_OK
+        if ok.any():
+            max_length = int(lengths[ok].max())
+            if max_length >= self.counts.shape[1]:
+                self.counts = np.concatenate([self.counts, np.zeros((num_groups, max_length + 1 - self.counts.shape[1]), dtype=np.int64)], axis=1)
+            np.add.at(self.counts, (group[ok], lengths[ok]), 1)
+
+    def summary(self, g):
+        """(mean, standard deviation, median, maximum) of the finite distances of group g (nan if there are none)"""
+        counts = self.counts[g]
+        n = counts.sum()
+        if n == 0:
+            return (float('nan'), ) * 4
+        distances = np.arange(len(counts))
+        mean = float((counts * distances).sum()) / n
+        std = float(np.sqrt((counts * (distances - mean) ** 2).sum() / n))
+        # the mean of the two middle distances if n is even, as pandas does
+        cumulative = np.cumsum(counts)
+        median = float(np.searchsorted(cumulative, [(n + 1) // 2, n // 2 + 1]).mean())
+        return mean, std, median, float(np.flatnonzero(counts).max())
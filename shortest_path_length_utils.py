@@ -1,22 +1,323 @@
+import sys, os
 import igraph
+import numpy as np
+
+from csr_graph import CSRGraph, csr_graph_from_igraph, igraph_id_attribute, parse_ids, is_csr_file, load_csr_graph
+from compressed_graph import is_compressed_file, load_compressed_graph
+from vertex_id_index import VertexIdIndex, load_vertex_id_index, get_id_index_fname
+from bidirectional_bfs import bidirectional_bfs_length, bidirectional_bfs_path
+from batch_bfs import bfs_lengths_to_targets, grouped_shortest_path_lengths
+from msbfs import msbfs_shortest_path_lengths
+from pruned_landmark_labeling import is_pll_file, load_distance_labels
+from landmarks import is_landmarks_file, load_landmarks
+from graph_reduction import is_reduction_file, load_reduced_graph
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+# 'igraph': G.shortest_paths on an igraph Graph
+# 'bibfs': bidirectional, direction-optimizing BFS on a CSRGraph
+# 'grouped': for batches of pairs, one early-terminating BFS per shared endpoint on a CSRGraph
+# 'msbfs': for batches of pairs, bit-parallel multi-source BFS from 64 endpoints per sweep on a CSRGraph
+# 'pll': label lookups in a pruned landmark labeling index (see build_distance_labels.py). needs `index`
+# 'landmarks': triangle-inequality bounds from landmark distance vectors (see build_landmarks.py). needs `index`.
+#   pairs whose bounds differ fall back to an exact query with `fallback_backend`
+# 'reduced': component labels and peeled degree-1 trees (see reduce_graph.py). needs `index`.
+#   the remaining pairs are answered on the much smaller core graph with `fallback_backend`
+BACKENDS = ['igraph', 'bibfs', 'grouped', 'msbfs', 'pll', 'landmarks', 'reduced']
+
+# backends that answer from a precomputed distance index instead of traversing the graph
+INDEX_BACKENDS = ['pll', 'landmarks', 'reduced']
 
 def load_graph(fname):
+    """load a Pajek .net file as an igraph Graph,
+    or memory-map a binary CSR file (see convert_graph_to_csr.py) as a CSRGraph,
+    or a compressed graph file (see compress_graph.py) as a CompressedGraph (which the BFS backends take like a CSRGraph)"""
+    if is_csr_file(fname):
+        return load_csr_graph(fname)
+    if is_compressed_file(fname):
+        return load_compressed_graph(fname)
     G = igraph.Graph.Read_Pajek(fname)
     return G
 
-def get_vertex_seq_id(G, original_id):
-    """gets the igraph vertex sequence id for a given node id"""
+def as_csr_graph(G):
+    """G as a CSRGraph (converting it if it is an igraph Graph).
+    the conversion is kept on the igraph Graph, so that per-pair queries on it convert it only once"""
+    if isinstance(G, CSRGraph):
+        return G
+    G_csr = getattr(G, '_csr_graph', None)
+    if G_csr is None:
+        G_csr = csr_graph_from_igraph(G)
+        G._csr_graph = G_csr
+    return G_csr
+
+def load_graph_for_backend(fname, backend, fallback_backend=None):
+    """load the graph in the representation the backend needs
+    (for 'landmarks', the one its fallback_backend needs)"""
+    if backend == 'landmarks':
+        backend = fallback_backend
+    G = load_graph(fname)
+    if backend == 'igraph':
+        if isinstance(G, CSRGraph):
+            raise ValueError("the igraph backend needs a Pajek file, but {} is a binary graph file".format(fname))
+    elif backend not in ('pll', 'reduced'):
+        # (the index backends only use the graph for its ids, so either representation will do)
+        G = as_csr_graph(G)
+    return G
+
+def get_original_ids(G):
+    """int64 array of the original network ids, indexed by vertex sequence id"""
+    if isinstance(G, CSRGraph):
+        return G.ids
+    id_attribute = igraph_id_attribute(G)
+    if id_attribute is None:
+        raise ValueError("the graph's vertices have no id or name attribute with the original network ids")
+    return parse_ids(G.vs[id_attribute])
+
+def load_id_index(graph_fname, G):
+    """id index for the graph in graph_fname (already loaded as G).
+
+    the index is saved next to the graph file the first time, and memory-mapped on later runs.
+    it is rebuilt if the graph file is newer than the saved index.
+    binary CSR files carry their own id index"""
+    if isinstance(G, CSRGraph) and G.id_index is not None:
+        return G.id_index
+    index_fname = get_id_index_fname(graph_fname)
+    if os.path.exists(index_fname) and os.path.getmtime(index_fname) >= os.path.getmtime(graph_fname):
+        return load_vertex_id_index(index_fname)
+    id_index = VertexIdIndex.from_ids(get_original_ids(G))
     try:
-        return G.vs.find(id=str(original_id)).index
+        id_index.save(index_fname)
+    except (IOError, OSError):
+        # e.g. read-only data directory. the index still works in memory
+        pass
+    return id_index
+
+def get_vertex_seq_id(G, original_id, id_index=None):
+    """gets the igraph vertex sequence id for a given node id.
+    uses a binary search if id_index (a VertexIdIndex) is given, otherwise scans all vertices"""
+    if id_index is None and isinstance(G, CSRGraph):
+        id_index = G.id_index
+    if id_index is not None:
+        return id_index.lookup(original_id)
+    if isinstance(G, CSRGraph):
+        try:
+            matches = np.flatnonzero(G.ids == int(original_id))
+        except ValueError:
+            return None
+        if len(matches) == 0:
+            return None
+        return int(matches[0])
+    id_attribute = igraph_id_attribute(G)
+    if id_attribute is None:
+        return None
+    try:
+        return G.vs.find(**{id_attribute: str(original_id)}).index
     except ValueError:
         return None
 
-def get_shortest_path_length_for_one_pair(G, source_id, target_id):
-    """source_id and target_id are the id in the original network"""
-    source_igraph_id = get_vertex_seq_id(G, source_id)
-    target_igraph_id = get_vertex_seq_id(G, target_id)
+def get_default_backend(G):
+    if isinstance(G, CSRGraph):
+        return 'bibfs'
+    return 'igraph'
+
+def load_distance_index(fname):
+    """load (memory-map) a precomputed distance index for the index backends"""
+    if is_pll_file(fname):
+        return load_distance_labels(fname)
+    if is_landmarks_file(fname):
+        return load_landmarks(fname)
+    if is_reduction_file(fname):
+        return load_reduced_graph(fname)
+    raise ValueError("{} is not a known distance index file".format(fname))
+
+def _check_index(backend, index):
+    if index is None:
+        raise ValueError("the {} backend needs a distance index".format(backend))
+
+def get_shortest_path_length_for_one_pair(G, source_id, target_id, backend=None, id_index=None, index=None, fallback_backend='bibfs'):
+    """source_id and target_id are the id in the original network.
+    backend is one of BACKENDS (by default, the one that fits the type of G).
+    index is the precomputed distance index, for backends in INDEX_BACKENDS.
+    fallback_backend answers the pairs the 'landmarks' backend cannot settle from its bounds,
+    and the core graph queries of the 'reduced' backend"""
+    source_igraph_id = get_vertex_seq_id(G, source_id, id_index=id_index)
+    target_igraph_id = get_vertex_seq_id(G, target_id, id_index=id_index)
     if ( source_igraph_id is None ) or ( target_igraph_id is None ):
         return None
-    else:
+    return get_shortest_path_length_for_vertices(G, source_igraph_id, target_igraph_id, backend=backend, index=index, fallback_backend=fallback_backend)
+
+def get_shortest_path_for_one_pair(G, source_id, target_id, count_paths=False, id_index=None):
+    """length, one shortest path and (if count_paths) the number of distinct shortest paths between two
+    ids of the original network, all from a single bidirectional BFS (see bidirectional_bfs_path).
+    an igraph Graph is converted to a CSRGraph first, so pass a CSRGraph when querying many pairs.
+    returns (length, path, num_paths), where path is the list of original ids from source to target
+    (None if there is no path). returns None if either id is not in the graph"""
+    source_igraph_id = get_vertex_seq_id(G, source_id, id_index=id_index)
+    target_igraph_id = get_vertex_seq_id(G, target_id, id_index=id_index)
+    if ( source_igraph_id is None ) or ( target_igraph_id is None ):
+        return None
+    return get_shortest_paths_for_vertex_pairs(G, [source_igraph_id], [target_igraph_id], count_paths=count_paths)[0]
+
+def get_shortest_path_length_for_vertices(G, source_igraph_id, target_igraph_id, backend=None, index=None, fallback_backend='bibfs', stats=None):
+    """like get_shortest_path_length_for_one_pair, but takes vertex sequence ids.
+    the BFS work of the 'bibfs' and 'grouped' backends is added to stats (a query_metrics.TraversalStats), if given"""
+    if backend is None:
+        backend = get_default_backend(G)
+    if backend in ('landmarks', 'reduced'):
+        return get_shortest_path_lengths_for_vertex_pairs(G, [source_igraph_id], [target_igraph_id], backend=backend, index=index, fallback_backend=fallback_backend, stats=stats)[0]
+    if backend == 'igraph':
+        if isinstance(G, CSRGraph):
+            raise ValueError("the igraph backend needs an igraph Graph, not a CSRGraph")
         sp_length = G.shortest_paths(source=source_igraph_id, target=target_igraph_id, mode='ALL')
         return sp_length[0][0]
+    elif backend == 'bibfs':
+        return bidirectional_bfs_length(as_csr_graph(G), source_igraph_id, target_igraph_id, stats=stats)
+    elif backend == 'grouped':
+        return bfs_lengths_to_targets(as_csr_graph(G), source_igraph_id, [target_igraph_id], stats=stats)[0]
+    elif backend == 'msbfs':
+        return msbfs_shortest_path_lengths(as_csr_graph(G), [source_igraph_id], [target_igraph_id])[0]
+    elif backend == 'pll':
+        _check_index(backend, index)
+        return index.query(source_igraph_id, target_igraph_id)
+    else:
+        raise ValueError("unknown backend: {}".format(backend))
+
+def _igraph_lengths_to_targets(G, source, targets):
+    # igraph does not accept duplicate targets
+    distinct_targets = sorted(set(targets))
+    sp_lengths = dict(zip(distinct_targets, G.shortest_paths(source=source, target=distinct_targets, mode='ALL')[0]))
+    return [sp_lengths[target] for target in targets]
+
+def get_landmark_bounds(index, source_vertices, target_vertices):
+    """lower and upper bounds from a LandmarkIndex for a batch of pairs of vertex sequence ids.
+    pairs with a vertex id of -1 (id not in the graph) get None for both"""
+    source_vertices = np.asarray(source_vertices, dtype=np.int64)
+    target_vertices = np.asarray(target_vertices, dtype=np.int64)
+    valid = (source_vertices >= 0) & (target_vertices >= 0)
+    lower = [None] * len(source_vertices)
+    upper = [None] * len(source_vertices)
+    valid_lower, valid_upper = index.bounds(source_vertices[valid], target_vertices[valid])
+    for pos, lo, up in zip(np.flatnonzero(valid), valid_lower, valid_upper):
+        lower[pos] = int(lo) if np.isfinite(lo) else float('inf')
+        upper[pos] = int(up) if np.isfinite(up) else float('inf')
+    return lower, upper
+
+def _landmark_lengths(G, index, source_vertices, target_vertices, fallback_backend, stats=None):
+    lower, upper = get_landmark_bounds(index, source_vertices, target_vertices)
+    sp_lengths = [lo if lo == up else None for lo, up in zip(lower, upper)]
+    unresolved = [pos for pos, lo in enumerate(lower) if ( lo is not None ) and ( sp_lengths[pos] is None )]
+    if unresolved:
+        exact = get_shortest_path_lengths_for_vertex_pairs(G,
+                                                           [source_vertices[pos] for pos in unresolved],
+                                                           [target_vertices[pos] for pos in unresolved],
+                                                           backend=fallback_backend, stats=stats)
+        for pos, sp_length in zip(unresolved, exact):
+            sp_lengths[pos] = sp_length
+    return sp_lengths
+
+def _reduced_lengths(index, source_vertices, target_vertices, fallback_backend, stats=None):
+    def core_lengths(core, core_sources, core_targets):
+        return get_shortest_path_lengths_for_vertex_pairs(core, core_sources, core_targets, backend=fallback_backend, stats=stats)
+    return index.shortest_path_lengths(source_vertices, target_vertices, core_lengths)
+
+def get_shortest_path_lengths_for_vertex_pairs(G, source_vertices, target_vertices, backend=None, index=None, fallback_backend='bibfs', stats=None):
+    """shortest path lengths for a batch of pairs of vertex sequence ids, in the same order as the pairs.
+    a vertex id of -1 (id not in the graph) gives None.
+
+    with the 'igraph' and 'grouped' backends, pairs are grouped by shared endpoint (in either
+    direction, since the lengths are undirected) and each group is served by one traversal.
+    'msbfs' advances the traversals of up to 64 groups together.
+    'landmarks' answers the pairs whose bounds agree, and sends the rest to fallback_backend.
+    'reduced' answers cross-component pairs and pairs within one peeled tree directly, and sends
+    the rest to fallback_backend on the core graph.
+    'bibfs' answers the pairs one at a time.
+    the BFS work of the 'bibfs' and 'grouped' backends (also as fallback_backend) is added to stats
+    (a query_metrics.TraversalStats), if given"""
+    if backend is None:
+        backend = get_default_backend(G)
+    if backend == 'igraph':
+        return grouped_shortest_path_lengths(G, source_vertices, target_vertices, traverse=_igraph_lengths_to_targets)
+    elif backend == 'grouped':
+        if stats is not None:
+            return grouped_shortest_path_lengths(as_csr_graph(G), source_vertices, target_vertices, traverse=lambda G, source, targets: bfs_lengths_to_targets(G, source, targets, stats=stats))
+        return grouped_shortest_path_lengths(as_csr_graph(G), source_vertices, target_vertices)
+    elif backend == 'msbfs':
+        return msbfs_shortest_path_lengths(as_csr_graph(G), source_vertices, target_vertices)
+    elif backend == 'pll':
+        _check_index(backend, index)
+        return index.query_many(source_vertices, target_vertices)
+    elif backend == 'landmarks':
+        _check_index(backend, index)
+        return _landmark_lengths(G, index, source_vertices, target_vertices, fallback_backend, stats=stats)
+    elif backend == 'reduced':
+        _check_index(backend, index)
+        return _reduced_lengths(index, source_vertices, target_vertices, fallback_backend, stats=stats)
+    sp_lengths = []
+    for source_vertex, target_vertex in zip(source_vertices, target_vertices):
+        if ( source_vertex < 0 ) or ( target_vertex < 0 ):
+            sp_lengths.append(None)
+        else:
+            sp_lengths.append(get_shortest_path_length_for_vertices(G, int(source_vertex), int(target_vertex), backend=backend, stats=stats))
+    return sp_lengths
+
+def get_shortest_paths_for_vertex_pairs(G, source_vertices, target_vertices, count_paths=False, stats=None):
+    """(length, path, num_paths) for a batch of pairs of vertex sequence ids, like get_shortest_path_for_one_pair,
+    with one bidirectional BFS per pair. a vertex id of -1 (id not in the graph) gives (None, None, None)"""
+    G = as_csr_graph(G)
+    results = []
+    for source_vertex, target_vertex in zip(source_vertices, target_vertices):
+        if ( source_vertex < 0 ) or ( target_vertex < 0 ):
+            results.append((None, None, None))
+            continue
+        sp_length, path, num_paths = bidirectional_bfs_path(G, int(source_vertex), int(target_vertex), count_paths=count_paths, stats=stats)
+        if ( path is not None ) and ( G.ids is not None ):
+            path = G.ids[path].tolist()
+        results.append((sp_length, path, num_paths))
+    return results
+
+def format_path(path):
+    """a path (list of ids) as one output column: the ids separated by commas. None if there is no path"""
+    if path is None:
+        return None
+    return ",".join(str(x) for x in path)
+
+def get_vertex_seq_ids_for_pairs(id_index, pairs):
+    """bulk id lookup for a list of Pair objects (with source_mag_id and target_mag_id).
+
+    returns (source_vertices, target_vertices, missing_ids): two int64 arrays of vertex sequence ids,
+    with -1 where the id is not in the graph, and the list of distinct ids not found"""
+    source_ids = [pair.source_mag_id for pair in pairs]
+    target_ids = [pair.target_mag_id for pair in pairs]
+    source_vertices = id_index.lookup_many(source_ids)
+    target_vertices = id_index.lookup_many(target_ids)
+    missing_ids = id_index.find_missing(source_ids + target_ids, vertex_indices=np.concatenate([source_vertices, target_vertices]))
+    return source_vertices, target_vertices, missing_ids
+
+def get_peak_rss(children=False):
+    """peak resident set size in bytes of this process
+    (or, with children=True, of the largest child process that has been waited for).
+    note that pages of memory-mapped files count towards RSS even though they are shared"""
+    if resource is None:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    maxrss = resource.getrusage(who).ru_maxrss
+    if sys.platform == 'darwin':
+        # bytes on macOS, kilobytes elsewhere
+        return maxrss
+    return maxrss * 1024
+
+def get_private_rss():
+    """resident memory in bytes of this process that is not backed by a file (so not shared
+    with other processes mapping the same graph). linux only, returns None elsewhere"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('RssAnon:'):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError):
+        pass
+    return None
@@ -0,0 +1,56 @@
+import os
+import numpy as np
+
+# sources and targets are drawn this many edges at a time, to bound the memory of the intermediate arrays
+_CHUNK_EDGES = 1 << 22
+
+def _power_law_weights(n, exponent):
+    """weights of n vertices whose expected degrees follow a power law with the given exponent (Chung-Lu),
+    largest first"""
+    return np.power(np.arange(1, n + 1, dtype=np.float64), -1.0 / (exponent - 1.0))
+
+def _draw(random_state, cumulative_weights, size):
+    """vertex indices drawn with probability proportional to the weights"""
+    return np.searchsorted(cumulative_weights, random_state.random_sample(size) * cumulative_weights[-1], side='right').astype(np.int32)
+
+def generate_citation_graph(num_vertices, num_edges, seed, in_exponent=2.5, out_exponent=3.5):
+    """a seeded random citation-like graph: (ids, sources, targets) like csr_graph.read_pajek_edges.
+
+    vertex v stands for the v-th oldest paper. the number of citations a paper gets follows a power law
+    with in_exponent (older papers are cited more), and the number of references it makes a milder
+    power law with out_exponent, independent of age. every arc points from the newer to the older paper.
+    self-loops are redrawn away, but there can be a few parallel arcs, as the
+    endpoints are drawn independently (the CSR conversion dedupes them).
+    ids are distinct shuffled integers, like the MAG ids of the real network"""
+    random_state = np.random.RandomState(seed)
+    cumulative_in = np.cumsum(_power_law_weights(num_vertices, in_exponent))
+    cumulative_out = np.cumsum(_power_law_weights(num_vertices, out_exponent)[random_state.permutation(num_vertices)])
+    sources = np.empty(num_edges, dtype=np.int32)
+    targets = np.empty(num_edges, dtype=np.int32)
+    done = 0
+    while done < num_edges:
+        size = min(_CHUNK_EDGES, num_edges - done)
+        u = _draw(random_state, cumulative_out, size)
+        v = _draw(random_state, cumulative_in, size)
+        keep = u != v
+        u = u[keep]
+        v = v[keep]
+        sources[done:done+len(u)] = np.maximum(u, v)
+        targets[done:done+len(u)] = np.minimum(u, v)
+        done += len(u)
+    ids = 1000000 + random_state.permutation(num_vertices).astype(np.int64) * 7
+    return ids, sources, targets
+
+def write_pajek(fname, ids, sources, targets):
+    """write a graph as a Pajek .net file with the ids as vertex labels and the edges as *Arcs
+    (vertex numbers are 1-based), the layout load_graph and csr_graph.read_pajek_edges read"""
+    tmp_fname = "{}.tmp{}".format(fname, os.getpid())
+    with open(tmp_fname, 'w') as outf:
+        outf.write("*Vertices {}\n".format(len(ids)))
+        for start in range(0, len(ids), _CHUNK_EDGES):
+            chunk = ids[start:start+_CHUNK_EDGES]
+            outf.write("".join('{} "{}"\n'.format(v, x) for v, x in zip(range(start + 1, start + len(chunk) + 1), chunk.tolist())))
+        outf.write("*Arcs\n")
+        for start in range(0, len(sources), _CHUNK_EDGES):
+            np.savetxt(outf, np.column_stack([sources[start:start+_CHUNK_EDGES], targets[start:start+_CHUNK_EDGES]]).astype(np.int64) + 1, fmt='%d')
+    os.rename(tmp_fname, fname)
@@ -0,0 +1,146 @@
+import math, heapq
+import numpy as np
+
+from checkpoint import get_checkpoint_fname, load_checkpoint
+from result_store import is_result_file, load_results, STATUS_PENDING
+from graph_reduction import connected_components
+
+# backends whose traversal from a source vertex is shared by all pairs with that source in a batch
+SHARED_TRAVERSAL_BACKENDS = ['igraph', 'grouped', 'msbfs']
+
+def read_completed_pairs(output_fnames, pairs=None):
+    """set of (source_arxiv_id, target_arxiv_id) that have a result row in any of the output files.
+    for an output with a checkpoint file, only the rows before the checkpoint count.
+    result files (.npy, see result_store.py) need the list of pairs of the pairs file they are for"""
+    completed = set()
+    for fname in output_fnames:
+        if is_result_file(fname):
+            records = load_results(fname)
+            for pair_idx in records['pair_idx'][records['status'] != STATUS_PENDING]:
+                completed.add((pairs[pair_idx].source_arxiv_id, pairs[pair_idx].target_arxiv_id))
+            continue
+        size = None
+        checkpoint = load_checkpoint(get_checkpoint_fname(fname))
+        if checkpoint is not None:
+            size = checkpoint.output_size
+        with open(fname, 'r') as f:
+            data = f.read() if size is None else f.read(size)
+        # a row without its newline was cut off while being written
+        for line in data.split('\n')[:-1]:
+            row = line.split('\t')
+            if len(row) >= 3:
+                completed.add((row[0], row[1]))
+    return completed
+
+def _ball_entries(degree, levels, branching):
+    """adjacency entries scanned by a BFS that expands `levels` levels from a vertex of the given degree"""
+    levels = np.maximum(levels, 0)
+    if branching <= 1.0:
+        return degree * levels
+    return degree * (np.power(branching, levels) - 1) / (branching - 1)
+
+def estimate_pair_costs(G, source_vertices, target_vertices, backend, components=None, landmarks=None, reduced=None, fallback_backend='bibfs'):
+    """estimated cost of each pair, as a fraction of one traversal of the whole CSRGraph G (0 to 1).
+
+    a quick probe of each pair: a traversal cannot leave the component it starts in, the
+    distance (from the landmark upper bound, or the typical distance in a graph with G's mean degree)
+    tells how many levels it has to expand, and the endpoint degrees how wide those levels start.
+    pairs the index backends answer without a traversal cost 0. vertex indices of -1 (not in the graph) cost 0"""
+    source_vertices = np.asarray(source_vertices, dtype=np.int64)
+    target_vertices = np.asarray(target_vertices, dtype=np.int64)
+    costs = np.zeros(len(source_vertices))
+    valid = (source_vertices >= 0) & (target_vertices >= 0)
+    if backend == 'pll' or not valid.any():
+        return costs
+    if reduced is not None:
+        components = reduced.components
+    elif components is None:
+        components = connected_components(G)
+    num_entries = max(G.num_adjacency_entries(), 1)
+    degrees = G.degrees().astype(np.float64)
+    component_entries = np.bincount(components, weights=degrees)
+
+    sources = source_vertices[valid]
+    targets = target_vertices[valid]
+    settled = np.zeros(len(sources), dtype=bool)
+    if landmarks is not None:
+        lower, upper = landmarks.bounds(sources, targets)
+    else:
+        lower = np.zeros(len(sources))
+        upper = np.full(len(sources), np.inf)
+    if backend == 'landmarks':
+        settled |= lower == upper
+    if backend == 'reduced':
+        settled |= components[sources] != components[targets]
+        if reduced is not None:
+            settled |= reduced.attachments[sources] == reduced.attachments[targets]
+    if backend in ('landmarks', 'reduced'):
+        backend = fallback_backend
+
+    branching = max(G.num_adjacency_entries() / max(G.num_vertices, 1), 1.0)
+    source_component = component_entries[components[sources]]
+    target_component = component_entries[components[targets]]
+    if backend == 'igraph':
+        # igraph's shortest_paths runs a full BFS of the source's component
+        pair_costs = source_component
+    else:
+        typical = math.log(max(G.num_vertices, 2)) / math.log(branching) if branching > 1.0 else float(G.num_vertices)
+        dist = np.where(np.isfinite(upper), upper, max(typical, 1.0))
+        if backend == 'bibfs':
+            # the two searches meet in the middle, and stop once the smaller component is exhausted
+            pair_costs = _ball_entries(degrees[sources], np.ceil(dist / 2), branching) + _ball_entries(degrees[targets], np.floor(dist / 2), branching)
+            pair_costs = np.minimum(pair_costs, np.minimum(source_component, target_component))
+        else:
+            pair_costs = np.minimum(_ball_entries(degrees[sources], dist, branching), source_component)
+    pair_costs = np.minimum(pair_costs / num_entries, 1.0)
+    pair_costs[settled] = 0.0
+    costs[valid] = pair_costs
+    return costs
+
+class PlannedTask(object):
+    """pair indices of one task (grouped by source), and its estimated run time in seconds"""
+    def __init__(self):
+        self.pair_indices = []
+        self.num_sources = 0
+        self.seconds = 0.0
+
+def group_by_source(pair_indices, source_vertices, costs, shared_traversal):
+    """groups of pairs with the same source vertex: a list of (cost, pair indices).
+    with a shared traversal, a group costs as much as its most costly pair, otherwise the sum"""
+    groups = {}
+    for pair_idx, source, cost in zip(pair_indices, source_vertices, costs):
+        group = groups.setdefault(int(source), [0.0, []])
+        group[0] = max(group[0], cost) if shared_traversal else group[0] + cost
+        group[1].append(int(pair_idx))
+    return [(cost, indices) for cost, indices in groups.values()]
+
+def pack_tasks(groups, target_seconds, load_seconds, traversal_seconds, pair_seconds):
+    """pack groups of pairs into as few tasks as fit target_seconds each, balancing the estimated times.
+
+    uses longest-processing-time-first: the most costly groups go first, each into the task with
+    the least estimated time so far. the number of tasks starts at the total estimated time over
+    target_seconds, and grows until every task fits (a group that is too costly on its own gets a task of its own)"""
+    capacity = target_seconds - load_seconds
+    if capacity <= 0:
+        raise ValueError("the target time per task must be longer than the time to load the graph")
+    group_seconds = [(cost * traversal_seconds + len(indices) * pair_seconds, indices) for cost, indices in groups]
+    group_seconds.sort(key=lambda g: -g[0])
+    total = sum(seconds for seconds, indices in group_seconds)
+    num_tasks = max(1, int(math.ceil(total / capacity)))
+    while True:
+        tasks = [PlannedTask() for _ in range(num_tasks)]
+        heap = [(0.0, i) for i in range(num_tasks)]
+        for seconds, indices in group_seconds:
+            task_seconds, i = heapq.heappop(heap)
+            tasks[i].pair_indices.extend(indices)
+            tasks[i].num_sources += 1
+            tasks[i].seconds = task_seconds + seconds
+            heapq.heappush(heap, (tasks[i].seconds, i))
+        overfull = [task for task in tasks if task.seconds > capacity and task.num_sources > 1]
+        if not overfull:
+            break
+        num_tasks += len(overfull)
+    tasks = [task for task in tasks if task.pair_indices]
+    for task in tasks:
+        task.seconds += load_seconds
+    return tasks
@@ -1,4 +1,4 @@
-import sys, os, time
+import sys, os
 from datetime import datetime
 from timeit import default_timer as timer
 try:
@@ -14,15 +14,7 @@ logging.basicConfig(format='%(asctime)s %(name)s.%(lineno)d %(levelname)s : %(me
 # logger = logging.getLogger(__name__)
 logger = logging.getLogger('__main__').getChild(__name__)
 
-import igraph
-
-def load_graph(fname):
-    G = igraph.Graph.Read_Pajek(fname)
-    return G
-
-def get_vertex_seq_id(G, original_id):
-    """gets the igraph vertex sequence id for a given node id"""
-    return G.vs.find(id=str(original_id)).index
+from shortest_path_length_utils import load_graph, as_csr_graph, get_shortest_path_for_one_pair
 
 
 def main(args):
@@ -30,26 +22,24 @@ def main(args):
     start = timer()
     logger.debug("loading graph from file: {}".format(fname))
     # G = load_graph(fname, delimiter=args.sep, directed=False, nodetype=int)
-    G = load_graph(fname)
+    G = as_csr_graph(load_graph(fname))
     logger.debug ("done. took {}".format(format_timespan(timer()-start)))
 
     start = timer()
-    logger.debug("getting shortest path length betweeen papers: {} -- {}".format(args.id1, args.id2))
-    igraph_id1 = get_vertex_seq_id(G, args.id1)
-    igraph_id2 = get_vertex_seq_id(G, args.id2)
-    logger.debug("the igraph vertex sequence ids for these papers are: {} -- {}".format(igraph_id1, igraph_id2))
-    sp_length = G.shortest_paths(source=igraph_id1, target=igraph_id2, mode='ALL')
-    # mode='ALL' means consider the graph as undirected
+    logger.debug("getting shortest path length and shortest path betweeen papers: {} -- {}".format(args.id1, args.id2))
+    # one bidirectional BFS gives the length, a path, and (with --count-paths) the number of shortest paths.
+    # the graph is considered as undirected
+    result = get_shortest_path_for_one_pair(G, args.id1, args.id2, count_paths=args.count_paths)
     logger.debug("done. took {}".format(format_timespan(timer()-start)))
+    if result is None:
+        print("Paper {} or {} is not in the graph".format(args.id1, args.id2))
+        return
+    sp_length, sp_path, num_paths = result
 
     print("Shortest path length between papers {} and {}: {}".format(args.id1, args.id2, sp_length))
-
-    start = timer()
-    logger.debug("getting shortest path betweeen papers: {} -- {}".format(args.id1, args.id2))
-    sp_path = G.get_shortest_paths(igraph_id1, igraph_id2, mode='ALL')
-    # mode='ALL' means consider the graph as undirected
-    logger.debug("done. took {}".format(format_timespan(timer()-start)))
     print("Shortest path between papers {} and {}: {}".format(args.id1, args.id2, sp_path))
+    if args.count_paths:
+        print("Number of shortest paths between papers {} and {}: {}".format(args.id1, args.id2, num_paths))
 
 if __name__ == "__main__":
     total_start = timer()
@@ -58,9 +48,10 @@ if __name__ == "__main__":
     logger.info( '{:%Y-%m-%d %H:%M:%S}'.format(datetime.now()) )
     import argparse
     parser = argparse.ArgumentParser(description="test shortest path length. takes as input the full network (as a pajek file), then the paper ids of two papers to find the shortest path length between")
-    parser.add_argument("input", help="file containing the network (.net pajek file)")
+    parser.add_argument("input", help="file containing the network (.net pajek file, or binary CSR file from convert_graph_to_csr.py)")
     parser.add_argument("id1", type=int, help="first paper id (integer)")
     parser.add_argument("id2", type=int, help="second paper id (integer)")
+    parser.add_argument("--count-paths", action='store_true', help="also count the distinct shortest paths (in the same traversal)")
     # parser.add_argument("--sep", default='\t', help="delimiter for the edgelist file (default: tab)")
     parser.add_argument("--debug", action='store_true', help="output debugging info")
     global args
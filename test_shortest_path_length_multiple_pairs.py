@@ -1,4 +1,4 @@
-import sys, os, time
+import sys, os
 from datetime import datetime
 from timeit import default_timer as timer
 try:
@@ -24,8 +24,10 @@ def load_graph(fname):
 
 def get_vertex_seq_id(G, original_id):
     """gets the igraph vertex sequence id for a given node id"""
+    # (newer versions of python-igraph read the Pajek vertex labels to `name` instead of `id`)
+    id_attribute = 'id' if 'id' in G.vs.attributes() else 'name'
     try:
-        return G.vs.find(id=str(original_id)).index
+        return G.vs.find(**{id_attribute: str(original_id)}).index
     except ValueError:
         return None
 
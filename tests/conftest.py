@@ -0,0 +1,70 @@
+import os, sys
+
+import numpy as np
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from csr_graph import read_pajek_edges, csr_graph_from_edges, save_csr_graph, load_csr_graph
+from shortest_path_length_utils import load_graph
+
+def write_random_pajek(fname, num_vertices, num_edges, seed):
+    """a seeded random citation-like graph as a Pajek file. every paper cites earlier ones, so some vertices
+    have no edges, and a pair drawn twice gives two parallel edges"""
+    random_state = np.random.RandomState(seed)
+    sources = random_state.randint(1, num_vertices, size=num_edges)
+    targets = (random_state.random_sample(num_edges) * sources).astype(np.int64)
+    ids = 1000000 + 7 * random_state.permutation(num_vertices)
+    with open(fname, 'w') as outf:
+        outf.write("*Vertices {}\n".format(num_vertices))
+        outf.write("".join('{} "{}"\n'.format(v + 1, x) for v, x in enumerate(ids.tolist())))
+        outf.write("*Arcs\n")
+        outf.write("".join("{} {}\n".format(u + 1, v + 1) for u, v in zip(sources.tolist(), targets.tolist())))
+
+def write_csr_file(pajek_fname, csr_fname):
+    ids, sources, targets = read_pajek_edges(pajek_fname)
+    save_csr_graph(csr_graph_from_edges(ids, sources, targets), csr_fname)
+
+class GraphFiles(object):
+    """a test graph as a Pajek file and a binary CSR file, loaded both ways,
+    with the igraph distances between all of its vertices as the reference"""
+    def __init__(self, pajek_fname, csr_fname):
+        self.pajek_fname = pajek_fname
+        self.csr_fname = csr_fname
+        self.igraph = load_graph(pajek_fname)
+        self.csr = load_csr_graph(csr_fname)
+        self.distances = np.array(self.igraph.distances(mode='all'), dtype=np.float64)
+
+    def sample_pairs(self, num_pairs, seed=0):
+        """random (source_vertices, target_vertices), including some pairs of a vertex with itself"""
+        random_state = np.random.RandomState(seed)
+        source_vertices = random_state.randint(self.csr.vcount(), size=num_pairs)
+        target_vertices = random_state.randint(self.csr.vcount(), size=num_pairs)
+        target_vertices[:3] = source_vertices[:3]
+        return source_vertices, target_vertices
+
+    def reference(self, source_vertices, target_vertices):
+        return self.distances[source_vertices, target_vertices].tolist()
+
+@pytest.fixture(scope='session')
+def testnetwork(tmp_path_factory):
+    """the small network of the repository (two components)"""
+    pajek_fname = os.path.join(REPO_DIR, 'testnetwork.net')
+    csr_fname = str(tmp_path_factory.mktemp('testnetwork') / 'testnetwork.csr')
+    write_csr_file(pajek_fname, csr_fname)
+    return GraphFiles(pajek_fname, csr_fname)
+
+@pytest.fixture(scope='session')
+def random_graph(tmp_path_factory):
+    """a seeded random graph with a few hundred vertices"""
+    graph_dir = tmp_path_factory.mktemp('random_graph')
+    pajek_fname = str(graph_dir / 'random.net')
+    csr_fname = str(graph_dir / 'random.csr')
+    write_random_pajek(pajek_fname, 300, 700, seed=7)
+    write_csr_file(pajek_fname, csr_fname)
+    return GraphFiles(pajek_fname, csr_fname)
+
+@pytest.fixture(params=['testnetwork', 'random_graph'])
+def graph(request):
+    return request.getfixturevalue(request.param)
@@ -0,0 +1,48 @@
+import pytest
+
+from shortest_path_length_utils import get_shortest_path_lengths_for_vertex_pairs, get_shortest_path_length_for_one_pair
+
+NUM_PAIRS = 400
+TRAVERSAL_BACKENDS = ['bibfs', 'grouped', 'msbfs']
+
+def test_igraph_backend(graph):
+    source_vertices, target_vertices = graph.sample_pairs(NUM_PAIRS)
+    sp_lengths = get_shortest_path_lengths_for_vertex_pairs(graph.igraph, source_vertices, target_vertices, backend='igraph')
+    assert sp_lengths == graph.reference(source_vertices, target_vertices)
+
+@pytest.mark.parametrize('backend', TRAVERSAL_BACKENDS)
+def test_traversal_backends(graph, backend):
+    source_vertices, target_vertices = graph.sample_pairs(NUM_PAIRS)
+    sp_lengths = get_shortest_path_lengths_for_vertex_pairs(graph.csr, source_vertices, target_vertices, backend=backend)
+    assert sp_lengths == graph.reference(source_vertices, target_vertices)
+    # the igraph Graph is converted to CSR for these backends
+    sp_lengths = get_shortest_path_lengths_for_vertex_pairs(graph.igraph, source_vertices, target_vertices, backend=backend)
+    assert sp_lengths == graph.reference(source_vertices, target_vertices)
+
+def test_msbfs_workspace_is_reset(graph):
+    # one-pair queries stop their sweep early, and later sweeps reuse the bitsets it left behind
+    G = graph.csr
+    source_vertices, target_vertices = graph.sample_pairs(40)
+    sp_lengths = [get_shortest_path_lengths_for_vertex_pairs(G, [s], [t], backend='msbfs')[0] for s, t in zip(source_vertices, target_vertices)]
+    assert sp_lengths == graph.reference(source_vertices, target_vertices)
+    assert not G.get_bitset_workspace(1).any()
+    sp_lengths = get_shortest_path_lengths_for_vertex_pairs(G, source_vertices, target_vertices, backend='msbfs')
+    assert sp_lengths == graph.reference(source_vertices, target_vertices)
+    assert not G.get_bitset_workspace(1).any()
+
+@pytest.mark.parametrize('backend', ['igraph'] + TRAVERSAL_BACKENDS)
+def test_missing_vertices(testnetwork, backend):
+    G = testnetwork.igraph if backend == 'igraph' else testnetwork.csr
+    assert get_shortest_path_lengths_for_vertex_pairs(G, [-1, 0, -1], [0, -1, -1], backend=backend) == [None, None, None]
+
+def test_one_pair_by_original_id(testnetwork):
+    G = testnetwork.csr
+    source_vertices, target_vertices = testnetwork.sample_pairs(20)
+    for source_vertex, target_vertex in zip(source_vertices, target_vertices):
+        expected = testnetwork.distances[source_vertex, target_vertex]
+        source_id, target_id = int(G.ids[source_vertex]), int(G.ids[target_vertex])
+        assert get_shortest_path_length_for_one_pair(testnetwork.igraph, source_id, target_id) == expected
+        assert get_shortest_path_length_for_one_pair(G, source_id, target_id) == expected
+    missing_id = int(G.ids.max()) + 1
+    assert get_shortest_path_length_for_one_pair(G, missing_id, int(G.ids[0])) is None
+    assert get_shortest_path_length_for_one_pair(testnetwork.igraph, missing_id, int(G.ids[0])) is None
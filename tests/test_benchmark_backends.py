@@ -0,0 +1,11 @@
+from benchmark_backends import measure_processes
+from pairs_file import Pair
+
+def test_measure_processes(random_graph):
+    G = random_graph.csr
+    source_vertices, target_vertices = random_graph.sample_pairs(200)
+    pairs = [Pair(None, str(G.ids[s]), None, str(G.ids[t])) for s, t in zip(source_vertices, target_vertices)]
+    graph_info = {'edges': G.num_adjacency_entries() // 2, 'csr': random_graph.csr_fname, 'indexes': {}}
+    result = measure_processes(graph_info, 'grouped', 2, pairs, 50, 'bibfs')
+    assert result['batch_pairs'] == len(source_vertices)
+    assert result['pairs_per_second'] > 0
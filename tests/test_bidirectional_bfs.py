@@ -0,0 +1,34 @@
+from bidirectional_bfs import bidirectional_bfs_length
+from shortest_path_length_utils import get_shortest_paths_for_vertex_pairs
+
+def test_bidirectional_bfs_length(graph):
+    source_vertices, target_vertices = graph.sample_pairs(400)
+    sp_lengths = [bidirectional_bfs_length(graph.csr, int(s), int(t)) for s, t in zip(source_vertices, target_vertices)]
+    assert sp_lengths == graph.reference(source_vertices, target_vertices)
+
+def test_workspace_is_reset(testnetwork):
+    # the same searches in reverse order, on the workspace the first ones left behind
+    source_vertices, target_vertices = testnetwork.sample_pairs(100)
+    first = [bidirectional_bfs_length(testnetwork.csr, int(s), int(t)) for s, t in zip(source_vertices, target_vertices)]
+    second = [bidirectional_bfs_length(testnetwork.csr, int(t), int(s)) for s, t in zip(source_vertices[::-1], target_vertices[::-1])]
+    assert second == first[::-1]
+
+def test_paths_and_path_counts(graph):
+    G = graph.igraph
+    source_vertices, target_vertices = graph.sample_pairs(60)
+    expected = graph.reference(source_vertices, target_vertices)
+    results = get_shortest_paths_for_vertex_pairs(graph.csr, source_vertices, target_vertices, count_paths=True)
+    for source_vertex, target_vertex, sp_length, (length, path, num_paths) in zip(source_vertices, target_vertices, expected, results):
+        assert length == sp_length
+        if sp_length == float('inf'):
+            assert path is None
+            assert not num_paths
+            continue
+        vertices = [graph.csr.id_index.lookup(x) for x in path]
+        assert vertices[0] == source_vertex and vertices[-1] == target_vertex
+        assert len(vertices) == sp_length + 1
+        for u, v in zip(vertices, vertices[1:]):
+            assert G.get_eid(u, v, directed=False, error=False) >= 0
+        # (igraph lists a path once per parallel edge, as for two papers citing each other)
+        all_paths = G.get_all_shortest_paths(int(source_vertex), to=int(target_vertex), mode='all')
+        assert num_paths == len(set(tuple(p) for p in all_paths))
@@ -0,0 +1,44 @@
+import os, sys, subprocess
+
+import pytest
+
+from conftest import REPO_DIR
+
+def write_pairs(G, source_vertices, target_vertices, fname):
+    with open(fname, 'w') as outf:
+        outf.write("".join("a{}\t{}\ta{}\t{}\n".format(s, G.ids[s], t, G.ids[t]) for s, t in zip(source_vertices, target_vertices)))
+
+@pytest.mark.parametrize('backend', ['igraph', 'grouped'])
+def test_output_in_pairs_order(random_graph, tmp_path, backend):
+    G = random_graph.csr
+    source_vertices, target_vertices = random_graph.sample_pairs(100)
+    pairs_fname = str(tmp_path / 'pairs.tsv')
+    write_pairs(G, source_vertices, target_vertices, pairs_fname)
+    out_fname = str(tmp_path / 'out.tsv')
+    subprocess.check_call([sys.executable, os.path.join(REPO_DIR, 'calculate_shortest_paths_multiprocessing.py'), random_graph.pajek_fname, pairs_fname,
+                           '--out', out_fname, '--start', '10', '--num', '30', '--processes', '2', '--chunk-size', '7', '--backend', backend, '--shm-dir', str(tmp_path)])
+    with open(out_fname) as f:
+        rows = [line.rstrip('\n').split('\t') for line in f]
+    assert [row[:2] for row in rows] == [['a{}'.format(s), 'a{}'.format(t)] for s, t in zip(source_vertices[10:70], target_vertices[10:70])]
+    assert [float(row[2]) for row in rows] == random_graph.reference(source_vertices[10:70], target_vertices[10:70])
+    # the shared graph file is removed at the end
+    assert not os.path.exists(str(tmp_path / 'random.net.csr'))
+
+@pytest.mark.parametrize('backend', ['igraph', 'grouped'])
+def test_one_output_file_per_process(random_graph, tmp_path, backend):
+    # the invocation of the original per-node script: --num pairs per process, one output file each in --outdir
+    G = random_graph.csr
+    source_vertices, target_vertices = random_graph.sample_pairs(100)
+    pairs_fname = str(tmp_path / 'pairs.tsv')
+    write_pairs(G, source_vertices, target_vertices, pairs_fname)
+    outdir = tmp_path / 'output'
+    outdir.mkdir()
+    subprocess.check_call([sys.executable, os.path.join(REPO_DIR, 'calculate_shortest_paths_multiprocessing.py'), random_graph.pajek_fname, pairs_fname,
+                           '-o', str(outdir), '--start', '10', '--num', '30', '--processes', '2', '--chunk-size', '7', '--backend', backend, '--shm-dir', str(tmp_path)])
+    expected = random_graph.reference(source_vertices, target_vertices)
+    for first_idx in [10, 40]:
+        with open(str(outdir / 'shortest_path_lengths_samples_{}-{}.tsv'.format(first_idx, first_idx + 30))) as f:
+            rows = [line.rstrip('\n').split('\t') for line in f]
+        assert [row[:2] for row in rows] == [['a{}'.format(s), 'a{}'.format(t)] for s, t in zip(source_vertices[first_idx:first_idx+30], target_vertices[first_idx:first_idx+30])]
+        assert [float(row[2]) for row in rows] == expected[first_idx:first_idx+30]
+    assert sorted(os.listdir(str(outdir))) == ['shortest_path_lengths_samples_10-40.tsv', 'shortest_path_lengths_samples_40-70.tsv']
@@ -0,0 +1,38 @@
+from checkpoint import Checkpoint, TimeBudget, open_output_for_task, commit_rows, load_checkpoint, get_checkpoint_fname
+
+def test_resume_cuts_rows_after_the_checkpoint(tmp_path):
+    output_fname = str(tmp_path / 'out.tsv')
+    task = Checkpoint('pairs.tsv', 0, 4)
+    outf, checkpoint = open_output_for_task(output_fname, task)
+    outf.write("row0\nrow1\n")
+    commit_rows(outf, checkpoint, output_fname, 2)
+    # rows of a run killed before its next checkpoint
+    outf.write("row2\n")
+    outf.close()
+
+    outf, checkpoint = open_output_for_task(output_fname, Checkpoint('pairs.tsv', 0, 4))
+    assert checkpoint.next_idx == 2 and not checkpoint.complete
+    outf.write("row2\nrow3\n")
+    commit_rows(outf, checkpoint, output_fname, 4)
+    outf.close()
+    assert open(output_fname).read() == "row0\nrow1\nrow2\nrow3\n"
+    assert load_checkpoint(get_checkpoint_fname(output_fname)).complete
+
+    # a different task starts over
+    outf, checkpoint = open_output_for_task(output_fname, Checkpoint('pairs.tsv', 4, 8))
+    outf.close()
+    assert checkpoint.next_idx == 4
+    assert open(output_fname).read() == ""
+
+def test_time_budget():
+    budget = TimeBudget(100.0, start_time=0.0, margin=10.0, safety_factor=2.0)
+    budget.remaining = lambda: 50.0
+    assert budget.next_batch_size(1000) == 1
+    budget.record(10, 1.0)
+    # 40 usable seconds at 0.1 seconds per pair, twice over
+    assert budget.next_batch_size(1000) == 200
+    assert budget.next_batch_size(50) == 50
+    budget.record(1, 1.0)
+    assert budget.next_batch_size(1000) == 20
+    budget.remaining = lambda: 5.0
+    assert budget.next_batch_size(1000) == 0
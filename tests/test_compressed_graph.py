@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+
+from compressed_graph import ORDERS, compress_csr_graph, load_compressed_graph
+from shortest_path_length_utils import get_shortest_path_lengths_for_vertex_pairs
+
+@pytest.mark.parametrize('order', ORDERS)
+@pytest.mark.parametrize('block_size', [1, 5])
+def test_compressed_graph(graph, tmp_path, order, block_size):
+    fname = str(tmp_path / 'graph.cmp')
+    compress_csr_graph(graph.csr, fname, order=order, block_size=block_size, chunk_size=64)
+    C = load_compressed_graph(fname)
+    assert C.num_vertices == graph.csr.num_vertices
+    assert C.fingerprint(chunk_vertices=7) == graph.csr.fingerprint()
+    for v in range(C.num_vertices):
+        frontier = np.array([v], dtype=np.int64)
+        assert sorted(C.expand(frontier).tolist()) == sorted(graph.csr.expand(frontier).tolist())
+    source_vertices, target_vertices = graph.sample_pairs(400)
+    expected = graph.reference(source_vertices, target_vertices)
+    for backend in ['bibfs', 'grouped', 'msbfs']:
+        assert get_shortest_path_lengths_for_vertex_pairs(C, source_vertices, target_vertices, backend=backend) == expected, backend
@@ -0,0 +1,33 @@
+import numpy as np
+
+from csr_graph import csr_graph_from_igraph, is_csr_file, load_csr_graph, read_edgelist, csr_graph_from_edges, save_csr_graph
+
+def neighbor_sets(G):
+    return [sorted(G.neighbors_of(v).tolist()) for v in range(G.vcount())]
+
+def test_csr_file_matches_igraph(graph):
+    G = graph.csr
+    assert is_csr_file(graph.csr_fname)
+    assert not is_csr_file(graph.pajek_fname)
+    assert G.vcount() == graph.igraph.vcount()
+    assert neighbor_sets(G) == neighbor_sets(csr_graph_from_igraph(graph.igraph))
+    assert G.ids.tolist() == [int(x) for x in graph.igraph.vs['name']]
+    assert G.id_index.lookup_many(G.ids).tolist() == list(range(G.vcount()))
+
+def test_edgelist(tmp_path, testnetwork):
+    G = testnetwork.csr
+    sources = np.repeat(np.arange(G.vcount()), np.diff(G.offsets))
+    edgelist_fname = str(tmp_path / 'edges.txt')
+    with open(edgelist_fname, 'w') as outf:
+        outf.write("# source target\n")
+        outf.write("".join("{} {}\n".format(G.ids[u], G.ids[v]) for u, v in zip(sources, G.neighbors) if u < v))
+    ids, edge_sources, edge_targets = read_edgelist(edgelist_fname)
+    csr_fname = str(tmp_path / 'edges.csr')
+    save_csr_graph(csr_graph_from_edges(ids, edge_sources, edge_targets), csr_fname)
+    H = load_csr_graph(csr_fname)
+    # vertices without edges are not in an edge list
+    connected = np.flatnonzero(np.diff(G.offsets) > 0)
+    assert sorted(H.ids.tolist()) == sorted(G.ids[connected].tolist())
+    for v in connected:
+        w = H.id_index.lookup(G.ids[v])
+        assert sorted(H.ids[H.neighbors_of(w)].tolist()) == sorted(G.ids[G.neighbors_of(v)].tolist())
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from csr_graph import read_pajek_edges, csr_graph_from_edges
+from distance_cache import DistanceCache, SourceDistanceCache, cached_shortest_path_lengths
+from shortest_path_length_utils import get_shortest_path_lengths_for_vertex_pairs
+
+def test_hits_only_from_earlier_lookups(random_graph, tmp_path):
+    G = random_graph.csr
+    # every pair shares its source, so the source cache runs one BFS for all of them
+    target_vertices = np.arange(1, 101)
+    source_vertices = np.zeros(len(target_vertices), dtype=np.int64)
+    source_ids, target_ids = G.ids[source_vertices], G.ids[target_vertices]
+    expected = random_graph.reference(source_vertices, target_vertices)
+    compute = lambda s, t: get_shortest_path_lengths_for_vertex_pairs(G, s, t, backend='bibfs')
+
+    source_cache = SourceDistanceCache(1 << 20, min_uses=2)
+    sp_lengths = cached_shortest_path_lengths(G, source_ids, target_ids, source_vertices, target_vertices, compute, source_cache=source_cache)
+    assert sp_lengths == expected
+    assert (source_cache.lookups, source_cache.hits, source_cache.num_bfs, source_cache.bfs_answered) == (100, 0, 1, 100)
+    sp_lengths = cached_shortest_path_lengths(G, source_ids, target_ids, source_vertices, target_vertices, compute, source_cache=source_cache)
+    assert sp_lengths == expected
+    assert (source_cache.lookups, source_cache.hits, source_cache.num_bfs, source_cache.bfs_answered) == (200, 100, 1, 100)
+
+    cache = DistanceCache(str(tmp_path / 'cache.sqlite'), G.fingerprint())
+    cached_shortest_path_lengths(G, source_ids, target_ids, source_vertices, target_vertices, compute, cache=cache)
+    assert (cache.lookups, cache.hits) == (100, 0)
+    sp_lengths = cached_shortest_path_lengths(G, source_ids, target_ids, source_vertices, target_vertices, compute, cache=cache)
+    assert sp_lengths == expected
+    assert (cache.lookups, cache.hits) == (200, 100)
+    cache.close()
+
+def test_refuses_other_graphs(random_graph, testnetwork, tmp_path):
+    cache_fname = str(tmp_path / 'cache.sqlite')
+    DistanceCache(cache_fname, random_graph.csr.fingerprint()).close()
+    # the same graph, loaded from its Pajek file
+    DistanceCache(cache_fname, csr_graph_from_edges(*read_pajek_edges(random_graph.pajek_fname)).fingerprint()).close()
+    with pytest.raises(ValueError):
+        DistanceCache(cache_fname, testnetwork.csr.fingerprint())
+    # the same vertices, with one more edge
+    G = random_graph.csr
+    ids, sources, targets = read_pajek_edges(random_graph.pajek_fname)
+    v = next(v for v in range(1, G.num_vertices) if v not in set(G.neighbors_of(0).tolist()))
+    H = csr_graph_from_edges(ids, np.append(sources, 0), np.append(targets, v))
+    assert (H.num_vertices, H.num_adjacency_entries()) == (G.num_vertices, G.num_adjacency_entries() + 2)
+    with pytest.raises(ValueError):
+        DistanceCache(cache_fname, H.fingerprint())
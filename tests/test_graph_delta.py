@@ -0,0 +1,91 @@
+import argparse
+
+import igraph
+import numpy as np
+import pytest
+
+import apply_graph_delta as apply_graph_delta_script
+import landmarks
+import pruned_landmark_labeling
+from graph_delta import GraphDelta, apply_graph_delta, find_affected_pairs
+from result_store import RESULT_DTYPE, encode_lengths
+
+def bfs_reference(G):
+    """igraph distances between all vertices of the CSRGraph G"""
+    sources = np.repeat(np.arange(G.num_vertices), np.diff(G.offsets))
+    edges = np.column_stack([sources, G.neighbors])
+    edges = edges[edges[:, 0] < edges[:, 1]]
+    H = igraph.Graph(n=G.num_vertices, edges=edges.tolist())
+    return np.array(H.distances(), dtype=np.float64)
+
+def random_delta(G, seed, num_added_edges, num_removed_edges=0, num_removed_vertices=0):
+    """a GraphDelta in original ids: random new edges, three new vertices (one of them isolated), and
+    optionally random removed edges and vertices"""
+    random_state = np.random.RandomState(seed)
+    first_new_id = int(G.ids.max()) + 1
+    added_vertices = np.arange(first_new_id, first_new_id + 3, dtype=np.int64)
+    added_edges = G.ids[random_state.randint(G.num_vertices, size=(num_added_edges, 2))]
+    added_edges = np.vstack([added_edges, [[added_vertices[0], G.ids[0]], [added_vertices[1], added_vertices[0]]]])
+    sources = np.repeat(np.arange(G.num_vertices), np.diff(G.offsets))
+    removed = random_state.choice(len(sources), size=num_removed_edges, replace=False)
+    removed_edges = G.ids[np.column_stack([sources[removed], G.neighbors[removed]])]
+    removed_vertices = G.ids[random_state.choice(G.num_vertices, size=num_removed_vertices, replace=False)]
+    return GraphDelta(added_vertices, removed_vertices, added_edges.astype(np.int64), removed_edges.astype(np.int64).reshape(-1, 2))
+
+def test_insert_edges_into_indexes(graph):
+    G = graph.csr
+    labels = pruned_landmark_labeling.build_distance_labels(G)
+    index = landmarks.build_landmark_index(G, 4)
+    G_new, changes = apply_graph_delta(G, random_delta(G, seed=1, num_added_edges=15))
+    assert changes.insertions_only()
+    assert G_new.num_vertices == G.num_vertices + 3
+    expected = bfs_reference(G_new)
+
+    labels, _, _ = pruned_landmark_labeling.insert_edges(labels, G_new, changes.inserted_edges)
+    source_vertices, target_vertices = np.divmod(np.arange(G_new.num_vertices ** 2), G_new.num_vertices)
+    assert labels.query_many(source_vertices, target_vertices) == expected[source_vertices, target_vertices].tolist()
+
+    index = landmarks.insert_edges(index, G_new, changes.inserted_edges)
+    for k, landmark in enumerate(index.landmarks):
+        assert (index.dists[:, k] == landmarks.bfs_distances(G_new, landmark)).all()
+
+@pytest.mark.parametrize('max_exact_removals', [0, 32])
+def test_unaffected_pairs_keep_their_length(graph, max_exact_removals):
+    G = graph.csr
+    source_vertices, target_vertices = graph.sample_pairs(2000)
+    source_ids, target_ids = G.ids[source_vertices], G.ids[target_vertices]
+    records = np.zeros(len(source_vertices), dtype=RESULT_DTYPE)
+    records['pair_idx'] = np.arange(len(records))
+    records['length'], records['status'] = encode_lengths(graph.reference(source_vertices, target_vertices))
+
+    delta = random_delta(G, seed=2, num_added_edges=3, num_removed_edges=4, num_removed_vertices=1)
+    G_new, changes = apply_graph_delta(G, delta)
+    new_source_vertices = G_new.id_index.lookup_many(source_ids)
+    new_target_vertices = G_new.id_index.lookup_many(target_ids)
+    affected = find_affected_pairs(G, changes, new_source_vertices, new_target_vertices, records, max_exact_removals=max_exact_removals)
+
+    distances = bfs_reference(G_new)
+    in_new = (new_source_vertices >= 0) & (new_target_vertices >= 0)
+    new_lengths = [distances[s, t] if valid else None for s, t, valid in zip(new_source_vertices, new_target_vertices, in_new)]
+    lengths, status = encode_lengths(new_lengths)
+    assert (lengths[~affected] == records['length'][~affected]).all()
+    assert (status[~affected] == records['status'][~affected]).all()
+    assert affected.any() and not affected.all()
+
+def test_apply_graph_delta_checks_before_writing(random_graph, tmp_path):
+    G = random_graph.csr
+    index_fname = str(tmp_path / 'old.pll')
+    pruned_landmark_labeling.build_distance_labels(G).save(index_fname)
+    delta_fname = str(tmp_path / 'delta.txt')
+    with open(delta_fname, 'w') as f:
+        f.write('+e {} {}\n-e {} {}\n'.format(G.ids[0], G.ids[5], G.ids[0], G.ids[G.neighbors[G.offsets[0]]]))
+    output_fname = tmp_path / 'new.csr'
+    args = argparse.Namespace(graph=random_graph.csr_fname, delta=delta_fname, output=str(output_fname),
+            update_index=[[index_fname, str(tmp_path / 'new.pll')]])
+    with pytest.raises(RuntimeError, match='removes edges'):
+        apply_graph_delta_script.main(args)
+    assert not output_fname.exists()
+    args.update_index = [[delta_fname, str(tmp_path / 'new.pll')]]
+    with pytest.raises(RuntimeError, match='cannot be updated'):
+        apply_graph_delta_script.main(args)
+    assert not output_fname.exists()
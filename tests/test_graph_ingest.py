@@ -0,0 +1,37 @@
+import pytest
+
+from csr_graph import convert_to_csr_file
+from graph_ingest import ingest_to_csr_file
+
+def read_bytes(fname):
+    with open(fname, 'rb') as f:
+        return f.read()
+
+def write_edgelist(pajek_fname, edgelist_fname):
+    """the arcs of a Pajek file as an edge list of original ids"""
+    ids = {}
+    with open(pajek_fname) as inf, open(edgelist_fname, 'w') as outf:
+        section = None
+        for line in inf:
+            if line.startswith('*'):
+                section = line.split()[0].lower()
+                continue
+            parts = line.split()
+            if section == '*vertices':
+                ids[parts[0]] = parts[1].strip('"')
+            elif parts:
+                outf.write("{}\t{}\n".format(ids[parts[0]], ids[parts[1]]))
+
+@pytest.mark.parametrize('input_format', ['pajek', 'edgelist'])
+def test_same_file_as_convert_to_csr_file(graph, tmp_path, input_format):
+    input_fname = graph.pajek_fname
+    if input_format == 'edgelist':
+        input_fname = str(tmp_path / 'graph.tsv')
+        write_edgelist(graph.pajek_fname, input_fname)
+    expected_fname = str(tmp_path / 'expected.csr')
+    convert_to_csr_file(input_fname, expected_fname, input_format=input_format)
+    output_fname = str(tmp_path / 'graph.csr')
+    # small chunks and little memory, so that the edges are parsed in many chunks and sorted in several buckets
+    ingest_to_csr_file(input_fname, output_fname, input_format=input_format, processes=2, chunk_bytes=1 << 10,
+                       memory_bytes=1 << 12, tmpdir=str(tmp_path))
+    assert read_bytes(output_fname) == read_bytes(expected_fname)
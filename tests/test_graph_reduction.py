@@ -0,0 +1,25 @@
+import numpy as np
+
+from graph_reduction import reduce_graph, load_reduced_graph, connected_components, is_reduction_file
+from shortest_path_length_utils import get_shortest_path_lengths_for_vertex_pairs
+
+NUM_PAIRS = 400
+
+def test_connected_components(graph):
+    components = connected_components(graph.csr)
+    connected = np.isfinite(graph.distances)
+    assert ((components[:, None] == components[None, :]) == connected).all()
+
+def test_reduced_graph(graph, tmp_path):
+    source_vertices, target_vertices = graph.sample_pairs(NUM_PAIRS)
+    expected = graph.reference(source_vertices, target_vertices)
+    index_fname = str(tmp_path / 'graph.red')
+    reduce_graph(graph.csr).save(index_fname)
+    assert is_reduction_file(index_fname)
+    reduced = load_reduced_graph(index_fname)
+    assert reduced.core.num_vertices <= graph.csr.num_vertices
+    for fallback_backend in ['bibfs', 'grouped']:
+        sp_lengths = get_shortest_path_lengths_for_vertex_pairs(graph.csr, source_vertices, target_vertices, backend='reduced',
+                                                                index=reduced, fallback_backend=fallback_backend)
+        assert sp_lengths == expected
+    assert get_shortest_path_lengths_for_vertex_pairs(graph.csr, [-1, 0], [0, -1], backend='reduced', index=reduced) == [None, None]
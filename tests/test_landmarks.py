@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from landmarks import build_landmark_index, load_landmarks, bfs_distances, UNREACHABLE
+from shortest_path_length_utils import get_shortest_path_lengths_for_vertex_pairs, get_landmark_bounds
+
+NUM_PAIRS = 400
+
+def test_bfs_distances(graph):
+    for root in [0, graph.csr.num_vertices - 1]:
+        dists = bfs_distances(graph.csr, root).astype(np.float64)
+        dists[dists == UNREACHABLE] = np.inf
+        assert dists.tolist() == graph.distances[root].tolist()
+
+@pytest.mark.parametrize('strategy', ['degree', 'farthest'])
+def test_landmark_bounds(graph, tmp_path, strategy):
+    source_vertices, target_vertices = graph.sample_pairs(NUM_PAIRS)
+    expected = np.array(graph.reference(source_vertices, target_vertices))
+    index = build_landmark_index(graph.csr, 4, strategy=strategy)
+    index_fname = str(tmp_path / 'index.lmk')
+    index.save(index_fname)
+    index = load_landmarks(index_fname)
+    lower, upper = get_landmark_bounds(index, source_vertices, target_vertices)
+    lower = np.array(lower, dtype=np.float64)
+    upper = np.array(upper, dtype=np.float64)
+    assert (lower <= expected).all()
+    assert (expected <= upper).all()
+    # the bounds settle pairs of a vertex with itself
+    assert (lower[:3] == upper[:3]).all()
+    for fallback_backend in ['bibfs', 'grouped']:
+        sp_lengths = get_shortest_path_lengths_for_vertex_pairs(graph.csr, source_vertices, target_vertices, backend='landmarks',
+                                                                index=index, fallback_backend=fallback_backend)
+        assert sp_lengths == expected.tolist()
+
+def test_missing_vertices(testnetwork):
+    index = build_landmark_index(testnetwork.csr, 2)
+    assert get_landmark_bounds(index, [-1, 0], [0, -1]) == ([None, None], [None, None])
@@ -0,0 +1,42 @@
+import os
+
+from pairs_file import load_pairs_index, read_pairs, get_offsets_fname, get_groups_fname
+
+LINES = [
+    "# cs\tmath",
+    "a1\t11\ta2\t12",
+    "a3\t13\ta4\t14",
+    "# math\tcs",
+    "a5\t15\ta6\t16",
+    "",
+    "a7\t17\ta8\t18",
+]
+
+def write_pairs(fname):
+    with open(fname, 'w') as outf:
+        outf.write("\n".join(LINES) + "\n")
+
+def test_index_and_seek(tmp_path):
+    fname = str(tmp_path / 'pairs.tsv')
+    write_pairs(fname)
+    pairs_index = load_pairs_index(fname)
+    assert len(pairs_index) == 4
+    assert pairs_index.groups == [(0, 2, 'cs', 'math'), (2, 4, 'math', 'cs')]
+    assert [pairs_index.get_group(i) for i in range(4)] == [('cs', 'math')] * 2 + [('math', 'cs')] * 2
+    assert os.path.exists(get_offsets_fname(fname)) and os.path.exists(get_groups_fname(fname))
+    pairs = read_pairs(fname, 1, 10)
+    assert [(p.source_mag_id, p.target_mag_id) for p in pairs] == [('13', '14'), ('15', '16'), ('17', '18')]
+    assert read_pairs(fname, 4, 5) == []
+
+def test_stale_index_is_rebuilt(tmp_path):
+    fname = str(tmp_path / 'pairs.tsv')
+    write_pairs(fname)
+    load_pairs_index(fname)
+    with open(fname, 'a') as outf:
+        outf.write("a9\t19\ta10\t20\n")
+    # make the pairs file newer than its sidecars
+    mtime = os.path.getmtime(get_offsets_fname(fname)) + 10
+    os.utime(fname, (mtime, mtime))
+    pairs_index = load_pairs_index(fname)
+    assert len(pairs_index) == 5
+    assert read_pairs(fname, 4, 5, pairs_index=pairs_index)[0].target_mag_id == '20'
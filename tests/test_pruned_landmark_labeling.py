@@ -0,0 +1,27 @@
+import pytest
+
+from pruned_landmark_labeling import build_distance_labels, load_distance_labels, is_pll_file
+from shortest_path_length_utils import get_shortest_path_lengths_for_vertex_pairs, load_distance_index
+
+NUM_PAIRS = 400
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_pruned_landmark_labeling(graph, tmp_path, processes):
+    source_vertices, target_vertices = graph.sample_pairs(NUM_PAIRS)
+    expected = graph.reference(source_vertices, target_vertices)
+    labels = build_distance_labels(graph.csr, processes=processes, sequential_roots=8, chunk_size=4)
+    assert labels.query_many(source_vertices, target_vertices) == expected
+    assert [labels.query(int(s), int(t)) for s, t in zip(source_vertices[:50], target_vertices[:50])] == expected[:50]
+    index_fname = str(tmp_path / 'labels.pll')
+    labels.save(index_fname)
+    assert is_pll_file(index_fname)
+    assert not is_pll_file(graph.csr_fname)
+    labels = load_distance_labels(index_fname)
+    assert labels.query_many(source_vertices, target_vertices) == expected
+    index = load_distance_index(index_fname)
+    sp_lengths = get_shortest_path_lengths_for_vertex_pairs(graph.csr, source_vertices, target_vertices, backend='pll', index=index)
+    assert sp_lengths == expected
+
+def test_missing_vertices(testnetwork):
+    labels = build_distance_labels(testnetwork.csr)
+    assert labels.query_many([-1, 0], [0, -1]) == [None, None]
@@ -0,0 +1,94 @@
+import os, sys, time, signal, subprocess
+from contextlib import contextmanager
+
+import pytest
+
+from landmarks import build_landmark_index
+from pairs_file import Pair
+from query_client import QueryClient
+from conftest import REPO_DIR
+
+def connect(socket_fname, server, timeout=60):
+    """a QueryClient, once the server listens"""
+    deadline = time.time() + timeout
+    while True:
+        if server.poll() is not None:
+            raise RuntimeError("the query server exited with {}".format(server.returncode))
+        try:
+            return QueryClient(socket_fname, timeout=timeout)
+        except (FileNotFoundError, ConnectionRefusedError):
+            if time.time() > deadline:
+                raise
+            time.sleep(0.1)
+
+def to_pairs(G, source_vertices, target_vertices):
+    return [Pair(None, str(G.ids[s]), None, str(G.ids[t])) for s, t in zip(source_vertices, target_vertices)]
+
+@contextmanager
+def running_server(graph_fname, tmp_path, *options):
+    socket_fname = str(tmp_path / 'sp.sock')
+    server = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, 'query_server.py'), graph_fname,
+                               '--socket', socket_fname, '--processes', '2', '--shm-dir', str(tmp_path)] + list(options))
+    try:
+        yield socket_fname, server
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+@pytest.fixture
+def query_server(random_graph, tmp_path):
+    with running_server(random_graph.csr_fname, tmp_path) as address:
+        yield address
+
+def test_query_server(random_graph, query_server):
+    G = random_graph.csr
+    source_vertices, target_vertices = random_graph.sample_pairs(300)
+    expected = random_graph.reference(source_vertices, target_vertices)
+    with connect(*query_server) as client:
+        results = client.query(to_pairs(G, source_vertices, target_vertices))
+        assert [values[0] for values in results] == expected
+        missing_id = str(int(G.ids.max()) + 1)
+        assert client.query([Pair(None, missing_id, None, str(G.ids[0]))]) == [(None, )]
+        assert client.stats()['pairs'] == len(source_vertices) + 1
+
+def test_large_requests(random_graph, query_server):
+    # more pairs than fit in asyncio's default line limit of 64 KiB
+    G = random_graph.csr
+    source_vertices, target_vertices = random_graph.sample_pairs(8000)
+    expected = random_graph.reference(source_vertices, target_vertices)
+    pairs = to_pairs(G, source_vertices, target_vertices)
+    with connect(*query_server) as client:
+        response = client.request({'pairs': [[pair.source_mag_id, pair.target_mag_id] for pair in pairs]})
+        assert [values[0] for values in response['results']] == expected
+        assert [values[0] for values in client.query(pairs, batch_size=700)] == expected
+        assert client.stats()['requests'] == 1 + 12
+
+def run_calculate_shortest_paths(graph_fname, pairs_fname, out_fname, *options):
+    return subprocess.run([sys.executable, os.path.join(REPO_DIR, 'calculate_shortest_paths.py'), graph_fname, pairs_fname,
+                           '-o', out_fname] + list(options), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+
+def test_bounds_server(random_graph, tmp_path):
+    G = random_graph.csr
+    index_fname = str(tmp_path / 'graph.lmk')
+    build_landmark_index(G, 4).save(index_fname)
+    source_vertices, target_vertices = random_graph.sample_pairs(50)
+    pairs_fname = str(tmp_path / 'pairs.tsv')
+    with open(pairs_fname, 'w') as outf:
+        outf.write("".join("a{}\t{}\ta{}\t{}\n".format(s, G.ids[s], t, G.ids[t]) for s, t in zip(source_vertices, target_vertices)))
+    with running_server(random_graph.csr_fname, tmp_path, '--backend', 'landmarks', '--bounds-only', '--index', index_fname) as (socket_fname, server):
+        with connect(socket_fname, server) as client:
+            assert client.options()['bounds_only']
+        # the server answers with bounds, which a result file would store as exact lengths
+        out_fname = str(tmp_path / 'out.npy')
+        result = run_calculate_shortest_paths(random_graph.csr_fname, pairs_fname, out_fname, '--server', socket_fname, '--num', '50')
+        assert result.returncode != 0 and "write the bounds to a tsv output" in result.stdout
+        assert not os.path.exists(out_fname)
+        out_fname = str(tmp_path / 'out.tsv')
+        result = run_calculate_shortest_paths(random_graph.csr_fname, pairs_fname, out_fname, '--server', socket_fname, '--num', '50')
+        assert result.returncode == 0, result.stdout
+        with open(out_fname) as f:
+            assert [len(line.split("\t")) for line in f] == [4] * len(source_vertices)
+        # the server's backend options apply, so the local ones are refused
+        for options in [['--backend', 'bibfs'], ['--bounds-only'], ['--index', index_fname], ['--cache', str(tmp_path / 'cache.sqlite')], ['--source-cache-mb', '10'], ['--metrics', str(tmp_path / 'metrics.json')]]:
+            result = run_calculate_shortest_paths(random_graph.csr_fname, pairs_fname, out_fname, '--server', socket_fname, *options)
+            assert result.returncode != 0 and "server's backend options apply" in result.stdout, options
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from result_store import RESULT_DTYPE, CategoryPairAggregator, encode_lengths
+
+class FakePairsIndex(object):
+    """the part of pairs_file.PairsIndex that CategoryPairAggregator uses"""
+    def __init__(self, groups):
+        self.groups = groups
+
+    def __len__(self):
+        return self.groups[-1][1]
+
+@pytest.mark.parametrize('lengths', [[1, 3], [1, 3, 3], [2, 2, 5, 7], [4], [1, 2, 2, 3, 6, 6]])
+def test_summary_matches_numpy(lengths):
+    sp_lengths = lengths + [float('inf'), None]
+    records = np.zeros(len(sp_lengths), dtype=RESULT_DTYPE)
+    records['pair_idx'] = np.arange(len(records))
+    records['length'], records['status'] = encode_lengths(sp_lengths)
+    aggregator = CategoryPairAggregator(FakePairsIndex([(0, len(records))]))
+    aggregator.add(records)
+    mean, std, median, maximum = aggregator.summary(0)
+    assert mean == pytest.approx(np.mean(lengths))
+    assert std == pytest.approx(np.std(lengths))
+    assert median == np.median(lengths)
+    assert maximum == max(lengths)
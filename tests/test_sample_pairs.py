@@ -0,0 +1,38 @@
+from argparse import Namespace
+
+import numpy as np
+
+import get_sample_pairs
+from benchmark_sample_pairs import make_papers_table, legacy_sample_pairs, check_sidecars
+from pairs_file import scan_pairs_file, get_offsets_fname, get_groups_fname, read_groups
+
+def sample_pairs(input_fname, output_fname, **kwargs):
+    options = dict(input=input_fname, output=output_fname, sep='\t', category_colname='category_broad',
+                   min_papers=20, seed=5, sample_size=150, unique=False, no_headers=False)
+    options.update(kwargs)
+    get_sample_pairs.main(Namespace(**options))
+
+def test_same_file_as_the_old_sampler(tmp_path):
+    # small categories, so that many pairs are drawn more than once
+    input_fname = str(tmp_path / 'papers.tsv')
+    make_papers_table(input_fname, 300, 4, seed=3)
+    legacy_fname = str(tmp_path / 'legacy.tsv')
+    legacy_sample_pairs(input_fname, legacy_fname, 20, 150, 5)
+    output_fname = str(tmp_path / 'pairs.tsv')
+    sample_pairs(input_fname, output_fname)
+    with open(legacy_fname, 'rb') as f1, open(output_fname, 'rb') as f2:
+        assert f1.read() == f2.read()
+    # the sidecar files written with the pairs agree with a scan of them
+    offsets, groups = scan_pairs_file(output_fname)
+    assert np.array_equal(np.load(get_offsets_fname(output_fname)), offsets)
+    assert read_groups(get_groups_fname(output_fname)) == groups
+    assert len(offsets) > 150 * len(groups)
+
+def test_unique_without_headers(tmp_path):
+    input_fname = str(tmp_path / 'papers.tsv')
+    make_papers_table(input_fname, 300, 4, seed=3)
+    output_fname = str(tmp_path / 'pairs.tsv')
+    sample_pairs(input_fname, output_fname, unique=True, no_headers=True)
+    check_sidecars(output_fname, 150)
+    with open(output_fname, 'r') as f:
+        assert not any(line.startswith('#') for line in f)
@@ -0,0 +1,30 @@
+import pytest
+
+from task_planner import estimate_pair_costs, group_by_source, pack_tasks
+
+@pytest.mark.parametrize('backend', ['igraph', 'bibfs', 'grouped', 'pll'])
+def test_estimate_pair_costs(graph, backend):
+    source_vertices, target_vertices = graph.sample_pairs(200)
+    source_vertices[-1] = -1
+    costs = estimate_pair_costs(graph.csr, source_vertices, target_vertices, backend)
+    assert len(costs) == len(source_vertices)
+    assert ((costs >= 0) & (costs <= 1)).all()
+    assert costs[-1] == 0
+    if backend == 'pll':
+        assert (costs == 0).all()
+
+def test_group_by_source():
+    groups = group_by_source([0, 1, 2, 3], [5, 6, 5, 5], [0.1, 0.4, 0.3, 0.2], shared_traversal=True)
+    assert sorted(groups) == [(0.3, [0, 2, 3]), (0.4, [1])]
+    groups = group_by_source([0, 1, 2, 3], [5, 6, 5, 5], [0.1, 0.4, 0.3, 0.2], shared_traversal=False)
+    assert sorted((round(cost, 6), indices) for cost, indices in groups) == [(0.4, [1]), (0.6, [0, 2, 3])]
+
+def test_pack_tasks():
+    groups = [(1.0, [i]) for i in range(10)] + [(5.0, [10, 11])]
+    tasks = pack_tasks(groups, target_seconds=12.0, load_seconds=2.0, traversal_seconds=2.0, pair_seconds=0.0)
+    assert sorted(i for task in tasks for i in task.pair_indices) == list(range(12))
+    # the group too costly for one task gets a task of its own
+    assert any(task.pair_indices == [10, 11] for task in tasks)
+    assert all(task.seconds <= 12.0 for task in tasks if task.num_sources > 1)
+    with pytest.raises(ValueError):
+        pack_tasks(groups, target_seconds=1.0, load_seconds=2.0, traversal_seconds=2.0, pair_seconds=0.0)
@@ -0,0 +1,35 @@
+import numpy as np
+
+from vertex_id_index import VertexIdIndex, load_vertex_id_index, ids_to_array
+
+IDS = [2157, 15, 900001, 42, 15, 7]
+
+def test_lookup():
+    index = VertexIdIndex.from_ids(IDS)
+    assert index.lookup_many([42, '7', 2157, 3, 'abc', None]).tolist() == [3, 5, 0, -1, -1, -1]
+    # with duplicate ids the lowest vertex index wins, as with G.vs.find
+    assert index.lookup(15) == 1
+    assert index.lookup(16) is None
+    assert index.lookup_many([]).tolist() == []
+    assert VertexIdIndex.from_ids([]).lookup_many([1, 2]).tolist() == [-1, -1]
+
+def test_find_missing():
+    index = VertexIdIndex.from_ids(IDS)
+    assert index.find_missing([7, 8, '9', 8, 2157, 'x']) == [8, '9', 'x']
+    assert index.find_missing([]) == []
+    ids = [7, 8, '9', 8, 2157, 'x']
+    assert index.find_missing(ids, vertex_indices=index.lookup_many(ids)) == [8, '9', 'x']
+
+def test_ids_to_array():
+    ids, valid = ids_to_array(['42', 7, ' 15 ', np.int32(3)])
+    assert ids.dtype == np.int64 and ids.tolist() == [42, 7, 15, 3] and valid.all()
+    ids, valid = ids_to_array(['42', 'abc', None, 2 ** 70, '4.5', 9])
+    assert valid.tolist() == [True, False, False, False, False, True]
+    assert ids[valid].tolist() == [42, 9]
+
+def test_save_and_load(tmp_path):
+    fname = str(tmp_path / 'graph.net.ids.npy')
+    VertexIdIndex.from_ids(IDS).save(fname)
+    index = load_vertex_id_index(fname)
+    assert index.lookup_many(IDS).tolist() == [0, 1, 2, 3, 1, 5]
+    assert isinstance(index.sorted_ids, np.memmap)
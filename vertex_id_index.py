@@ -0,0 +1,93 @@
+import os
+import numpy as np
+
+class VertexIdIndex(object):
+    """maps ids in the original network (e.g. MAG paper ids) to vertex sequence ids.
+
+    stores the original ids sorted, alongside the vertex index of each one,
+    so a lookup is a binary search instead of a scan over every vertex."""
+    def __init__(self, sorted_ids, vertex_indices):
+        self.sorted_ids = sorted_ids
+        self.vertex_indices = vertex_indices
+
+    @classmethod
+    def from_ids(cls, ids):
+        """build the index from an array where ids[v] is the original id of vertex v"""
+        ids = np.asarray(ids, dtype=np.int64)
+        # stable sort, so that with duplicate ids the lowest vertex index wins (like G.vs.find)
+        order = np.argsort(ids, kind='mergesort')
+        return cls(ids[order], order.astype(np.int64))
+
+    def __len__(self):
+        return len(self.sorted_ids)
+
+    def lookup_many(self, original_ids):
+        """vectorized lookup. returns an int64 array of vertex indices, with -1 for ids not in the graph"""
+        ids, valid = ids_to_array(original_ids)
+        out = np.full(len(ids), -1, dtype=np.int64)
+        if len(self.sorted_ids) == 0:
+            return out
+        pos = np.searchsorted(self.sorted_ids, ids)
+        pos_clipped = np.minimum(pos, len(self.sorted_ids) - 1)
+        found = valid & (self.sorted_ids[pos_clipped] == ids)
+        out[found] = self.vertex_indices[pos_clipped[found]]
+        return out
+
+    def lookup(self, original_id):
+        """vertex index for one original id, or None if it is not in the graph"""
+        idx = self.lookup_many([original_id])[0]
+        if idx < 0:
+            return None
+        return int(idx)
+
+    def find_missing(self, original_ids, vertex_indices=None):
+        """the ids (in input order, without duplicates) that are not in the graph.
+        vertex_indices is the result of lookup_many(original_ids), if the caller has it already"""
+        original_ids = list(original_ids)
+        if vertex_indices is None:
+            vertex_indices = self.lookup_many(original_ids)
+        seen = set()
+        out = []
+        # (only the missing ones are visited, usually few of them)
+        for pos in np.flatnonzero(np.asarray(vertex_indices) < 0):
+            original_id = original_ids[pos]
+            if original_id not in seen:
+                seen.add(original_id)
+                out.append(original_id)
+        return out
+
+    def save(self, fname):
+        """write the index as a single (2, n) int64 .npy file.
+        writes to a temporary file first, so concurrent jobs never see a partial index"""
+        tmp_fname = "{}.tmp{}".format(fname, os.getpid())
+        with open(tmp_fname, 'wb') as outf:
+            np.save(outf, np.vstack([self.sorted_ids, self.vertex_indices]))
+        os.rename(tmp_fname, fname)
+
+def ids_to_array(original_ids):
+    """original ids (ints or strings) as an int64 array, plus a mask of the ones that are valid integers"""
+    if not isinstance(original_ids, np.ndarray):
+        original_ids = list(original_ids)
+    try:
+        # numpy parses the whole list at once (strings the way int() does)
+        ids = np.asarray(original_ids, dtype=np.int64)
+        return ids, np.ones(len(ids), dtype=bool)
+    except (TypeError, ValueError, OverflowError):
+        pass
+    # some ids are not integers: convert one at a time, and mark those
+    ids = np.zeros(len(original_ids), dtype=np.int64)
+    valid = np.ones(len(original_ids), dtype=bool)
+    for i, x in enumerate(original_ids):
+        try:
+            ids[i] = int(x)
+        except (TypeError, ValueError, OverflowError):
+            valid[i] = False
+    return ids, valid
+
+def load_vertex_id_index(fname, mmap=True):
+    arr = np.load(fname, mmap_mode='r' if mmap else None)
+    return VertexIdIndex(arr[0], arr[1])
+
+def get_id_index_fname(graph_fname):
+    """the id index is saved next to the graph file"""
+    return graph_fname + ".ids.npy"
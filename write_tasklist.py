@@ -1,5 +1,4 @@
-import sys, os, time
-from glob import glob
+import sys, os
 from datetime import datetime
 from timeit import default_timer as timer
 try:
@@ -8,6 +7,8 @@ except ImportError:
     def format_timespan(seconds):
         return "{:.2f} seconds".format(seconds)
 
+from pairs_file import load_pairs_index
+
 import logging
 logging.basicConfig(format='%(asctime)s %(name)s.%(lineno)d %(levelname)s : %(message)s',
         datefmt="%H:%M:%S",
@@ -27,7 +28,8 @@ def output_one_line(path_to_script,
                     output_dirname, 
                     log_dirname, 
                     start_idx, 
-                    num=80):
+                    num=80,
+                    time_budget=None):
     end_idx = start_idx + num
     output_fname = os.path.join(output_dirname, "shortest_path_lengths_samples_{}-{}.tsv".format(start_idx, end_idx))
     log_fname = os.path.join(log_dirname, "shortest_path_lengths_samples_{}-{}.log".format(start_idx, end_idx))
@@ -40,6 +42,8 @@ def output_one_line(path_to_script,
     out.append("-o {}".format(output_fname))
     out.append("--start {}".format(start_idx))
     out.append("--num {}".format(num))
+    if time_budget:
+        out.append("--time-budget {}".format(time_budget))
     out.append('--debug')
     out.append('>& {}'.format(log_fname))  # output stdout and stderr to a file
 
@@ -79,6 +83,10 @@ def main(args):
     logger.info("writing to {}".format(outfname))
     cur_idx = args.start
     end_idx = args.end
+    if end_idx is None:
+        # the number of pairs get_sample_pairs.py actually wrote (repeated draws are written too, unless it ran with --unique)
+        end_idx = len(load_pairs_index(pairs_fname))
+        logger.debug("{} pairs in {}".format(end_idx, pairs_fname))
     step = args.num
     with open(outfname, 'w') as outf:
         number_written = 0
@@ -89,7 +97,8 @@ def main(args):
                                     outdir,
                                     logdir,
                                     cur_idx,
-                                    num=step)
+                                    num=step,
+                                    time_budget=args.time_budget)
             if line:
                 outf.write(line)
                 outf.write('\n')
@@ -116,7 +125,8 @@ if __name__ == "__main__":
     parser.add_argument("--taskfile", help="path to the tasklist file written by this program")
     parser.add_argument("--start", type=int, default=0, help="index of the sample pair to start for the first job")
     parser.add_argument("--num", type=int, default=80, help="number of pairs to calculate for each job")
-    parser.add_argument("--end", type=int, default=153800, help="index to end")
+    parser.add_argument("--end", type=int, help="index to end (default: the number of pairs in the pairs file)")
+    parser.add_argument("--time-budget", type=float, help="pass --time-budget (seconds) to each job, so it stops cleanly before being killed and resumes from its checkpoint when rerun")
     parser.add_argument("--debug", action='store_true', help="output debugging info")
     global args
     args = parser.parse_args()